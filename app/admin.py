@@ -0,0 +1,21 @@
+"""
+Guard for operational endpoints (cache flushes and the like).
+
+They answer only requests carrying ``X-Admin-Token: <ADMIN_TOKEN>``; with
+ADMIN_TOKEN unset they are disabled and answer 404, so a deployment that
+never configures a token exposes nothing.
+"""
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from .config import settings
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency: 404 without ADMIN_TOKEN, 403 on a missing or wrong token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
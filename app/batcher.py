@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, List, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchQueue:
+    """One modality queue: a worker thread drains it into batched forward passes."""
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable,
+        max_batch_size: int,
+        max_wait_s: float,
+        executor: Optional[Executor] = None
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self.queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"embed-batcher-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future: Future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> Optional[List[tuple]]:
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish the current batch, then stop on the next loop
+                self.queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._embed(batch)
+            except Exception:
+                # Never let one batch end the thread: every later request would hang
+                logger.exception("embedding batcher %s failed a batch", self.name)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"embedding batcher {self.name} failed"))
+
+    def _embed(self, batch: List[tuple]):
+        # Claim each future; once running a caller can no longer cancel it,
+        # and ones already cancelled are dropped
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            if self.executor is not None:
+                embeddings = self.executor.submit(self.batch_fn, items).result()
+            else:
+                embeddings = self.batch_fn(items)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(items)
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(np.array(embedding, copy=True))
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent single-item embedding requests into batched forward passes.
+
+    Each modality (image, text) has its own queue. A request waits at most
+    ``max_wait_ms`` for other requests to join its batch, and a batch never
+    exceeds ``max_batch_size`` items. Every caller gets back its own normalized
+    vector, exactly as ``get_image_embedding`` / ``get_text_embedding`` would return.
+
+    If ``executor`` is given, forward passes run there (e.g. the shared CPU pool)
+    instead of on the queue threads.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        max_wait_s = max_wait_ms / 1000.0
+        self._image_queue = _BatchQueue(
+            "image", embedder.get_batch_embeddings, max_batch_size, max_wait_s, executor
+        )
+        self._text_queue = _BatchQueue(
+            "text", embedder.get_batch_text_embeddings, max_batch_size, max_wait_s, executor
+        )
+
+    def submit_image(self, image: Image.Image) -> Future:
+        return self._image_queue.submit(image)
+
+    def submit_text(self, text: str) -> Future:
+        return self._text_queue.submit(text)
+
+    def embed_image(self, image: Image.Image) -> np.ndarray:
+        return self.submit_image(image).result()
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.submit_text(text).result()
+
+    def stats(self) -> dict:
+        """Return per-modality batch counters (items / batches = average batch size)."""
+        return {
+            q.name: {"batches": q.batches, "items": q.items, "queued": q.queue.qsize()}
+            for q in (self._image_queue, self._text_queue)
+        }
+
+    def close(self):
+        self._image_queue.close()
+        self._text_queue.close()
@@ -0,0 +1,111 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries also expire after ``ttl`` seconds.
+
+    ``ttl=None`` disables expiry; ``maxsize`` bounds the number of entries and the
+    least recently used entry is evicted first.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache:
+    """
+    TTLCache-compatible cache stored in Redis and shared by every worker.
+
+    Needs the optional ``redis`` package. Entries expire after ``ttl`` seconds;
+    the size bound is Redis's own (``maxmemory`` with an LRU policy), so
+    ``evictions`` is not tracked here. Hit/miss counters are per process.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: Optional[float] = 300.0, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key: Hashable, value: Any):
+        ttl = int(self.ttl) if self.ttl else None
+        self.client.set(self._key(key), pickle.dumps(value), ex=ttl)
+
+    def invalidate(self, key: Hashable):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}:*"):
+            self.client.delete(key)
+
+    def stats(self) -> dict:
+        return {"prefix": self.prefix, "hits": self.hits, "misses": self.misses}
@@ -1,10 +1,22 @@
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import os
+from typing import Optional
 
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(dotenv_path=env_path)
 
+# CLIP_MODEL_NAME used to be a Hugging Face model id that the embedder ignored:
+# it always loaded ViT-B-32 with laion2b_s34b_b79k. These fall back to the
+# defaults so existing collections keep matching their query embeddings
+LEGACY_CLIP_MODELS = frozenset({
+    "openai/clip-vit-base-patch32",
+    "openai/clip-vit-base-patch16",
+    "openai/clip-vit-large-patch14",
+    "openai/clip-vit-large-patch14-336",
+})
+
 class Settings(BaseSettings):
     # PostgreSQL settings
     POSTGRES_DB: str = ""
@@ -12,6 +24,11 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = ""
     POSTGRES_HOST: str = ""
     POSTGRES_PORT: int = 5432
+    PG_POOL_MIN_SIZE: int = 1
+    PG_POOL_MAX_SIZE: int = 10
+    PG_POOL_ACQUIRE_TIMEOUT: float = 5.0       # seconds to wait for a free connection
+    PG_POOL_MAX_LIFETIME: float = 1800.0       # recycle connections older than this
+    PG_POOL_HEALTH_CHECK_AFTER: float = 30.0   # probe connections idle longer than this
 
     # Qdrant settings
     QDRANT_HOST: str = "localhost"
@@ -20,20 +37,153 @@ class Settings(BaseSettings):
     VECTOR_SIZE: int = 512
     QDRANT_API_KEY: str = ""   
     QDRANT_HTTPS: bool = False
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    # Collection tuning, applied when app.migrate creates the collection
+    # (`python -m app.migrate --update-qdrant-config` applies it to an existing one)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_ON_DISK: bool = False               # mmap vectors and the HNSW graph instead of RAM
+    QDRANT_SCALAR_QUANTIZATION: bool = False   # int8 copy of the vectors kept in RAM
+    QDRANT_QUANTIZATION_QUANTILE: float = 0.99
+    QDRANT_INDEXING_THRESHOLD: int = 20000     # KB per segment before it gets an HNSW index
+    QDRANT_MEMMAP_THRESHOLD: int = 0           # KB per segment before it moves to mmap, 0 = server default
+    # Per-query defaults
+    QDRANT_SEARCH_HNSW_EF: int = 0             # 0 = server default
+    QDRANT_SEARCH_EXACT: bool = False          # brute force, bypassing HNSW
+    QDRANT_QUANTIZATION_RESCORE: bool = True   # rescore quantized hits with the original vectors
+    # Where search results get their metadata: "postgres" (one bulk query)
+    # or "payload" (the Qdrant point payload, no Postgres round trip)
+    SEARCH_METADATA_SOURCE: str = "postgres"
+    # Comma-separated payload fields searches can filter on; each gets a Qdrant keyword index
+    SEARCH_FILTER_FIELDS: str = "style,tags,colors"
+    # Results per NDJSON batch of a streamed search (stream=true); each batch is one metadata query
+    SEARCH_STREAM_BATCH_SIZE: int = 100
+    # Metadata queries a streamed search keeps in flight, so one slow client can't hold most of the pool
+    SEARCH_STREAM_PREFETCH: int = 2
+    # Largest ``limit`` a paged or streamed search accepts
+    SEARCH_MAX_LIMIT: int = 1000
+
+    # Vector store: "qdrant" or "local" (memory-mapped exact index, see app/db_local.py)
+    VECTOR_BACKEND: str = "qdrant"
+    LOCAL_INDEX_PATH: str = "./vector_index"
+    LOCAL_INDEX_DTYPE: str = "float32"        # float16 halves memory but numpy upcasts it per search (~7x slower)
+    # Open the index read-only (a separate process writes); unset = read-only when SERVE_WORKERS > 1
+    LOCAL_INDEX_READ_ONLY: Optional[bool] = None
+    LOCAL_INDEX_COMPACT_RATIO: float = 0.25   # rewrite the index once this share of rows is dead
+
+    # Two-stage search (see app/two_stage.py): "exact" or "two_stage"
+    SEARCH_MODE: str = "exact"
+    TWO_STAGE_METHOD: str = "pca"        # pca (reduced float32) | binary (sign bits)
+    TWO_STAGE_DIM: int = 128             # PCA dimensions / bits per vector
+    TWO_STAGE_CANDIDATES: int = 8        # first stage fetches limit * this many candidates
+    TWO_STAGE_FIT_SAMPLE: int = 50_000   # vectors used to fit the projection
+    TWO_STAGE_INDEX_PATH: str = "./two_stage_index.npz"
 
     # CLIP model
-    CLIP_MODEL_NAME: str = "openai/clip-vit-base-patch32"
+    CLIP_MODEL_NAME: str = "ViT-B-32"               # open_clip architecture
+    CLIP_PRETRAINED: str = "laion2b_s34b_b79k"      # open_clip weights, "" = random (tests only)
+    # fp32 | inference_mode | int8 | bf16 | onnx (see OpenCLIPEmbedder)
+    CLIP_INFERENCE_MODE: str = "fp32"
+    ONNX_CACHE_DIR: str = os.path.expanduser("~/.cache/nail-embedder/onnx")
+
+    # Upload decoding
+    MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    MAX_IMAGE_PIXELS: int = 50_000_000
+    DECODE_MIN_SIDE: int = 448    # early downscale target (2x the CLIP input size)
+    DECODE_PROCESSES: int = 0     # process pool for batch decodes, 0 = decode inline
+
+    # Query embedding micro-batching
+    EMBED_BATCHING_ENABLED: bool = True
+    EMBED_BATCH_MAX_SIZE: int = 16
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Execution pools
+    CPU_WORKERS: int = 1         # concurrent CLIP forward passes
+    IO_WORKERS: int = 32         # threads for blocking Postgres / Qdrant / S3 calls
+    TORCH_NUM_THREADS: int = 0   # intra-op threads per CPU worker, 0 = cores / (CPU_WORKERS * SERVE_WORKERS)
+    # Server processes (python -m app.serve)
+    SERVE_WORKERS: int = 1
+    SERVE_PRELOAD: bool = True   # load the model once in the parent; forked workers share its weights
+    # Native async clients (AsyncQdrantClient, asyncpg, aiobotocore) for the API's
+    # data path instead of blocking clients on the I/O pool; needs asyncpg and aiobotocore
+    ASYNC_IO_ENABLED: bool = False
+
+    # Search caches (see app/search_cache.py)
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_BACKEND: str = "local"   # local (per process) | redis (shared, needs the redis package)
+    SEARCH_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    TEXT_EMBEDDING_CACHE_SIZE: int = 10000
+    IMAGE_EMBEDDING_CACHE_SIZE: int = 2000
+    RESULT_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: float = 86400.0  # seconds, 0 = no expiry; embeddings only change with the model
+    RESULT_CACHE_TTL: float = 60.0        # bounds staleness from other workers' writes with the local backend
+
+    # Salon recommendation cache
+    SALON_CACHE_SIZE: int = 10000
+    SALON_CACHE_TTL: float = 600.0   # seconds
+    # Group salon image hits by salon (needs `python -m match_salons.build_salon_index`)
+    SALON_SEARCH_DISTINCT: bool = False
+
+    # Observability (see app/metrics.py, app/log.py)
+    METRICS_ENABLED: bool = True    # latency histograms served at /metrics
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"        # json | text
+    LOG_SAMPLE_RATE: float = 0.01   # share of DEBUG (per-request) records written
 
     # API server
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    MIGRATE_ON_STARTUP: bool = False   # otherwise run `python -m app.migrate` per deploy
+    WARMUP_ON_STARTUP: bool = False    # load the model before serving instead of on first use
+    ADMIN_TOKEN: str = ""               # X-Admin-Token for cache flush endpoints; unset = disabled
 
     # S3 settings
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_S3_BUCKET: str = "pretty-images"
     AWS_S3_REGION: str = "us-west-1" 
+    S3_UPLOAD_WORKERS: int = 8                      # concurrent uploads in a batch
+    S3_MAX_POOL_CONNECTIONS: int = 32               # HTTP connections kept by the shared client
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024  # bytes; larger bodies are uploaded in parts
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024   # bytes per part (S3 minimum is 5 MiB)
+    S3_MULTIPART_WORKERS: int = 4                   # parts of one upload in flight
+
+    # Bulk ingestion (python -m app.ingest)
+    INGEST_CHUNK_SIZE: int = 32
+    INGEST_DECODE_WORKERS: int = 4
+    QDRANT_UPSERT_BATCH_SIZE: int = 256
+
+    # Re-embedding into a new collection (python -m app.reembed)
+    REEMBED_BATCH_SIZE: int = 256           # images per embedding batch
+    REEMBED_WORKERS: int = 0                # embedding processes, 0 = embed in-process
+    REEMBED_FETCH_WORKERS: int = 16         # concurrent source image downloads
+    REEMBED_LATENCY_BUDGET_MS: float = 0.0  # live search p95 to stay under, 0 = no throttling
+
+    # Duplicate detection at ingest, and stored-embedding reuse for query images (see app/dedup.py)
+    DEDUP_ENABLED: bool = True
+    DEDUP_PERCEPTUAL: bool = False       # also match re-encoded / resized copies by perceptual hash; similar photos may collide
+    DEDUP_PHASH_DISTANCE: int = 1        # perceptual hashes this many bits apart still match (0 or 1)
+    DEDUP_COSINE_THRESHOLD: float = 0.0  # reject new images this similar to a stored one, 0 = off
     
+    @field_validator("DEDUP_PHASH_DISTANCE")
+    @classmethod
+    def _phash_distance(cls, value: int) -> int:
+        if value not in (0, 1):
+            raise ValueError("DEDUP_PHASH_DISTANCE must be 0 or 1")
+        return value
+
+    @model_validator(mode="after")
+    def _legacy_clip_model(self):
+        name = self.CLIP_MODEL_NAME
+        if name in LEGACY_CLIP_MODELS:
+            self.CLIP_MODEL_NAME = self.model_fields["CLIP_MODEL_NAME"].default
+        elif "/" in name and not name.startswith("hf-hub:"):
+            raise ValueError(
+                f"CLIP_MODEL_NAME={name!r} looks like a Hugging Face model id; it is now an open_clip "
+                f"architecture such as 'ViT-B-32', with the weights in CLIP_PRETRAINED"
+            )
+        return self
 
     class Config:
         env_file = ".env"
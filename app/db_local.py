@@ -0,0 +1,389 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .vector_store import SearchFilters, SearchHit, VectorStore, payload_matches
+
+FILTER_MASK_CACHE_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorDB(VectorStore):
+    """
+    In-process exact cosine index over a memory-mapped embedding file.
+
+    Layout of ``path`` (generation ``g`` changes on every compaction):
+
+    - ``manifest.json``       dim, dtype and the current generation
+    - ``vectors.<g>.bin``     normalized embeddings, one row per insert, raw float32/float16
+    - ``rows.<g>.jsonl``      ``{"id": ..., "payload": ...}`` per row, same order
+    - ``tombstones.<g>.jsonl`` row numbers that were deleted or overwritten
+    - ``writer.lock``         held (flock) by the one process opened for writing
+
+    All files are append-only between compactions. Deletes only write a tombstone;
+    once tombstones exceed ``compact_ratio`` of the rows the live rows are copied
+    into a new generation and the manifest is swapped atomically.
+
+    One process writes; any number of processes can open the same path with
+    ``read_only=True`` and share the page cache. Readers pick up appends,
+    deletes and compactions on their next search. Opening for writing takes an
+    exclusive lock on ``writer.lock``: while another process holds it the
+    index opens read-only instead, so appends from two processes can never
+    interleave. The lock belongs to the opening process; a forked child
+    can't write through an inherited instance.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = 512,
+        dtype: str = "float32",
+        read_only: bool = False,
+        compact_ratio: float = None
+    ):
+        self.path = path
+        self.read_only = read_only
+        self.compact_ratio = settings.LOCAL_INDEX_COMPACT_RATIO if compact_ratio is None else compact_ratio
+        self._lock = threading.RLock()
+        self._writer_lock = None
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            self.read_only = read_only = not self._lock_writer()
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            if read_only:
+                raise FileNotFoundError(f"no local vector index at {path}")
+            os.makedirs(path, exist_ok=True)
+            self._write_manifest({"dim": dim, "dtype": dtype, "generation": 0})
+        self._load()
+        if self.dim != dim:
+            raise ValueError(f"index at {path} has dim {self.dim}, expected {dim}")
+
+    def _lock_writer(self) -> bool:
+        """Take the single-writer lock; False if another process has it."""
+        f = open(os.path.join(self.path, "writer.lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            logger.warning("local vector index at %s has a writer already, opening it read-only", self.path)
+            return False
+        self._writer_lock, self._writer_pid = f, os.getpid()
+        return True
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError("local vector index is opened read-only")
+        if os.getpid() != self._writer_pid:
+            raise PermissionError("local vector index was opened for writing by another process")
+
+    def close(self):
+        """Release the writer lock (reads keep working)."""
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
+            self.read_only = True
+
+    # -- files ---------------------------------------------------------------
+
+    def _file(self, kind: str, generation: int = None) -> str:
+        generation = self._generation if generation is None else generation
+        ext = "bin" if kind == "vectors" else "jsonl"
+        return os.path.join(self.path, f"{kind}.{generation}.{ext}")
+
+    def _read_manifest(self) -> dict:
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+
+    @staticmethod
+    def _read_lines(path: str, offset: int):
+        """Return (complete lines after ``offset``, new offset); a torn last line is left for later."""
+        if not os.path.exists(path):
+            return [], offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return data[:end].splitlines(), offset + end
+
+    # -- in-memory state -----------------------------------------------------
+
+    def _load(self):
+        manifest = self._read_manifest()
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self._generation = manifest["generation"]
+        self._manifest_mtime = os.stat(os.path.join(self.path, "manifest.json")).st_mtime_ns
+        self._ids: List[str] = []
+        self._payloads: List[dict] = []
+        self._row_of = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._rows_offset = 0
+        self._tombstones_offset = 0
+        self._dead = 0
+        self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+        self._filter_masks = {}   # SearchFilters -> which rows match, extended as rows are appended
+        self._catch_up()
+
+    def _grow_alive(self, n: int):
+        if n > len(self._alive):
+            alive = np.zeros(max(n, 2 * len(self._alive), 1024), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def _catch_up(self):
+        """Apply rows and tombstones appended since the last read."""
+        lines, self._rows_offset = self._read_lines(self._file("rows"), self._rows_offset)
+        if lines:
+            start = len(self._ids)
+            self._grow_alive(start + len(lines))
+            for i, line in enumerate(lines):
+                row = json.loads(line)
+                self._ids.append(row["id"])
+                self._payloads.append(row["payload"])
+                self._row_of[row["id"]] = start + i
+            self._alive[start:start + len(lines)] = True
+        lines, self._tombstones_offset = self._read_lines(self._file("tombstones"), self._tombstones_offset)
+        for line in lines:
+            self._apply_tombstone(int(line))
+
+    def _apply_tombstone(self, row: int):
+        if self._alive[row]:
+            self._alive[row] = False
+            self._dead += 1
+            if self._row_of.get(self._ids[row]) == row:
+                del self._row_of[self._ids[row]]
+
+    def _refresh(self):
+        """Reload after a compaction (the manifest moved to a new generation), otherwise pick up appended rows."""
+        mtime = os.stat(os.path.join(self.path, "manifest.json")).st_mtime_ns
+        if mtime != self._manifest_mtime and self._read_manifest()["generation"] != self._generation:
+            self._load()
+        else:
+            try:
+                self._catch_up()
+            except FileNotFoundError:
+                # Compacted between our manifest check and the read
+                self._load()
+
+    def _filter_mask(self, filters: SearchFilters, n: int) -> np.ndarray:
+        """Rows ``[0, n)`` whose payload matches ``filters``; payloads never change, so masks only grow."""
+        mask = self._filter_masks.get(filters, np.zeros(0, dtype=bool))
+        if len(mask) < n:
+            tail = np.fromiter(
+                (payload_matches(payload, filters) for payload in self._payloads[len(mask):n]), dtype=bool
+            )
+            if filters not in self._filter_masks and len(self._filter_masks) >= FILTER_MASK_CACHE_SIZE:
+                # Filters come from requests; keep the cache bounded
+                self._filter_masks.pop(next(iter(self._filter_masks)))
+            mask = self._filter_masks[filters] = np.concatenate([mask, tail])
+        return mask[:n]
+
+    def _vectors(self) -> np.ndarray:
+        n = len(self._ids)
+        if self._matrix.shape[0] != n and n > 0:
+            self._matrix = np.memmap(self._file("vectors"), dtype=self.dtype, mode="r", shape=(n, self.dim))
+        return self._matrix
+
+    # -- writes --------------------------------------------------------------
+
+    def _append(self, image_ids: List[str], vectors: np.ndarray, metadata_list: List[dict]):
+        self._check_writable()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(image_ids), self.dim)
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        with self._lock:
+            # Append to the generation the manifest names now, never a compacted-away one
+            self._refresh()
+            replaced = [self._row_of[str(i)] for i in image_ids if str(i) in self._row_of]
+            # Vectors first: a reader never sees a row before its vector exists
+            with open(self._file("vectors"), "ab") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+            with open(self._file("rows"), "a") as f:
+                for image_id, metadata in zip(image_ids, metadata_list):
+                    f.write(json.dumps({"id": str(image_id), "payload": metadata or {}}) + "\n")
+            self._catch_up()
+            if replaced:
+                self._tombstone(replaced)
+
+    def _tombstone(self, rows: List[int]):
+        with open(self._file("tombstones"), "a") as f:
+            f.write("".join(f"{row}\n" for row in rows))
+        self._catch_up()
+        if self._dead > self.compact_ratio * len(self._ids):
+            self.compact()
+
+    def insert_vector(self, image_id: str, vector: np.ndarray, metadata: dict = None):
+        """Insert or replace one vector and its payload."""
+        self._append([image_id], vector, [metadata])
+
+    def insert_vectors(
+        self,
+        image_ids: List[str],
+        vectors: np.ndarray,
+        metadata_list: List[dict] = None,
+        batch_size: int = 256
+    ):
+        """Append many vectors with one write per file."""
+        if metadata_list is None:
+            metadata_list = [None] * len(image_ids)
+        self._append(list(image_ids), vectors, metadata_list)
+
+    def delete_vector(self, image_id: str):
+        """Tombstone a vector by ID; compacts when too many rows are dead."""
+        self._check_writable()
+        with self._lock:
+            self._refresh()
+            row = self._row_of.get(str(image_id))
+            if row is not None:
+                self._tombstone([row])
+
+    def compact(self):
+        """Rewrite the live rows into a new generation and drop the old files."""
+        self._check_writable()
+        with self._lock:
+            live = np.flatnonzero(self._alive[:len(self._ids)])
+            old, new = self._generation, self._generation + 1
+            vectors = self._vectors()
+            with open(self._file("vectors", new), "wb") as f:
+                for start in range(0, len(live), 65536):
+                    f.write(np.ascontiguousarray(vectors[live[start:start + 65536]]).tobytes())
+            with open(self._file("rows", new), "w") as f:
+                for row in live:
+                    f.write(json.dumps({"id": self._ids[row], "payload": self._payloads[row]}) + "\n")
+            open(self._file("tombstones", new), "w").close()
+            self._write_manifest({"dim": self.dim, "dtype": self.dtype.name, "generation": new})
+            self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+            self._load()
+            # Readers that still map the old files keep working until they reload
+            for kind in ("vectors", "rows", "tombstones"):
+                path = self._file(kind, old)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # -- reads ---------------------------------------------------------------
+
+    def search_similar(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        """Exact cosine top-k: one matrix-vector product plus argpartition."""
+        return self.search_batch(
+            np.asarray(query_vector)[None], limit=limit, with_payload=with_payload,
+            with_vectors=with_vectors, score_threshold=score_threshold, filters=filters, offset=offset
+        )[0]
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        """
+        Top-k for many queries with a single pass over the index (one matrix-matrix product).
+
+        ``filters`` are checked against the payloads once per distinct filter
+        and cached as a row mask, so repeated filters cost one boolean AND.
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dim)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        with self._lock:
+            self._refresh()
+            vectors = self._vectors()
+            alive = self._alive[:len(self._ids)]
+            if filters:
+                alive = alive & self._filter_mask(filters, len(self._ids))
+            ids, payloads = self._ids, self._payloads
+        if self.dtype == np.float32:
+            scores = vectors @ queries.T
+        else:
+            # Upcast in blocks so a float16 index never gets copied whole
+            scores = np.empty((len(vectors), len(queries)), dtype=np.float32)
+            for start in range(0, len(vectors), 65536):
+                block = vectors[start:start + 65536]
+                scores[start:start + len(block)] = block.astype(np.float32) @ queries.T
+        scores[~alive] = -np.inf
+        k = min(offset + limit, int(alive.sum()))
+        results = []
+        for column in scores.T:
+            if k <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])][offset:]
+            if score_threshold is not None:
+                top = top[column[top] >= score_threshold]
+            results.append([
+                SearchHit(
+                    id=ids[i],
+                    score=float(column[i]),
+                    payload=payloads[i] if with_payload else {},
+                    vector=np.asarray(vectors[i], dtype=np.float32).tolist() if with_vectors else None
+                )
+                for i in top
+            ])
+        return results
+
+    def get_vector(self, image_id: str) -> np.ndarray:
+        with self._lock:
+            self._refresh()
+            row = self._row_of.get(str(image_id))
+            if row is None:
+                raise ValueError(f"can't find id={image_id} in the local vector index")
+            return np.asarray(self._vectors()[row], dtype=np.float32)
+
+    def retrieve(self, image_ids: List[str], with_vectors: bool = True) -> List[SearchHit]:
+        with self._lock:
+            self._refresh()
+            rows = [self._row_of[str(i)] for i in image_ids if str(i) in self._row_of]
+            vectors = self._vectors()
+            return [
+                SearchHit(
+                    id=self._ids[row],
+                    score=0.0,
+                    payload=self._payloads[row],
+                    vector=np.asarray(vectors[row], dtype=np.float32) if with_vectors else None
+                )
+                for row in rows
+            ]
+
+    def iter_vectors(self, batch_size: int = 1024) -> Iterator[Tuple[List[str], np.ndarray]]:
+        with self._lock:
+            self._refresh()
+            live = np.flatnonzero(self._alive[:len(self._ids)])
+            vectors, ids = self._vectors(), self._ids
+        for start in range(0, len(live), batch_size):
+            rows = live[start:start + batch_size]
+            yield [ids[row] for row in rows], np.asarray(vectors[rows], dtype=np.float32)
+
+    def search_similar_by_id(self, image_id: str, limit: int = 10, **search_options):
+        return self.search_similar(self.get_vector(image_id), limit=limit, **search_options)
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
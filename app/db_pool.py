@@ -0,0 +1,217 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from .config import settings
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+class PostgresPool:
+    """
+    Thread-safe, size-bounded psycopg2 connection pool.
+
+    - at most ``max_size`` connections exist at once; callers beyond that wait
+      up to ``acquire_timeout`` seconds and then get ``PoolTimeout``
+    - ``min_size`` connections are opened on first use and kept idle
+    - idle connections older than ``max_lifetime`` are closed and replaced
+    - a connection idle for more than ``health_check_after`` seconds is probed
+      with ``SELECT 1`` before being handed out; broken ones are replaced
+    """
+
+    def __init__(
+        self,
+        conn_params: dict,
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        max_lifetime: float = 1800.0,
+        health_check_after: float = 30.0,
+        connect=psycopg2.connect
+    ):
+        if min_size > max_size:
+            raise ValueError("min_size must not exceed max_size")
+        self.conn_params = conn_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._connect = connect
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []            # (conn, created_at, last_used) stack, most recent last
+        self._created_at = {}      # id(conn) -> (creation time, generation), for checked-out connections
+        self._opened = False
+        self._generation = 0       # bumped by close(); older connections are closed on return
+        self._size = 0
+        self._waiting = 0
+        self._counters = {
+            "acquired": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+        }
+        self._max_wait = 0.0
+
+    def _new_connection(self):
+        conn = self._connect(**self.conn_params)
+        with self._lock:
+            self._size += 1
+            self._counters["created"] += 1
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._counters["discarded"] += 1
+
+    def _open(self):
+        with self._lock:
+            if self._opened:
+                return
+            self._opened = True
+        for _ in range(self.min_size):
+            conn, created_at = self._new_connection()
+            with self._lock:
+                self._idle.append((conn, created_at, created_at))
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._lock:
+                self._counters["health_check_failures"] += 1
+            return False
+
+    def _checkout(self):
+        """Return a usable (conn, created_at), reusing an idle connection when possible."""
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._new_connection()
+            conn, created_at, last_used = entry
+            now = time.monotonic()
+            if conn.closed or now - created_at > self.max_lifetime:
+                self._discard(conn)
+                continue
+            if now - last_used > self.health_check_after and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn, created_at
+
+    def getconn(self):
+        """Acquire a connection; pair every call with ``putconn``."""
+        self._open()
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waiting -= 1
+            self._max_wait = max(self._max_wait, waited)
+            if not acquired:
+                self._counters["timeouts"] += 1
+        if not acquired:
+            raise PoolTimeout(
+                f"no Postgres connection available after {self.acquire_timeout:.1f}s "
+                f"(max_size={self.max_size})"
+            )
+        try:
+            conn, created_at = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._created_at[id(conn)] = (created_at, self._generation)
+            self._counters["acquired"] += 1
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection; broken or mid-transaction connections are cleaned up."""
+        with self._lock:
+            created_at, generation = self._created_at.pop(id(conn))
+            # Checked out before close(): don't put it back in the idle list
+            reusable = generation == self._generation
+        try:
+            reusable = reusable and not conn.closed
+            if reusable:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    reusable = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except Exception:
+            reusable = False
+        if reusable:
+            with self._lock:
+                self._idle.append((conn, created_at, time.monotonic()))
+        else:
+            self._discard(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage, for spotting saturation under load."""
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._created_at),
+                "waiting": self._waiting,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                **self._counters,
+            }
+
+    def close(self):
+        """Close all idle connections; checked-out ones are closed when returned."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._opened = False
+            self._generation += 1
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+
+# Shared by PostgresDB and the salon recommendation router
+pg_pool = PostgresPool(
+    conn_params={
+        'dbname': settings.POSTGRES_DB,
+        'user': settings.POSTGRES_USER,
+        'password': settings.POSTGRES_PASSWORD,
+        'host': settings.POSTGRES_HOST,
+        'port': settings.POSTGRES_PORT
+    },
+    min_size=settings.PG_POOL_MIN_SIZE,
+    max_size=settings.PG_POOL_MAX_SIZE,
+    acquire_timeout=settings.PG_POOL_ACQUIRE_TIMEOUT,
+    max_lifetime=settings.PG_POOL_MAX_LIFETIME,
+    health_check_after=settings.PG_POOL_HEALTH_CHECK_AFTER
+)
@@ -1,20 +1,33 @@
-import psycopg2
-from psycopg2.extras import DictCursor, Json
-from .config import settings
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from psycopg2.extras import DictCursor, Json, execute_values
+from .db_pool import pg_pool
+from .lazy import Lazy
+from .vector_store import SearchFilters
+
+def _metadata_conditions(filters: Optional[SearchFilters]) -> Tuple[List[str], list]:
+    """
+    SQL conditions for SearchFilters as JSONB containment, which the GIN index serves.
+
+    Each value is tried as a scalar and as a one-element list, so a filter on
+    ``tags`` matches rows whose tags array contains it, as in Qdrant.
+    """
+    conditions, params = [], []
+    for name, values in filters or ():
+        alternatives = []
+        for value in values:
+            alternatives.append("metadata @> %s OR metadata @> %s")
+            params.extend([Json({name: value}), Json({name: [value]})])
+        conditions.append(f"({' OR '.join(alternatives)})")
+    return conditions, params
+
 
 class PostgresDB:
-    def __init__(self):
-        self.conn_params = {
-            'dbname': settings.POSTGRES_DB,
-            'user': settings.POSTGRES_USER,
-            'password': settings.POSTGRES_PASSWORD,
-            'host': settings.POSTGRES_HOST,
-            'port': settings.POSTGRES_PORT
-        }
-        self._init_db()
+    def __init__(self, pool=pg_pool):
+        self.pool = pool
 
     def _init_db(self):
-        """Initialize database and create tables if they don't exist."""
+        """Initialize database and create tables if they don't exist (run by app.migrate)."""
         with self.get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
@@ -25,11 +38,40 @@ class PostgresDB:
                         metadata JSONB
                     )
                 """)
+                # Keyset pagination in upload order (get_image_metadata_page)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS pretty_images_metadata_upload_time_idx
+                    ON pretty_images_metadata (upload_time, uuid)
+                """)
+                # Containment queries on metadata (metadata @> '{"style": "french"}')
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS pretty_images_metadata_gin_idx
+                    ON pretty_images_metadata USING GIN (metadata jsonb_path_ops)
+                """)
+                # Content (sha256) and perceptual hashes of ingested images, for deduplication
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS pretty_images_hashes (
+                        content_hash TEXT PRIMARY KEY,
+                        phash BIGINT NOT NULL,
+                        uuid UUID NOT NULL REFERENCES pretty_images_metadata (uuid) ON DELETE CASCADE
+                    )
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS pretty_images_hashes_phash_idx
+                    ON pretty_images_hashes (phash)
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS pretty_images_hashes_uuid_idx
+                    ON pretty_images_hashes (uuid)
+                """)
                 conn.commit()
 
+    @contextmanager
     def get_connection(self):
-        """Get a database connection."""
-        return psycopg2.connect(**self.conn_params)
+        """Borrow a pooled connection; commits on success, rolls back on error."""
+        with self.pool.connection() as conn:
+            with conn:
+                yield conn
 
     def insert_image_metadata(self, image_uuid: str, filename: str, metadata: dict = None):
         """Insert image metadata into the database."""
@@ -44,6 +86,28 @@ class PostgresDB:
                 )
                 conn.commit()
 
+    def insert_image_metadata_many(self, rows: List[tuple]):
+        """
+        Insert many (uuid, filename, metadata) rows with a single multi-row INSERT.
+        """
+        if not rows:
+            return
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO pretty_images_metadata (uuid, filename, metadata)
+                    VALUES %s
+                    """,
+                    [
+                        (image_uuid, filename, Json(metadata) if metadata is not None else None)
+                        for image_uuid, filename, metadata in rows
+                    ],
+                    page_size=len(rows)
+                )
+                conn.commit()
+
     def get_image_metadata(self, image_uuid: str) -> dict:
         """Retrieve image metadata by UUID."""
         with self.get_connection() as conn:
@@ -57,6 +121,56 @@ class PostgresDB:
                 result = cur.fetchone()
                 return dict(result) if result else None
 
+    def get_image_metadata_many(self, image_uuids: List[str]) -> List[dict]:
+        """
+        Retrieve metadata for many UUIDs in one round trip.
+
+        Rows come back in the order of ``image_uuids``; UUIDs without a row are dropped.
+        """
+        if not image_uuids:
+            return []
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT * FROM pretty_images_metadata WHERE uuid = ANY(%s::uuid[])
+                    """,
+                    ([str(image_uuid) for image_uuid in image_uuids],)
+                )
+                rows = {str(row['uuid']): dict(row) for row in cur.fetchall()}
+        return [rows[str(image_uuid)] for image_uuid in image_uuids if str(image_uuid) in rows]
+
+    def get_image_metadata_page(
+        self,
+        after: Optional[tuple] = None,
+        limit: int = 1000,
+        filters: Optional[SearchFilters] = None
+    ) -> List[dict]:
+        """
+        Up to ``limit`` rows in (upload_time, uuid) order, starting after the
+        ``(upload_time, uuid)`` key of the last row of the previous page.
+
+        Keyset pagination: each page is an index range scan, however deep into
+        the table it starts, and rows inserted meanwhile do not shift the pages.
+        ``filters`` (see vector_store.normalize_filters) keep rows whose metadata
+        matches, with the same semantics as filtered vector search.
+        """
+        conditions, params = _metadata_conditions(filters)
+        if after is not None:
+            conditions.append("(upload_time, uuid) > (%s, %s::uuid)")
+            params.extend([after[0], str(after[1])])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(
+                    f"""
+                    SELECT * FROM pretty_images_metadata {where}
+                    ORDER BY upload_time, uuid LIMIT %s
+                    """,
+                    params + [limit]
+                )
+                return [dict(row) for row in cur.fetchall()]
+
     def delete_image_metadata(self, image_uuid: str):
         """Delete image metadata by UUID."""
         with self.get_connection() as conn:
@@ -69,6 +183,43 @@ class PostgresDB:
                 )
                 conn.commit()
 
+    def find_images_by_hash(self, content_hashes: List[str], phashes: List[int] = ()) -> List[tuple]:
+        """
+        (content_hash, phash, uuid) rows matching any of the content or perceptual hashes.
+        """
+        if not content_hashes and not phashes:
+            return []
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT content_hash, phash, uuid::text FROM pretty_images_hashes
+                    WHERE content_hash = ANY(%s::text[]) OR phash = ANY(%s::bigint[])
+                    """,
+                    (list(content_hashes), list(phashes))
+                )
+                return [tuple(row) for row in cur.fetchall()]
+
+    def insert_image_hashes(self, rows: List[tuple]):
+        """
+        Index (content_hash, phash, uuid) rows; content hashes already indexed are kept as they are.
+        """
+        if not rows:
+            return
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO pretty_images_hashes (content_hash, phash, uuid)
+                    VALUES %s
+                    ON CONFLICT (content_hash) DO NOTHING
+                    """,
+                    rows,
+                    page_size=len(rows)
+                )
+                conn.commit()
+
     def image_exists(self, image_uuid: str) -> bool:
         """Check if an image exists in the database by UUID."""
         with self.get_connection() as conn:
@@ -79,4 +230,4 @@ class PostgresDB:
                 )
                 return cur.fetchone() is not None
 
-postgres_db = PostgresDB() 
\ No newline at end of file
+postgres_db = Lazy(PostgresDB, name="postgres_db") 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from typing import List
+
+from .config import settings
+from .db_postgres import postgres_db
+from .executors import AsyncAdapter
+from .lazy import Lazy
+
+
+def _row(record) -> dict:
+    """asyncpg Record -> the dict PostgresDB returns (uuid as str)."""
+    row = dict(record)
+    if "uuid" in row:
+        row["uuid"] = str(row["uuid"])
+    return row
+
+
+class AsyncPostgresDB:
+    """
+    PostgresDB's queries on an asyncpg pool.
+
+    The pool is created on first use inside the running event loop and sized
+    by the PG_POOL_* settings; a request waits at most PG_POOL_ACQUIRE_TIMEOUT
+    for a connection. asyncpg only closes connections that sit idle, so every
+    PG_POOL_MAX_LIFETIME seconds the pool's connections are expired and each
+    is replaced on its next acquire, like PostgresPool's max_lifetime. JSONB columns are encoded / decoded as Python objects, as
+    psycopg2 does.
+    """
+
+    def __init__(self, dsn: str = None):
+        self.dsn = dsn
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self._recycled_at = time.monotonic()
+
+    @staticmethod
+    async def _init_connection(conn):
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg  # optional, only needed with ASYNC_IO_ENABLED
+                    self._pool = await asyncpg.create_pool(
+                        dsn=self.dsn,
+                        database=settings.POSTGRES_DB,
+                        user=settings.POSTGRES_USER,
+                        password=settings.POSTGRES_PASSWORD,
+                        host=settings.POSTGRES_HOST,
+                        port=settings.POSTGRES_PORT,
+                        min_size=settings.PG_POOL_MIN_SIZE,
+                        max_size=settings.PG_POOL_MAX_SIZE,
+                        init=self._init_connection
+                    )
+                    self._recycled_at = time.monotonic()
+        now = time.monotonic()
+        if now - self._recycled_at > settings.PG_POOL_MAX_LIFETIME:
+            # Every connection open now is replaced on its next acquire
+            self._recycled_at = now
+            await self._pool.expire_connections()
+        return self._pool
+
+    async def fetch(self, query: str, *args) -> list:
+        """Run a query on a pooled connection and return its records."""
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=settings.PG_POOL_ACQUIRE_TIMEOUT) as conn:
+            return await conn.fetch(query, *args)
+
+    async def execute(self, query: str, *args):
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=settings.PG_POOL_ACQUIRE_TIMEOUT) as conn:
+            return await conn.execute(query, *args)
+
+    async def insert_image_metadata(self, image_uuid: str, filename: str, metadata: dict = None):
+        """Insert image metadata into the database."""
+        await self.execute(
+            "INSERT INTO pretty_images_metadata (uuid, filename, metadata) VALUES ($1, $2, $3)",
+            str(image_uuid), filename, metadata
+        )
+
+    async def insert_image_metadata_many(self, rows: List[tuple]):
+        """Insert many (uuid, filename, metadata) rows in one pipelined executemany."""
+        if not rows:
+            return
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=settings.PG_POOL_ACQUIRE_TIMEOUT) as conn:
+            await conn.executemany(
+                "INSERT INTO pretty_images_metadata (uuid, filename, metadata) VALUES ($1, $2, $3)",
+                [(str(image_uuid), filename, metadata) for image_uuid, filename, metadata in rows]
+            )
+
+    async def get_image_metadata(self, image_uuid: str) -> dict:
+        """Retrieve image metadata by UUID."""
+        records = await self.fetch("SELECT * FROM pretty_images_metadata WHERE uuid = $1", str(image_uuid))
+        return _row(records[0]) if records else None
+
+    async def get_image_metadata_many(self, image_uuids: List[str]) -> List[dict]:
+        """Rows for many UUIDs in one round trip, in the order of ``image_uuids``; missing ones dropped."""
+        if not image_uuids:
+            return []
+        records = await self.fetch(
+            "SELECT * FROM pretty_images_metadata WHERE uuid = ANY($1::uuid[])",
+            [str(image_uuid) for image_uuid in image_uuids]
+        )
+        rows = {row["uuid"]: row for row in map(_row, records)}
+        return [rows[str(image_uuid)] for image_uuid in image_uuids if str(image_uuid) in rows]
+
+    async def delete_image_metadata(self, image_uuid: str):
+        """Delete image metadata by UUID."""
+        await self.execute("DELETE FROM pretty_images_metadata WHERE uuid = $1", str(image_uuid))
+
+    async def find_images_by_hash(self, content_hashes: List[str], phashes: List[int] = ()) -> List[tuple]:
+        """(content_hash, phash, uuid) rows matching any of the content or perceptual hashes."""
+        if not content_hashes and not phashes:
+            return []
+        records = await self.fetch(
+            "SELECT content_hash, phash, uuid::text FROM pretty_images_hashes "
+            "WHERE content_hash = ANY($1::text[]) OR phash = ANY($2::bigint[])",
+            list(content_hashes), list(phashes)
+        )
+        return [tuple(record) for record in records]
+
+    async def insert_image_hashes(self, rows: List[tuple]):
+        """Index (content_hash, phash, uuid) rows; content hashes already indexed are kept as they are."""
+        if not rows:
+            return
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=settings.PG_POOL_ACQUIRE_TIMEOUT) as conn:
+            await conn.executemany(
+                "INSERT INTO pretty_images_hashes (content_hash, phash, uuid) VALUES ($1, $2, $3) "
+                "ON CONFLICT (content_hash) DO NOTHING",
+                [(content_hash, phash, str(image_uuid)) for content_hash, phash, image_uuid in rows]
+            )
+
+    async def image_exists(self, image_uuid: str) -> bool:
+        """Check if an image exists in the database by UUID."""
+        records = await self.fetch("SELECT 1 FROM pretty_images_metadata WHERE uuid = $1 LIMIT 1", str(image_uuid))
+        return bool(records)
+
+    async def aclose(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def create_async_postgres_db():
+    """AsyncPostgresDB with ASYNC_IO_ENABLED, otherwise PostgresDB on the I/O pool."""
+    if settings.ASYNC_IO_ENABLED:
+        return AsyncPostgresDB()
+    return AsyncAdapter(postgres_db)
+
+
+async_postgres_db = Lazy(create_async_postgres_db, name="async_postgres_db")
@@ -2,71 +2,341 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams, PointStruct, PointIdsList
 import numpy as np
+from typing import Iterator, List, Optional, Tuple
 from .config import settings
+from .lazy import Lazy
+from .vector_store import SearchFilters, SearchHit, VectorStore, filter_fields
 
-class QdrantDB:
-    def __init__(self):
-        self.client = QdrantClient(
+class QdrantDB(VectorStore):
+    def __init__(self, client: QdrantClient = None, collection: Optional[str] = None):
+        # Pass a client to use e.g. QdrantClient(":memory:") instead of the server;
+        # ``collection`` (a collection or alias name) defaults to QDRANT_COLLECTION
+        self._collection = collection
+        self.client = client or QdrantClient(
             host=settings.QDRANT_HOST,
-            port=settings.QDRANT_PORT
+            port=settings.QDRANT_PORT,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            api_key=settings.QDRANT_API_KEY or None,
+            https=settings.QDRANT_HTTPS
         )
-        self._ensure_collection_exists()
 
-    def _ensure_collection_exists(self):
-        """Create collection only if it does not exist."""
-        existing = self.client.get_collections().collections
-        if settings.QDRANT_COLLECTION not in [c.name for c in existing]:
+    @property
+    def collection(self) -> str:
+        return self._collection or settings.QDRANT_COLLECTION
+
+    @staticmethod
+    def collection_config() -> dict:
+        """HNSW, optimizer and quantization settings for create/update_collection."""
+        quantization = None
+        if settings.QDRANT_SCALAR_QUANTIZATION:
+            quantization = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=settings.QDRANT_QUANTIZATION_QUANTILE,
+                    always_ram=True
+                )
+            )
+        return {
+            "hnsw_config": models.HnswConfigDiff(
+                m=settings.QDRANT_HNSW_M,
+                ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+                on_disk=settings.QDRANT_ON_DISK
+            ),
+            "optimizers_config": models.OptimizersConfigDiff(
+                indexing_threshold=settings.QDRANT_INDEXING_THRESHOLD,
+                memmap_threshold=settings.QDRANT_MEMMAP_THRESHOLD or None
+            ),
+            "quantization_config": quantization
+        }
+
+    def ensure_collection(self, vector_size: Optional[int] = None):
+        """
+        Create the collection unless a collection or alias has its name, and
+        its payload indexes (run by app.migrate).
+        """
+        if self.collection not in self.collection_names():
             self.client.create_collection(
-                collection_name=settings.QDRANT_COLLECTION,
+                collection_name=self.collection,
                 vectors_config=VectorParams(
-                    size=settings.VECTOR_SIZE,
-                    distance=Distance.COSINE
+                    size=vector_size or settings.VECTOR_SIZE,
+                    distance=Distance.COSINE,
+                    on_disk=settings.QDRANT_ON_DISK
+                ),
+                **self.collection_config()
+            )
+        self.ensure_payload_indexes()
+
+    def ensure_payload_indexes(self):
+        """
+        Keyword index on every SEARCH_FILTER_FIELDS field that lacks one.
+
+        Qdrant uses them to estimate how selective a filter is: a selective one
+        is answered by scanning just the matching points, a broad one by HNSW
+        with the filter checked during traversal. Created before the bulk of
+        the points, they also add filter-aware links to the HNSW graph.
+        """
+        if self._is_local():
+            return
+        indexed = self.client.get_collection(self.collection).payload_schema or {}
+        for name in filter_fields():
+            if name not in indexed:
+                self.client.create_payload_index(
+                    collection_name=self.collection,
+                    field_name=name,
+                    field_schema=models.PayloadSchemaType.KEYWORD
                 )
+
+    def _is_local(self) -> bool:
+        # QdrantClient(":memory:") or a local path: filters scan every point, payload indexes are ignored
+        from qdrant_client.local.qdrant_local import QdrantLocal
+        return isinstance(getattr(self.client, "_client", None), QdrantLocal)
+
+    def collection_names(self) -> List[str]:
+        """Every collection and alias on the server."""
+        names = [c.name for c in self.client.get_collections().collections]
+        return names + [a.alias_name for a in self.client.get_aliases().aliases]
+
+    def resolve_collection(self) -> str:
+        """The collection behind ``collection``, following an alias."""
+        aliases = {a.alias_name: a.collection_name for a in self.client.get_aliases().aliases}
+        return aliases.get(self.collection, self.collection)
+
+    def update_collection_config(self):
+        """Apply the tuning settings to an existing collection; Qdrant rebuilds in the background."""
+        config = self.collection_config()
+        if config["quantization_config"] is None:
+            config["quantization_config"] = models.Disabled.DISABLED
+        self.client.update_collection(
+            collection_name=self.resolve_collection(),
+            vectors_config={"": models.VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK)},
+            **config
+        )
+
+    def point_alias(self, alias: str, replace_collection: bool = False) -> Optional[str]:
+        """
+        Atomically point ``alias`` at this collection; return the collection it pointed at before.
+
+        Deleting the old alias and creating the new one is a single request, so
+        searches through the alias see either collection, never neither. If
+        ``alias`` is still a plain collection (deployments from before aliases),
+        that collection has to be deleted first, which ``replace_collection``
+        allows: searches fail in between, and there is nothing to roll back to.
+        """
+        aliases = {a.alias_name: a.collection_name for a in self.client.get_aliases().aliases}
+        previous = aliases.get(alias)
+        operations = []
+        if previous is not None:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+        elif alias in [c.name for c in self.client.get_collections().collections]:
+            if not replace_collection:
+                raise ValueError(f"{alias!r} is a collection, not an alias; pass replace_collection to delete it")
+            self.client.delete_collection(alias)
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=self.collection, alias_name=alias)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        return previous
+
+    @staticmethod
+    def search_params(hnsw_ef: Optional[int] = None) -> Optional[models.SearchParams]:
+        """Per-query params from settings; ``hnsw_ef`` overrides QDRANT_SEARCH_HNSW_EF."""
+        hnsw_ef = hnsw_ef or settings.QDRANT_SEARCH_HNSW_EF or None
+        quantization = None
+        if settings.QDRANT_SCALAR_QUANTIZATION:
+            quantization = models.QuantizationSearchParams(rescore=settings.QDRANT_QUANTIZATION_RESCORE)
+        if hnsw_ef is None and quantization is None and not settings.QDRANT_SEARCH_EXACT:
+            return None
+        return models.SearchParams(hnsw_ef=hnsw_ef, exact=settings.QDRANT_SEARCH_EXACT, quantization=quantization)
+
+    @staticmethod
+    def query_filter(filters: Optional[SearchFilters]) -> Optional[models.Filter]:
+        """A Qdrant filter for normalized SearchFilters: every field must match one of its values."""
+        if not filters:
+            return None
+        return models.Filter(must=[
+            models.FieldCondition(
+                key=name,
+                match=models.MatchValue(value=values[0]) if len(values) == 1 else models.MatchAny(any=list(values))
             )
+            for name, values in filters
+        ])
+
+    @staticmethod
+    def points(image_ids: List[str], vectors: np.ndarray, metadata_list: List[dict] = None) -> List[PointStruct]:
+        if metadata_list is None:
+            metadata_list = [None] * len(image_ids)
+        return [
+            PointStruct(id=image_id, vector=np.asarray(vector).tolist(), payload=metadata or {})
+            for image_id, vector, metadata in zip(image_ids, vectors, metadata_list)
+        ]
+
+    @staticmethod
+    def search_requests(
+        query_vectors: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> List[models.SearchRequest]:
+        params = QdrantDB.search_params(hnsw_ef)
+        query_filter = QdrantDB.query_filter(filters)
+        return [
+            models.SearchRequest(
+                vector=np.asarray(query).tolist(),
+                filter=query_filter,
+                limit=limit,
+                params=params,
+                with_payload=with_payload,
+                with_vector=with_vectors,
+                score_threshold=score_threshold
+            )
+            for query in query_vectors
+        ]
 
     def insert_vector(self, image_id: str, vector: np.ndarray, metadata: dict = None):
         """Insert a vector and optional metadata into Qdrant."""
-        point = PointStruct(
-            id=image_id,
-            vector=vector.tolist(),
-            payload=metadata or {}
-        )
         self.client.upsert(
-            collection_name=settings.QDRANT_COLLECTION,
-            points=[point]
+            collection_name=self.collection,
+            points=self.points([image_id], [vector], [metadata])
         )
 
-    def search_similar(self, query_vector: np.ndarray, limit: int = 10):
+    def insert_vectors(
+        self,
+        image_ids: List[str],
+        vectors: np.ndarray,
+        metadata_list: List[dict] = None,
+        batch_size: int = 256
+    ):
+        """Upsert many vectors, ``batch_size`` points per request."""
+        points = self.points(image_ids, vectors, metadata_list)
+        for start in range(0, len(points), batch_size):
+            self.client.upsert(
+                collection_name=self.collection,
+                points=points[start:start + batch_size]
+            )
+
+    def search_similar(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
         """Return top-k similar vectors."""
         return self.client.search(
-            collection_name=settings.QDRANT_COLLECTION,
-            query_vector=query_vector.tolist(),
-            limit=limit
+            collection_name=self.collection,
+            query_vector=np.asarray(query_vector).tolist(),
+            query_filter=self.query_filter(filters),
+            search_params=self.search_params(hnsw_ef),
+            limit=limit,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            score_threshold=score_threshold
+        )
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None
+    ):
+        """All queries in one request; one result list per query in order."""
+        requests = self.search_requests(
+            query_vectors, limit, with_payload, with_vectors, score_threshold, hnsw_ef, filters
         )
+        if not requests:
+            return []
+        return self.client.search_batch(collection_name=self.collection, requests=requests)
 
     def delete_vector(self, image_id: str):
         """Delete a vector by ID."""
         self.client.delete(
-            collection_name=settings.QDRANT_COLLECTION,
+            collection_name=self.collection,
             points_selector=PointIdsList(points=[image_id])
         )
+
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection, exact=True).count
+
+    def retrieve(self, image_ids: List[str], with_vectors: bool = True) -> List[SearchHit]:
+        points = self.client.retrieve(
+            collection_name=self.collection,
+            ids=list(image_ids),
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [SearchHit(id=str(p.id), score=0.0, payload=p.payload or {}, vector=p.vector) for p in points]
+
+    def iter_vectors(self, batch_size: int = 1024) -> Iterator[Tuple[List[str], np.ndarray]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=True
+            )
+            if points:
+                yield [str(p.id) for p in points], np.array([p.vector for p in points], dtype=np.float32)
+            if offset is None:
+                return
+
     # search by id after user click the image
-    def search_similar_by_id(self, image_id: str, limit: int = 10):
+    def search_similar_by_id(self, image_id: str, limit: int = 10, **search_options):
+        """Fetch the stored vector, then search with it (two round trips; includes ``image_id``)."""
         point = self.client.retrieve(
-            collection_name=settings.QDRANT_COLLECTION,
-            ids=[image_id]
+            collection_name=self.collection,
+            ids=[image_id],
+            with_vectors=True
         )
-        if not point or not hasattr(point[0], 'vectors'):
+        if not point or point[0].vector is None:
             raise ValueError(f"can't find id={image_id} vectors, please check Qdrant data!")
-        vectors = point[0].vectors
+        vectors = point[0].vector
         # return 'default' vectors
         if isinstance(vectors, dict):
             embedding = vectors.get('default') or list(vectors.values())[0]
         else:
             embedding = vectors
-        if embedding is None:
-            raise ValueError(f"can't find id={image_id} embedding, please check Qdrant data!")
-        return self.search_similar(embedding, limit=limit)
+        return self.search_similar(embedding, limit=limit, **search_options)
+
+    def recommend(
+        self,
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        """Server-side lookup + search in one call; the input ids are excluded."""
+        return self.client.recommend(
+            collection_name=self.collection,
+            positive=list(positive_ids),
+            negative=list(negative_ids or []),
+            query_filter=self.query_filter(filters),
+            search_params=self.search_params(hnsw_ef),
+            limit=limit,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            score_threshold=score_threshold
+        )
 
-# Create singleton instance
-qdrant_db = QdrantDB()
+# Create singleton instance on first use
+qdrant_db = Lazy(QdrantDB, name="qdrant_db")
@@ -0,0 +1,124 @@
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import PointIdsList
+
+from .config import settings
+from .db_qdrant import QdrantDB
+from .vector_store import SearchFilters, SearchHit
+
+
+class AsyncQdrantDB:
+    """
+    QdrantDB's data path on AsyncQdrantClient.
+
+    Same collection, settings and return values as QdrantDB, but every call is
+    a coroutine, so a worker can keep many searches in flight without an I/O
+    thread per request. Collection management stays on QdrantDB (app.migrate).
+    """
+
+    def __init__(self, client: AsyncQdrantClient = None):
+        self.client = client or AsyncQdrantClient(
+            host=settings.QDRANT_HOST,
+            port=settings.QDRANT_PORT,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            api_key=settings.QDRANT_API_KEY or None,
+            https=settings.QDRANT_HTTPS
+        )
+
+    async def insert_vector(self, image_id: str, vector: np.ndarray, metadata: dict = None):
+        await self.client.upsert(
+            collection_name=settings.QDRANT_COLLECTION,
+            points=QdrantDB.points([image_id], [vector], [metadata])
+        )
+
+    async def insert_vectors(
+        self,
+        image_ids: List[str],
+        vectors: np.ndarray,
+        metadata_list: List[dict] = None,
+        batch_size: int = 256
+    ):
+        points = QdrantDB.points(image_ids, vectors, metadata_list)
+        for start in range(0, len(points), batch_size):
+            await self.client.upsert(
+                collection_name=settings.QDRANT_COLLECTION,
+                points=points[start:start + batch_size]
+            )
+
+    async def search_similar(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        return await self.client.search(
+            collection_name=settings.QDRANT_COLLECTION,
+            query_vector=np.asarray(query_vector).tolist(),
+            query_filter=QdrantDB.query_filter(filters),
+            search_params=QdrantDB.search_params(hnsw_ef),
+            limit=limit,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            score_threshold=score_threshold
+        )
+
+    async def search_batch(self, query_vectors: np.ndarray, limit: int = 10, **search_options):
+        requests = QdrantDB.search_requests(query_vectors, limit, **search_options)
+        if not requests:
+            return []
+        return await self.client.search_batch(collection_name=settings.QDRANT_COLLECTION, requests=requests)
+
+    async def recommend(
+        self,
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        return await self.client.recommend(
+            collection_name=settings.QDRANT_COLLECTION,
+            positive=list(positive_ids),
+            negative=list(negative_ids or []),
+            query_filter=QdrantDB.query_filter(filters),
+            search_params=QdrantDB.search_params(hnsw_ef),
+            limit=limit,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            score_threshold=score_threshold
+        )
+
+    async def retrieve(self, image_ids: List[str], with_vectors: bool = True) -> List[SearchHit]:
+        points = await self.client.retrieve(
+            collection_name=settings.QDRANT_COLLECTION,
+            ids=list(image_ids),
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [SearchHit(id=str(p.id), score=0.0, payload=p.payload or {}, vector=p.vector) for p in points]
+
+    async def delete_vector(self, image_id: str):
+        await self.client.delete(
+            collection_name=settings.QDRANT_COLLECTION,
+            points_selector=PointIdsList(points=[image_id])
+        )
+
+    async def count(self) -> int:
+        return (await self.client.count(collection_name=settings.QDRANT_COLLECTION, exact=True)).count
+
+    async def aclose(self):
+        await self.client.close()
@@ -0,0 +1,259 @@
+"""
+Duplicate detection at ingest, and stored-embedding reuse for query images.
+
+Every ingested image is indexed in ``pretty_images_hashes`` by the sha256 of
+its bytes and a 64-bit perceptual hash (dHash) of its pixels. Before an image
+is embedded:
+
+- the same bytes (content hash), or with DEDUP_PERCEPTUAL the same picture
+  re-encoded or resized (perceptual hash), resolve to the stored image, so no
+  CLIP pass, S3 upload or new vector point is made and its id is returned.
+  Re-encoding often flips a single bit of the perceptual hash, so with
+  DEDUP_PHASH_DISTANCE=1 the lookup also probes the 64 one-bit neighbours,
+  which keeps it an index lookup rather than a Hamming scan
+- with DEDUP_COSINE_THRESHOLD > 0, a new image whose nearest stored vector is
+  at least that similar is also treated as a copy of it (one vector lookup
+  per image, after embedding)
+
+Copies get their own hashes indexed against the stored image, so the next
+time they are a hash hit. ``stored_embeddings`` lets image search reuse the
+stored vector of an upload that was ingested instead of running CLIP on it.
+
+Deduplication is an optimization: if the hashes table can't be read or
+written (e.g. it is not migrated yet) a warning is logged, the batch is
+treated as all new and the query image is simply embedded.
+
+Perceptual matching is opt-in: distinct but similar photos can share a dHash,
+and a match drops the new upload in favour of the stored image.
+"""
+import logging
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .config import settings
+from .metrics import span
+from .search_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: on a 9x8 grayscale thumbnail, whether each pixel is
+    brighter than its right neighbour. Survives re-encoding, resizing and small
+    colour shifts. Returned as a signed int64 to fit a Postgres BIGINT.
+    """
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return _signed(int.from_bytes(np.packbits(bits).tobytes(), "big"))
+
+
+def image_hashes(image_data: bytes, image: Image.Image) -> Tuple[str, int]:
+    """(content hash, perceptual hash) of a decoded upload."""
+    return content_hash(image_data), perceptual_hash(image)
+
+
+def _signed(value: int) -> int:
+    value &= (1 << 64) - 1
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def phash_probes(phash: int) -> List[int]:
+    """``phash`` first, then every hash within DEDUP_PHASH_DISTANCE bits of it."""
+    if not phash:
+        # A zero hash is a flat image with no gradients, which says nothing about its content
+        return []
+    if settings.DEDUP_PHASH_DISTANCE == 0:
+        return [phash]
+    return [phash] + [_signed(phash ^ (1 << bit)) for bit in range(64)]
+
+
+class DedupPlan:
+    """
+    Which images of a batch are new, and the id each one ends up with.
+
+    Duplicates, of stored images or of an earlier image in the same batch, get
+    the id of the image they duplicate; new images get a fresh uuid4.
+    """
+
+    def __init__(self, hashes: Optional[List[Tuple[str, int]]], known_rows: Sequence[tuple] = (), count: int = 0):
+        self.hashes = hashes
+        self.dropped = set()
+        if hashes is None:
+            # Deduplication off: everything is new
+            self.image_ids = [str(uuid.uuid4()) for _ in range(count)]
+            self.new = [True] * count
+            self.known_content = set()
+            return
+        by_content = {row[0]: str(row[2]) for row in known_rows}
+        by_phash = {row[1]: str(row[2]) for row in known_rows} if settings.DEDUP_PERCEPTUAL else {}
+        self.known_content = set(by_content)
+        self.image_ids = []
+        self.new = []
+        for digest, phash in hashes:
+            image_id = by_content.get(digest)
+            if image_id is None and settings.DEDUP_PERCEPTUAL:
+                image_id = next((by_phash[p] for p in phash_probes(phash) if p in by_phash), None)
+            self.new.append(image_id is None)
+            if image_id is None:
+                image_id = by_content[digest] = str(uuid.uuid4())
+                if settings.DEDUP_PERCEPTUAL and phash:
+                    by_phash.setdefault(phash, image_id)
+            self.image_ids.append(image_id)
+
+    @property
+    def new_indices(self) -> List[int]:
+        return [i for i, new in enumerate(self.new) if new]
+
+    @property
+    def duplicates(self) -> int:
+        return self.new.count(False)
+
+    def reject_near_duplicates(self, indices: List[int], hit_lists):
+        """Point each image in ``indices`` whose search hit list is non-empty at its top hit."""
+        replaced = {}
+        for i, hits in zip(indices, hit_lists):
+            if hits:
+                replaced[self.image_ids[i]] = str(hits[0].id)
+                self.new[i] = False
+        # Later copies of a rejected image in the same batch follow it
+        self.image_ids = [replaced.get(image_id, image_id) for image_id in self.image_ids]
+
+    def drop(self, indices: List[int]) -> List[int]:
+        """
+        Give up on the new images in ``indices`` (e.g. their upload failed) and
+        on their copies in the same batch; returns every index dropped.
+        """
+        lost = {self.image_ids[i] for i in indices if self.new[i]}
+        dropped = [i for i, image_id in enumerate(self.image_ids) if image_id in lost]
+        for i in dropped:
+            self.new[i] = False
+        self.dropped.update(dropped)
+        return dropped
+
+    def hash_rows(self) -> List[tuple]:
+        """(content_hash, phash, uuid) rows for every content hash not indexed yet."""
+        if self.hashes is None:
+            return []
+        rows = {}
+        for i, ((digest, phash), image_id) in enumerate(zip(self.hashes, self.image_ids)):
+            if digest not in self.known_content and i not in self.dropped:
+                rows.setdefault(digest, (digest, phash, image_id))
+        return list(rows.values())
+
+
+def _lookup_args(hashes: List[Tuple[str, int]]):
+    phashes = [probe for _, phash in hashes for probe in phash_probes(phash)] if settings.DEDUP_PERCEPTUAL else []
+    return [digest for digest, _ in hashes], phashes
+
+
+def plan_batch(postgres_db, image_data_list: List[bytes], images: List[Image.Image]) -> DedupPlan:
+    """Hash a batch and look every image up in one query (everything is new with DEDUP_ENABLED off)."""
+    if not settings.DEDUP_ENABLED:
+        return DedupPlan(None, count=len(images))
+    with span("dedup"):
+        hashes = [image_hashes(data, image) for data, image in zip(image_data_list, images)]
+        try:
+            return DedupPlan(hashes, postgres_db.find_images_by_hash(*_lookup_args(hashes)))
+        except Exception:
+            logger.warning("duplicate lookup failed, ingesting the batch without deduplication", exc_info=True)
+            return DedupPlan(None, count=len(images))
+
+
+async def plan_batch_async(postgres_db, image_data_list: List[bytes], images: List[Image.Image]) -> DedupPlan:
+    """plan_batch on an async Postgres handle."""
+    if not settings.DEDUP_ENABLED:
+        return DedupPlan(None, count=len(images))
+    with span("dedup"):
+        hashes = [image_hashes(data, image) for data, image in zip(image_data_list, images)]
+        try:
+            return DedupPlan(hashes, await postgres_db.find_images_by_hash(*_lookup_args(hashes)))
+        except Exception:
+            logger.warning("duplicate lookup failed, ingesting the batch without deduplication", exc_info=True)
+            return DedupPlan(None, count=len(images))
+
+
+def _near_duplicate_options() -> dict:
+    return {"limit": 1, "with_payload": False, "score_threshold": settings.DEDUP_COSINE_THRESHOLD}
+
+
+def check_near_duplicates(vector_db, plan: DedupPlan, indices: List[int], embeddings):
+    """With DEDUP_COSINE_THRESHOLD, reject images in ``indices`` (embedded as ``embeddings``) close to a stored one."""
+    if plan.hashes is None or not settings.DEDUP_COSINE_THRESHOLD or not indices:
+        return
+    with span("dedup"):
+        plan.reject_near_duplicates(indices, vector_db.search_batch(np.asarray(embeddings), **_near_duplicate_options()))
+
+
+async def check_near_duplicates_async(vector_db, plan: DedupPlan, indices: List[int], embeddings):
+    """check_near_duplicates on an async vector store handle."""
+    if plan.hashes is None or not settings.DEDUP_COSINE_THRESHOLD or not indices:
+        return
+    with span("dedup"):
+        hit_lists = await vector_db.search_batch(np.asarray(embeddings), **_near_duplicate_options())
+    plan.reject_near_duplicates(indices, hit_lists)
+
+
+def index_hashes(postgres_db, plan: DedupPlan):
+    """Index the hashes of every image in ``plan`` not indexed yet (after their metadata rows exist)."""
+    rows = plan.hash_rows()
+    if rows:
+        with span("metadata_write"):
+            try:
+                postgres_db.insert_image_hashes(rows)
+            except Exception:
+                # The images are stored already; only their later dedup is lost
+                logger.warning("indexing %d image hashes failed", len(rows), exc_info=True)
+
+
+async def index_hashes_async(postgres_db, plan: DedupPlan):
+    """index_hashes on an async Postgres handle."""
+    rows = plan.hash_rows()
+    if rows:
+        with span("metadata_write"):
+            try:
+                await postgres_db.insert_image_hashes(rows)
+            except Exception:
+                logger.warning("indexing %d image hashes failed", len(rows), exc_info=True)
+
+
+def _vectors_by_hash(rows, hits) -> Dict[str, np.ndarray]:
+    vectors = {str(hit.id): hit.vector for hit in hits if hit.vector is not None}
+    return {
+        digest: np.asarray(vectors[str(image_id)], dtype=np.float32)
+        for digest, _, image_id in rows
+        if str(image_id) in vectors
+    }
+
+
+def stored_embeddings(postgres_db, vector_db, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+    """content hash -> stored embedding, for the uploads that were ingested byte for byte."""
+    if not settings.DEDUP_ENABLED or not content_hashes:
+        return {}
+    with span("dedup"):
+        try:
+            rows = postgres_db.find_images_by_hash(content_hashes)
+            if not rows:
+                return {}
+            return _vectors_by_hash(rows, vector_db.retrieve([row[2] for row in rows], with_vectors=True))
+        except Exception:
+            logger.warning("stored embedding lookup failed, embedding the query", exc_info=True)
+            return {}
+
+
+async def stored_embeddings_async(postgres_db, vector_db, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+    """stored_embeddings on async handles."""
+    if not settings.DEDUP_ENABLED or not content_hashes:
+        return {}
+    with span("dedup"):
+        try:
+            rows = await postgres_db.find_images_by_hash(content_hashes)
+            if not rows:
+                return {}
+            return _vectors_by_hash(rows, await vector_db.retrieve([row[2] for row in rows], with_vectors=True))
+        except Exception:
+            logger.warning("stored embedding lookup failed, embedding the query", exc_info=True)
+            return {}
@@ -1,37 +1,240 @@
+import contextlib
+import hashlib
+import inspect
+import logging
+import os
+import re
+
 import torch
 import open_clip
 from PIL import Image
 import numpy as np
 
+from .batcher import EmbeddingBatcher
+from .config import settings
+from .executors import cpu_executor, torch_num_threads
+from .lazy import Lazy
+from .metrics import span
+
+INFERENCE_MODES = ("fp32", "inference_mode", "int8", "bf16", "onnx")
+
+logger = logging.getLogger(__name__)
+
+
+class _ImageTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, images):
+        return self.model.encode_image(images)
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+def _file_name_part(value: str) -> str:
+    """``value`` (a model name, a weights path or an hf-hub: id) made safe for a file name."""
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", value)
+    if safe != value:
+        # Keep distinct values distinct once their separators are replaced
+        safe += "-" + hashlib.sha1(value.encode()).hexdigest()[:8]
+    return safe
+
+
+class OnnxCLIPTowers:
+    """
+    Image and text towers exported to ONNX and run with ONNX Runtime.
+
+    Exports are cached in ONNX_CACHE_DIR per model and weights. Workers of one
+    host may export at the same time: each writes a temporary file and renames
+    it into place, so a cached file is always complete.
+    """
+
+    def __init__(self, model, model_name: str, pretrained: str, num_threads: int):
+        import onnxruntime as ort
+
+        cache_dir = settings.ONNX_CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        # Random weights differ per process, so their export is this process's own
+        weights = _file_name_part(pretrained) if pretrained is not None else f"random-{os.getpid()}"
+        prefix = os.path.join(cache_dir, f"{_file_name_part(model_name)}-{weights}")
+        image_path, text_path = f"{prefix}-image.onnx", f"{prefix}-text.onnx"
+        image_size = model.visual.image_size
+        if isinstance(image_size, int):
+            image_size = (image_size, image_size)
+        context_length = model.context_length
+        # Random weights differ per run, so never reuse their export
+        if pretrained is None or not os.path.exists(image_path):
+            self._export(_ImageTower(model), torch.zeros(1, 3, *image_size), "images", image_path)
+        if pretrained is None or not os.path.exists(text_path):
+            tokens = torch.zeros(1, context_length, dtype=torch.long)
+            self._export(_TextTower(model), tokens, "tokens", text_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CPUExecutionProvider"]
+        self.image_session = ort.InferenceSession(image_path, options, providers=providers)
+        self.text_session = ort.InferenceSession(text_path, options, providers=providers)
+        if pretrained is None:
+            # The sessions hold the graphs; nothing else can use these files
+            for path in (image_path, text_path):
+                os.remove(path)
+
+    @staticmethod
+    def _export(tower, example, input_name, path):
+        tower.eval()
+        kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            kwargs["dynamo"] = False   # newer torch defaults to the dynamo exporter
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with torch.no_grad():
+                torch.onnx.export(
+                    tower, (example,), tmp,
+                    input_names=[input_name],
+                    output_names=["embeddings"],
+                    dynamic_axes={input_name: {0: "batch"}, "embeddings": {0: "batch"}},
+                    opset_version=17,
+                    **kwargs
+                )
+            # Atomic: concurrent exporters each replace it with a complete file
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def encode_image(self, images: torch.Tensor) -> np.ndarray:
+        return self.image_session.run(None, {"images": images.numpy()})[0]
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        return self.text_session.run(None, {"tokens": tokens.numpy().astype(np.int64)})[0]
+
+
 class OpenCLIPEmbedder:
-    def __init__(self):
+    """
+    OpenCLIP image/text embedder with selectable CPU inference backends.
+
+    ``inference_mode`` (default: settings.CLIP_INFERENCE_MODE):
+
+    - ``fp32``: eager fp32 under torch.no_grad (the original behaviour)
+    - ``inference_mode``: eager fp32 under torch.inference_mode
+    - ``int8``: dynamic int8 quantization of the Linear layers
+    - ``bf16``: bfloat16 autocast, falls back to fp32 if the CPU lacks support
+    - ``onnx``: towers exported to ONNX and run with ONNX Runtime
+      (needs the optional ``onnx`` and ``onnxruntime`` packages)
+    """
+
+    def __init__(
+        self,
+        model_name: str = 'ViT-B-32',
+        pretrained: str = 'laion2b_s34b_b79k',
+        inference_mode: str = None
+    ):
+        inference_mode = inference_mode or settings.CLIP_INFERENCE_MODE
+        if inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"unknown CLIP_INFERENCE_MODE {inference_mode!r}, expected one of {INFERENCE_MODES}")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        num_threads = torch_num_threads()
+        torch.set_num_threads(num_threads)
         self.model, _, self.preprocess = open_clip.create_model_and_transforms(
-            'ViT-B-32', pretrained='laion2b_s34b_b79k'
+            model_name, pretrained=pretrained
         )
         self.model = self.model.to(self.device)
-        self.tokenizer = open_clip.get_tokenizer('ViT-B-32')
+        self.model.eval()
+        self.tokenizer = open_clip.get_tokenizer(model_name)
+
+        if inference_mode != "fp32" and self.device != "cpu":
+            logger.warning("CLIP_INFERENCE_MODE=%s is CPU-only, using fp32 on %s", inference_mode, self.device)
+            inference_mode = "fp32"
+        if inference_mode == "bf16" and not torch.ops.mkldnn._is_mkldnn_bf16_supported():
+            logger.warning("bf16 is not supported on this CPU, using fp32")
+            inference_mode = "fp32"
+        if inference_mode == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            # open_clip reads the text tower's cast dtype from an MLP weight,
+            # which is a packed-params method after quantization; inputs stay fp32
+            if hasattr(self.model, "transformer"):
+                self.model.transformer.get_cast_dtype = lambda: torch.float32
+        self.onnx = None
+        if inference_mode == "onnx":
+            self.onnx = OnnxCLIPTowers(self.model, model_name, pretrained, num_threads)
+        self.inference_mode = inference_mode
+
+    def _inference_context(self):
+        if self.inference_mode == "fp32":
+            return torch.no_grad()
+        if self.inference_mode == "bf16":
+            stack = contextlib.ExitStack()
+            stack.enter_context(torch.inference_mode())
+            stack.enter_context(torch.autocast(device_type="cpu", dtype=torch.bfloat16))
+            return stack
+        return torch.inference_mode()
+
+    def _encode_images(self, image_tensors: torch.Tensor) -> np.ndarray:
+        with span("inference"):
+            if self.onnx is not None:
+                return self.onnx.encode_image(image_tensors)
+            with self._inference_context():
+                return self.model.encode_image(image_tensors.to(self.device)).float().cpu().numpy()
+
+    def _encode_texts(self, tokens: torch.Tensor) -> np.ndarray:
+        with span("inference"):
+            if self.onnx is not None:
+                return self.onnx.encode_text(tokens)
+            with self._inference_context():
+                return self.model.encode_text(tokens.to(self.device)).float().cpu().numpy()
 
     def get_image_embedding(self, image: Image.Image) -> np.ndarray:
-        image_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            embedding = self.model.encode_image(image_tensor).squeeze().cpu().numpy()
+        with span("preprocess"):
+            image_tensor = self.preprocess(image).unsqueeze(0)
+        embedding = self._encode_images(image_tensor).squeeze()
         normalized_embedding = embedding / np.linalg.norm(embedding)
         return normalized_embedding
 
     def get_batch_embeddings(self, images: list[Image.Image]) -> np.ndarray:
-        image_tensors = torch.stack([self.preprocess(img) for img in images]).to(self.device)
-        with torch.no_grad():
-            embeddings = self.model.encode_image(image_tensors).cpu().numpy()
+        with span("preprocess"):
+            image_tensors = torch.stack([self.preprocess(img) for img in images])
+        embeddings = self._encode_images(image_tensors)
         normalized_embeddings = embeddings / np.linalg.norm(embeddings, axis=1)[:, None]
         return normalized_embeddings
 
     def get_text_embedding(self, text: str) -> np.ndarray:
-        tokens = self.tokenizer([text])
-        tokens = torch.tensor(tokens).to(self.device)
-        with torch.no_grad():
-            text_features = self.model.encode_text(tokens).squeeze().cpu().numpy()
+        with span("preprocess"):
+            tokens = self.tokenizer([text])
+        text_features = self._encode_texts(tokens).squeeze()
         normalized_embedding = text_features / np.linalg.norm(text_features)
         return normalized_embedding
 
-clip_embedder = OpenCLIPEmbedder() 
\ No newline at end of file
+    def get_batch_text_embeddings(self, texts: list[str]) -> np.ndarray:
+        with span("preprocess"):
+            tokens = self.tokenizer(texts)
+        text_features = self._encode_texts(tokens)
+        normalized_embeddings = text_features / np.linalg.norm(text_features, axis=1)[:, None]
+        return normalized_embeddings
+
+# Built on first use: loading the model dominates cold start
+clip_embedder = Lazy(
+    lambda: OpenCLIPEmbedder(settings.CLIP_MODEL_NAME, settings.CLIP_PRETRAINED or None),
+    name="clip_embedder"
+)
+
+# Coalesces concurrent query embeddings into one forward pass per modality
+embedding_batcher = Lazy(
+    lambda: EmbeddingBatcher(
+        clip_embedder.resolve(),
+        max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+        max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+        executor=cpu_executor
+    ),
+    name="embedding_batcher"
+)
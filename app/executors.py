@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import settings
+
+# CPU-bound work (CLIP forward passes). Kept small: each worker already uses
+# several torch intra-op threads, so more workers just oversubscribe the cores.
+cpu_executor = ThreadPoolExecutor(
+    max_workers=settings.CPU_WORKERS,
+    thread_name_prefix="cpu-worker"
+)
+
+# Blocking I/O (psycopg2, QdrantClient, boto3). Threads spend most of their
+# time waiting on the network, so this pool can be much larger.
+io_executor = ThreadPoolExecutor(
+    max_workers=settings.IO_WORKERS,
+    thread_name_prefix="io-worker"
+)
+
+
+def torch_num_threads() -> int:
+    """Intra-op threads per CPU worker: explicit setting, or cores split across workers and server processes."""
+    if settings.TORCH_NUM_THREADS > 0:
+        return settings.TORCH_NUM_THREADS
+    return max(1, (os.cpu_count() or 1) // (settings.CPU_WORKERS * max(1, settings.SERVE_WORKERS)))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-bound callable on the bounded CPU pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Copy the context so metrics spans in the callable know the current request
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(cpu_executor, call)
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O callable on the I/O pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(io_executor, call)
+
+
+class AsyncAdapter:
+    """
+    Async facade over a blocking object: ``await adapter.method(...)`` runs
+    ``target.method(...)`` on the I/O pool.
+
+    Stands in for a native async client when none is configured, so async code
+    can use PostgresDB or a vector store the same way either way.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name: str):
+        async def call(*args, **kwargs):
+            return await run_io(lambda: getattr(self._target, name)(*args, **kwargs))
+        call.__name__ = name
+        return call
+
+    async def aclose(self):
+        """Nothing to release; the wrapped object keeps its own lifecycle."""
@@ -0,0 +1,75 @@
+import io
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+
+from .config import settings
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES or MAX_IMAGE_PIXELS."""
+
+
+def decode_image(data: bytes, min_side: Optional[int] = None) -> Image.Image:
+    """
+    Decode upload bytes into an RGB image no larger than CLIP needs.
+
+    Size limits are checked on the raw bytes and the header before any pixels
+    are decoded. JPEGs are decoded at a reduced DCT scale (draft mode) and images
+    more than twice ``min_side`` on their shortest side are downscaled to it,
+    which keeps the bicubic resize in open_clip's preprocess close to the
+    full-size result. EXIF orientation is applied so rotated phone photos embed upright.
+    """
+    if min_side is None:
+        min_side = settings.DECODE_MIN_SIDE
+    if len(data) > settings.MAX_UPLOAD_BYTES:
+        raise ImageTooLargeError(
+            f"image is {len(data)} bytes, limit is {settings.MAX_UPLOAD_BYTES}"
+        )
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"image is {width}x{height} pixels, limit is {settings.MAX_IMAGE_PIXELS}"
+        )
+
+    scale = min_side / min(width, height)
+    if scale < 1 and image.format == "JPEG":
+        # Let libjpeg skip detail we would throw away (1/2, 1/4 or 1/8 scale)
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    width, height = image.size
+    scale = min_side / min(width, height)
+    if scale < 0.5:
+        # Only worth a separate pass when it removes most of the pixels
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = image.resize(size, Image.BICUBIC, reducing_gap=3.0)
+    return image
+
+
+_decode_pool = None
+
+
+def _get_decode_pool() -> ProcessPoolExecutor:
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ProcessPoolExecutor(max_workers=settings.DECODE_PROCESSES)
+    return _decode_pool
+
+
+def decode_images(datas: List[bytes]) -> List[Image.Image]:
+    """
+    Decode a batch of uploads for get_batch_embeddings.
+
+    Runs in a process pool when DECODE_PROCESSES > 0 (decoding large JPEGs is
+    CPU-bound and holds the GIL for part of the work), otherwise inline.
+    """
+    if settings.DECODE_PROCESSES > 0 and len(datas) > 1:
+        return list(_get_decode_pool().map(decode_image, datas))
+    return [decode_image(data) for data in datas]
@@ -0,0 +1,281 @@
+"""
+Streaming bulk ingestion: directory or JSONL manifest -> S3 + PostgreSQL + Qdrant.
+
+    python -m app.ingest ./images
+    python -m app.ingest manifest.jsonl --chunk-size 64 --checkpoint ingest.ckpt
+
+A manifest line looks like ``{"path": "a.jpg", "filename": "a.jpg", "metadata": {...}}``
+(only ``path`` is required; relative paths are resolved against the manifest).
+
+Images are processed in fixed-size chunks: the next chunk is read and decoded
+in parallel while the current one is embedded, S3 uploads run concurrently with
+the embedding, and each chunk is written with one multi-row INSERT and batched
+Qdrant upserts. At most two chunks are held in memory. With ``--checkpoint``
+every written chunk is recorded, and a re-run skips everything already done.
+
+Images already in the collection (same bytes or, with DEDUP_PERCEPTUAL, the
+same picture re-encoded; see app.dedup) are counted as duplicates and not
+embedded, uploaded or stored again.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from . import dedup
+from .config import settings
+from .image_io import decode_image
+from .search_cache import search_cache
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+
+@dataclass
+class IngestItem:
+    key: str                      # stable source identifier, used for checkpoints
+    path: str
+    filename: str
+    metadata: Optional[Dict] = None
+
+
+@dataclass
+class IngestReport:
+    ingested: int = 0
+    skipped: int = 0
+    duplicates: int = 0           # already stored, not embedded again
+    failed: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def images_per_second(self) -> float:
+        return self.ingested / self.elapsed if self.elapsed else 0.0
+
+
+def iter_directory(directory: str) -> Iterator[IngestItem]:
+    """Yield every image file under ``directory`` in a stable order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.abspath(os.path.join(root, name))
+                yield IngestItem(key=path, path=path, filename=name)
+
+
+def iter_manifest(manifest_path: str) -> Iterator[IngestItem]:
+    """Yield items from a JSONL manifest, one JSON object per line."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            path = os.path.join(base, entry["path"])
+            yield IngestItem(
+                key=entry.get("key", path),
+                path=path,
+                filename=entry.get("filename", os.path.basename(path)),
+                metadata=entry.get("metadata")
+            )
+
+
+def load_checkpoint(path: Optional[str]) -> set:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {json.loads(line)["key"] for line in f if line.strip()}
+
+
+def _read_and_decode(item: IngestItem):
+    with open(item.path, "rb") as f:
+        data = f.read()
+    return data, decode_image(data)
+
+
+class IngestPipeline:
+    """
+    Chunked ingestion over injectable backends.
+
+    ``embedder``, ``postgres_db``, ``vector_db`` and ``upload`` default to the
+    app singletons; pass stand-ins (e.g. QdrantDB over QdrantClient(":memory:"),
+    a fake uploader) to run without external services. ``upload=False`` skips S3.
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        postgres_db=None,
+        vector_db=None,
+        upload: Optional[Callable] = None,
+        chunk_size: int = settings.INGEST_CHUNK_SIZE,
+        decode_workers: int = settings.INGEST_DECODE_WORKERS,
+        upload_workers: int = settings.S3_UPLOAD_WORKERS,
+        qdrant_batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE,
+        checkpoint_path: Optional[str] = None
+    ):
+        if embedder is None:
+            from .embedder import clip_embedder as embedder
+        if postgres_db is None:
+            from .db_postgres import postgres_db
+        if vector_db is None:
+            from .vector_store import vector_db
+        if upload is None:
+            from .s3_utils import upload_image_to_s3 as upload
+        self.embedder = embedder
+        self.postgres_db = postgres_db
+        self.vector_db = vector_db
+        self.upload = upload or None
+        self.chunk_size = chunk_size
+        self.qdrant_batch_size = qdrant_batch_size
+        self.checkpoint_path = checkpoint_path
+        self._decode_pool = ThreadPoolExecutor(decode_workers, thread_name_prefix="ingest-decode")
+        self._upload_pool = ThreadPoolExecutor(upload_workers, thread_name_prefix="ingest-upload")
+
+    def _decode_chunk(self, chunk: List[IngestItem]):
+        return [(item, self._decode_pool.submit(_read_and_decode, item)) for item in chunk]
+
+    def _write_chunk(self, decoded, report: IngestReport) -> List[str]:
+        items, datas, images = [], [], []
+        for item, future in decoded:
+            try:
+                data, image = future.result()
+            except Exception as e:
+                report.failed += 1
+                report.errors.append(f"{item.key}: {e}")
+                continue
+            items.append(item)
+            datas.append(data)
+            images.append(image)
+        if not items:
+            return []
+
+        plan = dedup.plan_batch(self.postgres_db, datas, images)
+        todo = plan.new_indices
+
+        def start_uploads(indices):
+            return {i: self._upload_pool.submit(self.upload, datas[i], plan.image_ids[i]) for i in indices}
+
+        # Uploads overlap the embedding, unless the near-duplicate check may still reject images
+        upload_early = self.upload and not (settings.DEDUP_ENABLED and settings.DEDUP_COSINE_THRESHOLD)
+        uploads = start_uploads(todo) if upload_early else {}
+        embeddings = self.embedder.get_batch_embeddings([images[i] for i in todo]) if todo else []
+        dedup.check_near_duplicates(self.vector_db, plan, todo, embeddings)
+        embeddings = [embedding for i, embedding in zip(todo, embeddings) if plan.new[i]]
+        todo = plan.new_indices
+        if self.upload and not upload_early:
+            uploads = start_uploads(todo)
+
+        metadata = {}
+        failed = []
+        for i in todo:
+            metadata[i] = dict(items[i].metadata or {})
+            if uploads:
+                try:
+                    metadata[i]['s3_url'] = uploads[i].result()
+                except Exception as e:
+                    # Only this image fails; the rest of the chunk is still written
+                    report.errors.append(f"{items[i].key}: upload failed: {e}")
+                    failed.append(i)
+        dropped = set(plan.drop(failed)) if failed else set()
+        report.failed += len(dropped)
+        embeddings = [embedding for i, embedding in zip(todo, embeddings) if i not in dropped]
+        todo = [i for i in todo if i not in dropped]
+        image_ids = [plan.image_ids[i] for i in todo]
+        metadata_list = [metadata[i] for i in todo]
+
+        if todo:
+            self.postgres_db.insert_image_metadata_many(
+                list(zip(image_ids, [items[i].filename for i in todo], metadata_list))
+            )
+            self.vector_db.insert_vectors(
+                image_ids, np.asarray(embeddings), metadata_list, batch_size=self.qdrant_batch_size
+            )
+        dedup.index_hashes(self.postgres_db, plan)
+        if self.checkpoint_path:
+            # Failed images stay out of the checkpoint, so a re-run retries them
+            with open(self.checkpoint_path, "a") as f:
+                for i, (item, image_id) in enumerate(zip(items, plan.image_ids)):
+                    if i not in dropped:
+                        f.write(json.dumps({"key": item.key, "image_id": image_id}) + "\n")
+        report.ingested += len(todo)
+        report.duplicates += len(items) - len(todo) - len(dropped)
+        return [image_id for i, image_id in enumerate(plan.image_ids) if i not in dropped]
+
+    def run(self, items: Iterable[IngestItem], progress: bool = False) -> IngestReport:
+        """Ingest ``items``, skipping keys already in the checkpoint."""
+        report = IngestReport()
+        done = load_checkpoint(self.checkpoint_path)
+
+        def todo():
+            for item in items:
+                if item.key in done:
+                    report.skipped += 1
+                else:
+                    yield item
+
+        pending = iter(todo())
+        start = time.perf_counter()
+        next_chunk = list(itertools.islice(pending, self.chunk_size))
+        decoded = self._decode_chunk(next_chunk)
+        while decoded:
+            # Decode the following chunk while this one is embedded and written
+            next_chunk = list(itertools.islice(pending, self.chunk_size))
+            next_decoded = self._decode_chunk(next_chunk)
+            self._write_chunk(decoded, report)
+            decoded = next_decoded
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"ingested={report.ingested} duplicates={report.duplicates} failed={report.failed} "
+                      f"skipped={report.skipped} {report.ingested / elapsed:.1f} img/s")
+        report.elapsed = time.perf_counter() - start
+        if report.ingested:
+            # Reaches API workers when the search cache is shared (Redis)
+            search_cache.bump_generation()
+        return report
+
+    def close(self):
+        self._decode_pool.shutdown()
+        self._upload_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="image directory or .jsonl manifest")
+    parser.add_argument("--chunk-size", type=int, default=settings.INGEST_CHUNK_SIZE)
+    parser.add_argument("--decode-workers", type=int, default=settings.INGEST_DECODE_WORKERS)
+    parser.add_argument("--upload-workers", type=int, default=settings.S3_UPLOAD_WORKERS)
+    parser.add_argument("--checkpoint", help="checkpoint file for resumable runs")
+    parser.add_argument("--no-s3", action="store_true", help="do not upload originals to S3")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        items = iter_directory(args.source)
+    else:
+        items = iter_manifest(args.source)
+    pipeline = IngestPipeline(
+        upload=False if args.no_s3 else None,
+        chunk_size=args.chunk_size,
+        decode_workers=args.decode_workers,
+        upload_workers=args.upload_workers,
+        checkpoint_path=args.checkpoint
+    )
+    try:
+        report = pipeline.run(items, progress=True)
+    finally:
+        pipeline.close()
+    for error in report.errors:
+        print("failed:", error)
+    print(f"done: ingested={report.ingested} duplicates={report.duplicates} "
+          f"failed={report.failed} skipped={report.skipped} "
+          f"in {report.elapsed:.1f}s ({report.images_per_second:.1f} images/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import importlib
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    """
+    Thread-safe, lazily built singleton proxy.
+
+    The target is created with ``factory()`` on the first attribute access
+    (exactly once, even when several requests race for it) and every attribute
+    access is forwarded to it afterwards, so ``clip_embedder.get_text_embedding(...)``
+    works the same whether or not the model has been loaded yet.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "lazy")
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Any:
+        """Return the target, building it on first use."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def override(self, instance: Any):
+        """Replace the target, e.g. with a local stand-in."""
+        with self._lock:
+            self._instance = instance
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.is_initialized else "not initialized"
+        return f"<Lazy {self._name} ({state})>"
+
+
+def lazy_import(module_name: str, attr: str) -> Lazy:
+    """Proxy for ``module_name.attr`` that only imports the module on first use."""
+    return Lazy(
+        lambda: getattr(importlib.import_module(module_name), attr),
+        name=f"{module_name}.{attr}"
+    )
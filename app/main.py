@@ -1,14 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, List, Optional, Dict
 import json
-from app.db_qdrant import qdrant_db  
 from app.processor import image_processor
 from app.config import settings
+from app.executors import run_io
+from app.admin import require_admin_token
+from app.db_pool import pg_pool
+from app.image_io import ImageTooLargeError
+from app import metrics
+from app.log import configure_logging
+from app.pagination import SearchCursor
+from app.search_cache import search_cache
+from app.vector_store import normalize_filters
 from match_salons.salon_recommendation_v2 import router as salon_recommendation_router
 
+configure_logging()
+
 app = FastAPI(title="Nail Image Embedder API")
 
+# Per-route latency histograms, exposed on /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -21,35 +37,217 @@ app.add_middleware(
 # Mount the salon recommendation router with /api prefix
 app.include_router(salon_recommendation_router, prefix="/api")
 
+@app.on_event("startup")
+async def startup():
+    # Off by default: serverless cold starts should not wait on schema checks or the model
+    if settings.MIGRATE_ON_STARTUP:
+        from app.migrate import run_migrations
+        await run_io(run_migrations)
+    if settings.WARMUP_ON_STARTUP:
+        await run_io(image_processor.warmup)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await image_processor.aclose()
+
+@app.post("/api/warmup")
+async def warmup():
+    """Load the model and open database connections ahead of real traffic."""
+    try:
+        timings = await run_io(image_processor.warmup)
+        return {"status": "ok", "timings_ms": timings}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Warmup failed: {str(e)}")
+
+def _parse_filters(filters: Optional[str]):
+    """The ``filters`` parameter: a JSON object such as {"style": "french", "tags": ["glitter", "matte"]}."""
+    if not filters:
+        return None
+    try:
+        return normalize_filters(json.loads(filters))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+
+def _parse_cursor(cursor: str, image_id: Optional[str] = None) -> SearchCursor:
+    """A ``cursor`` parameter from an earlier page of the same kind of search."""
+    try:
+        page_cursor = SearchCursor.decode(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+    if (page_cursor.positive_ids != [image_id]) if image_id else (page_cursor.vector is None):
+        raise HTTPException(status_code=400, detail="Invalid cursor: it belongs to another search")
+    return page_cursor
+
+def _id_and_score(result: Dict) -> Dict:
+    return {"id": result["id"], "score": result["score"]}
+
+async def _page_response(page_cursor: SearchCursor, limit: int, stream: bool, project=None):
+    """
+    A page of results with the cursor of the next one.
+
+    JSON ``{"results": [...], "next_cursor": ...}``, or with ``stream`` NDJSON:
+    one result per line as metadata batches resolve, then ``{"next_cursor": ...}``.
+    """
+    project = project or (lambda result: result)
+    if not stream:
+        results, next_cursor = await image_processor.search_page_async(page_cursor, limit)
+        return {"results": [project(r) for r in results], "next_cursor": next_cursor}
+    batches, next_cursor = await image_processor.stream_page_async(page_cursor, limit)
+
+    async def lines():
+        async for batch in batches:
+            yield "".join(json.dumps(jsonable_encoder(project(r))) + "\n" for r in batch)
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.post("/api/search/image")
 async def search_image(
-    file: UploadFile = File(...),
-    limit: int = 18
+    file: Optional[UploadFile] = File(None),
+    limit: int = Query(18, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    score_threshold: Optional[float] = None,
+    filters: Optional[str] = None,
+    cursor: Optional[str] = None,
+    stream: bool = False
 ):
-    """Search for similar images by uploading an image."""
+    """
+    Search for similar images by uploading an image; ``filters`` narrows the search by metadata.
+
+    Pass a response's ``next_cursor`` back as ``cursor`` (without the file) for
+    the next page; ``stream=true`` returns NDJSON.
+    """
+    if cursor:
+        page_cursor = _parse_cursor(cursor)
+    else:
+        if file is None:
+            raise HTTPException(status_code=400, detail="No image or cursor given")
+        # Reject oversized uploads before reading them into memory
+        if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image upload too large")
+        query_filters = _parse_filters(filters)
     try:
-        image_data = await file.read()
-        results = image_processor.search_similar(image_data=image_data, limit=limit)
-        return {"results": [{"id": r["id"], "score": r["score"]} for r in results]}
+        if not cursor:
+            image_data = await file.read()
+            # Database calls are awaited on the loop; the CLIP pass goes to the CPU pool
+            page_cursor = await image_processor.image_cursor_async(
+                image_data=image_data, score_threshold=score_threshold, filters=query_filters
+            )
+        return await _page_response(page_cursor, limit, stream, _id_and_score)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/search/text")
 async def search_text(
-    text: str = Form(...),
-    limit: int = 18
+    text: Optional[str] = Form(None),
+    limit: int = Query(18, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    score_threshold: Optional[float] = None,
+    filters: Optional[str] = None,
+    cursor: Optional[str] = None,
+    stream: bool = False
 ):
-    """Search for similar images by text."""
+    """
+    Search for similar images by text; ``filters`` narrows the search by metadata.
+
+    Pass a response's ``next_cursor`` back as ``cursor`` (without the text) for
+    the next page; ``stream=true`` returns NDJSON.
+    """
+    if cursor:
+        page_cursor = _parse_cursor(cursor)
+    elif not text:
+        raise HTTPException(status_code=400, detail="No text or cursor given")
+    else:
+        query_filters = _parse_filters(filters)
     try:
-        results = image_processor.search_similar_by_text(text=text, limit=limit)
+        if not cursor:
+            page_cursor = await image_processor.text_cursor_async(
+                text=text, score_threshold=score_threshold, filters=query_filters
+            )
+        return await _page_response(page_cursor, limit, stream)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/search/batch")
+async def search_batch(
+    texts: List[str] = Form([]),
+    files: List[UploadFile] = File([]),
+    limit: int = 18,
+    score_threshold: Optional[float] = None,
+    filters: Optional[str] = None
+):
+    """Run several text and image searches in one request; results are in query order, texts first."""
+    if not texts and not files:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if any(f.size is not None and f.size > settings.MAX_UPLOAD_BYTES for f in files):
+        raise HTTPException(status_code=413, detail="Image upload too large")
+    query_filters = _parse_filters(filters)
+    try:
+        images = [await f.read() for f in files]
+        # Only ids and scores are returned: skip the image queries' metadata fetch
+        results = await run_io(
+            image_processor.search_batch,
+            texts=texts, images=images, limit=limit, metadata_source="none",
+            score_threshold=score_threshold, filters=query_filters
+        )
+        queries = [{"text": t} for t in texts] + [{"filename": f.filename} for f in files]
+        return {"results": [
+            {"query": query, "results": [{"id": r["id"], "score": r["score"]} for r in hits]}
+            for query, hits in zip(queries, results)
+        ]}
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class RecommendRequest(BaseModel):
+    positive_ids: List[str]
+    negative_ids: List[str] = []
+    limit: int = 18
+    score_threshold: Optional[float] = None
+    filters: Dict[str, Any] = {}
+
+@app.post("/api/search/recommend")
+async def search_recommend(request: RecommendRequest):
+    """Images like ``positive_ids`` and unlike ``negative_ids``, input ids excluded."""
+    try:
+        query_filters = normalize_filters(request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+    try:
+        results = await image_processor.recommend_async(
+            request.positive_ids, request.negative_ids,
+            limit=request.limit, score_threshold=request.score_threshold, filters=query_filters
+        )
         return {"results": results}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
+
+@app.get("/api/images/{image_id}/similar")
+async def get_similar_images(
+    image_id: str,
+    limit: int = Query(18, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    filters: Optional[str] = None,
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    """"More like this" for a clicked image, one vector store round trip; pages as for /api/search/text."""
+    if cursor:
+        page_cursor = _parse_cursor(cursor, image_id=image_id)
+    else:
+        page_cursor = image_processor.recommend_cursor([image_id], filters=_parse_filters(filters))
+    try:
+        return await _page_response(page_cursor, limit, stream)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/images/{image_id}")
 async def get_image_metadata(image_id: str):
     try:
-        metadata = image_processor.get_metadata_by_id(image_id)
+        metadata = await image_processor.get_metadata_by_id_async(image_id)
         if not metadata:
             raise HTTPException(
                 status_code=404, 
@@ -62,4 +260,25 @@ async def get_image_metadata(image_id: str):
         raise HTTPException(
             status_code=500, 
             detail=f"Error retrieving metadata: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@app.get("/api/stats/db-pool")
+async def get_db_pool_stats():
+    """Postgres connection pool usage (size, idle, in_use, waiting, timeouts)."""
+    return pg_pool.stats()
+
+@app.get("/api/stats/search-cache")
+async def get_search_cache_stats():
+    """Hit/miss/eviction counters for the embedding and result caches."""
+    return await run_io(search_cache.stats)
+
+@app.post("/api/search-cache/clear", dependencies=[Depends(require_admin_token)])
+async def clear_search_cache():
+    """Flush the embedding and result caches, shared ones (Redis) included; needs X-Admin-Token."""
+    await run_io(search_cache.clear)
+    return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request and stage latency histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
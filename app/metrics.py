@@ -0,0 +1,127 @@
+"""
+Latency histograms per endpoint and stage, rendered in Prometheus text format.
+
+- ``MetricsMiddleware`` times every HTTP request, labelled by route template
+  (``/api/images/{image_id}``), method and status
+- ``span("embed")`` times a stage of the current request; the endpoint label
+  comes from the request being served, so spans need no arguments beyond the
+  stage name. Work done outside a request (ingest, the embedding batcher's
+  shared forward passes) is labelled ``endpoint="none"``
+
+run_io / run_cpu carry the request context into pool threads. A span costs
+two perf_counter calls, a bisect and a lock on top of the contextmanager
+itself (about 2 us in all); ``benchmarks.metrics_overhead`` measures it.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from .config import settings
+
+# Seconds; from sub-millisecond cache hits to multi-second cold model loads
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("endpoint", "method", "status")
+)
+stage_duration = Histogram(
+    "stage_duration_seconds", "Latency of request stages (decode, embed, vector_search, ...).", ("endpoint", "stage")
+)
+
+
+def _endpoint(scope) -> str:
+    if scope is None:
+        return "none"
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as ``stage`` of the current request."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe((_endpoint(_request_scope.get()), stage), time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording http_request_duration_seconds and the request context for spans."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        # The router adds the matched route to this same scope dict, so spans see it
+        token = _request_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_duration.observe((_endpoint(scope), scope["method"], str(status)), time.perf_counter() - start)
+            _request_scope.reset(token)
+
+
+def render() -> str:
+    """Every histogram in Prometheus text exposition format."""
+    return "\n".join(h.render() for h in (request_duration, stage_duration)) + "\n"
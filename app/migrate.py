@@ -0,0 +1,61 @@
+"""
+Create the Postgres table, the vector collection and the salon indexes.
+
+These checks used to run as a side effect of importing the app, which put
+network round trips on every cold start. Run them once per deploy instead:
+
+    python -m app.migrate
+
+or set MIGRATE_ON_STARTUP=true to run them from the FastAPI startup hook.
+"""
+import argparse
+import logging
+import time
+
+from .db_postgres import postgres_db
+
+logger = logging.getLogger(__name__)
+
+
+def run_migrations(update_qdrant_config: bool = False) -> dict:
+    """
+    Run every idempotent setup step; return the time each took in ms.
+
+    ``update_qdrant_config`` also pushes the QDRANT_* tuning settings to an
+    existing Qdrant collection, which otherwise keeps the settings it was created with.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    postgres_db._init_db()
+    timings["postgres_schema"] = (time.perf_counter() - start) * 1000
+
+    from .vector_store import vector_db
+    start = time.perf_counter()
+    vector_db.ensure_collection()
+    if update_qdrant_config:
+        from .db_qdrant import QdrantDB
+        store = getattr(vector_db, "store", vector_db.resolve())
+        if not isinstance(store, QdrantDB):
+            raise ValueError("--update-qdrant-config needs VECTOR_BACKEND=qdrant")
+        store.update_collection_config()
+    timings["vector_collection"] = (time.perf_counter() - start) * 1000
+
+    # Salon tables are owned by the salon pipeline and may not exist everywhere
+    from match_salons.salon_recommendation_v2 import ensure_salon_indexes
+    start = time.perf_counter()
+    try:
+        ensure_salon_indexes()
+    except Exception as e:
+        logger.warning("could not create salon indexes: %s", e)
+    timings["salon_indexes"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the tables, collection and indexes.")
+    parser.add_argument("--update-qdrant-config", action="store_true",
+                        help="apply the QDRANT_* tuning settings to an existing collection")
+    args = parser.parse_args()
+    for step, ms in run_migrations(update_qdrant_config=args.update_qdrant_config).items():
+        print(f"{step}: {ms:.1f} ms")
@@ -0,0 +1,161 @@
+"""
+Cursors for paging through search results.
+
+A search returns up to ``limit`` results and, when the page was full, a
+``next_cursor``. Passing it back returns the following page without
+embedding the query again: the cursor carries the query vector itself (or,
+for by-id searches, the ids), the search options and how far the client got,
+so any worker can continue it without a shared cache.
+
+Pages are offsets into the ranking. The score and id of the last hit shown
+ride along: a later page drops that hit and anything scoring above it, which
+were on an earlier page, so points inserted between two page requests never
+show up twice. A delete between pages can still let one hit slip by unseen.
+Approximate backends (HNSW, the two-stage reranker) widen their candidates
+with the offset, so a later page can surface a hit scoring above the last one
+shown; the same score bound drops it rather than show it out of order.
+
+Cursors are opaque URL-safe strings: base64 JSON for the options, then for
+vector queries ``.`` and the base64 float32 vector. A vector cursor made with
+another CLIP model is rejected, since its vector means nothing to this one.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+import numpy as np
+
+from .config import settings
+from .search_cache import content_hash
+from .vector_store import SearchFilters, normalize_filters
+
+METADATA_SOURCES = ("postgres", "payload", "none")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _model() -> str:
+    return f"{settings.CLIP_MODEL_NAME}/{settings.CLIP_PRETRAINED or 'random'}"
+
+
+@dataclass
+class SearchCursor:
+    """
+    A search query and the position reached in its results.
+
+    Either ``vector`` (text and image searches) or ``positive_ids`` (by-id and
+    recommend searches) is set. ``metadata_source`` is "postgres" or
+    "payload" as for ImageProcessor.search_similar, or "none" for ids and
+    scores only.
+    """
+    vector: Optional[np.ndarray] = None
+    positive_ids: List[str] = field(default_factory=list)
+    negative_ids: List[str] = field(default_factory=list)
+    metadata_source: str = "postgres"
+    score_threshold: Optional[float] = None
+    hnsw_ef: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+    offset: int = 0
+    last_score: Optional[float] = None
+    last_id: Optional[str] = None
+
+    def search_options(self) -> dict:
+        return {
+            "score_threshold": self.score_threshold,
+            "hnsw_ef": self.hnsw_ef,
+            "filters": self.filters,
+            "offset": self.offset,
+        }
+
+    def cache_key(self, limit: int) -> tuple:
+        """Search results cache key of one page."""
+        query = content_hash(self.vector.tobytes()) if self.vector is not None else (
+            tuple(self.positive_ids), tuple(self.negative_ids)
+        )
+        return (
+            "page", query, self.metadata_source, self.score_threshold, self.hnsw_ef, self.filters,
+            self.offset, self.last_score, self.last_id, limit
+        )
+
+    def unseen(self, hits) -> list:
+        """``hits`` minus the ones an earlier page already returned."""
+        if self.last_score is None:
+            return list(hits)
+        return [
+            hit for hit in hits
+            if hit.score < self.last_score or (hit.score == self.last_score and str(hit.id) != self.last_id)
+        ]
+
+    def after(self, hits, limit: int) -> Optional["SearchCursor"]:
+        """Cursor for the page after one whose vector search returned ``hits``, None after the last page."""
+        if len(hits) < limit:
+            return None
+        return replace(
+            self, offset=self.offset + len(hits), last_score=float(hits[-1].score), last_id=str(hits[-1].id)
+        )
+
+    def encode(self) -> str:
+        state = {
+            "src": self.metadata_source,
+            "off": self.offset,
+        }
+        optional = {
+            "pos": self.positive_ids,
+            "neg": self.negative_ids,
+            "thr": self.score_threshold,
+            "ef": self.hnsw_ef,
+            "flt": [[name, list(values)] for name, values in self.filters] if self.filters else None,
+            "ls": self.last_score,
+            "li": self.last_id,
+        }
+        state.update((key, value) for key, value in optional.items() if value is not None and value != [])
+        if self.vector is not None:
+            state["model"] = _model()
+        token = _b64encode(json.dumps(state, separators=(",", ":")).encode())
+        if self.vector is not None:
+            token += "." + _b64encode(np.asarray(self.vector, dtype=np.float32).tobytes())
+        return token
+
+    @classmethod
+    def decode(cls, token: str) -> "SearchCursor":
+        """Parse a cursor from ``encode``; ValueError if it is malformed or from another model."""
+        header, _, vector = token.partition(".")
+        try:
+            state = json.loads(_b64decode(header))
+            vector = np.frombuffer(_b64decode(vector), dtype=np.float32).copy() if vector else None
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise ValueError("malformed cursor")
+        if not isinstance(state, dict):
+            raise ValueError("malformed cursor")
+        if vector is not None:
+            if state.get("model") != _model():
+                raise ValueError("cursor was made with another model, search again")
+            if vector.shape != (settings.VECTOR_SIZE,) or not np.isfinite(vector).all():
+                raise ValueError("malformed cursor")
+        try:
+            cursor = cls(
+                vector=vector,
+                positive_ids=[str(i) for i in state.get("pos", [])],
+                negative_ids=[str(i) for i in state.get("neg", [])],
+                metadata_source=state["src"],
+                score_threshold=state.get("thr"),
+                hnsw_ef=state.get("ef"),
+                filters=normalize_filters(dict(state["flt"])) if state.get("flt") else None,
+                offset=int(state["off"]),
+                last_score=float(state["ls"]) if "ls" in state else None,
+                last_id=state.get("li"),
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("malformed cursor")
+        if cursor.metadata_source not in METADATA_SOURCES or cursor.offset < 0 \
+                or (vector is None) == (not cursor.positive_ids):
+            raise ValueError("malformed cursor")
+        return cursor
@@ -1,14 +1,75 @@
+import asyncio
+import logging
+import time
 import uuid
+from collections import deque
+import numpy as np
 from PIL import Image
-from typing import Optional, List, Dict
-import io
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 
-from .embedder import clip_embedder
+from . import dedup, s3_utils
+from .config import settings
+from .executors import cpu_executor, run_cpu, run_io
+from .image_io import decode_image, decode_images
 from .db_postgres import postgres_db
-from .db_qdrant import qdrant_db
-from .s3_utils import upload_image_to_s3
+from .db_postgres_async import async_postgres_db
+from .lazy import lazy_import
+from .log import log_fields
+from .metrics import span
+from .pagination import SearchCursor
+from .search_cache import content_hash, normalize_text, search_cache
+from .vector_store import normalize_filters
+
+# torch / open_clip and the vector backend are only imported when first needed, so
+# requests like /api/images/{image_id} do not pay for them on a cold start
+clip_embedder = lazy_import("app.embedder", "clip_embedder")
+embedding_batcher = lazy_import("app.embedder", "embedding_batcher")
+vector_db = lazy_import("app.vector_store", "vector_db")
+async_vector_db = lazy_import("app.vector_store", "async_vector_db")
+
+logger = logging.getLogger(__name__)
+
+def _log_hits(query: str, hits):
+    # Summaries only; sampled in app.log, and skipped entirely unless DEBUG is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("vector search", extra=log_fields(
+            query=query, hits=len(hits), top_score=hits[0].score if hits else None
+        ))
+
+async def _timed(stage: str, awaitable):
+    with span(stage):
+        return await awaitable
 
 class ImageProcessor:
+    @staticmethod
+    def _embed_image(image: Image.Image):
+        """Embed a single image on the CPU pool, batched with concurrent queries if enabled."""
+        with span("embed"):
+            if settings.EMBED_BATCHING_ENABLED:
+                return embedding_batcher.embed_image(image)
+            return cpu_executor.submit(clip_embedder.get_image_embedding, image).result()
+
+    @staticmethod
+    def _embed_text(text: str):
+        """Embed a single text on the CPU pool, batched with concurrent queries if enabled."""
+        with span("embed"):
+            if settings.EMBED_BATCHING_ENABLED:
+                return embedding_batcher.embed_text(text)
+            return cpu_executor.submit(clip_embedder.get_text_embedding, text).result()
+
+    @staticmethod
+    def _decode_image(image_data: bytes) -> Image.Image:
+        with span("decode"):
+            return decode_image(image_data)
+
+    @staticmethod
+    def _embed_query_image(image_data: bytes, image_hash: str):
+        """Embedding of a query upload: the stored vector if these exact bytes were ingested, else a CLIP pass."""
+        stored = dedup.stored_embeddings(postgres_db, vector_db, [image_hash]).get(image_hash)
+        if stored is not None:
+            return stored
+        return ImageProcessor._embed_image(ImageProcessor._decode_image(image_data))
+
     @staticmethod
     def process_image(
         image_data: bytes,
@@ -17,6 +78,8 @@ class ImageProcessor:
     ) -> str:
         """
         Process a single image: generate embedding and store in databases.
+
+        An image that is already stored (see app.dedup) is not processed again.
         
         Args:
             image_data (bytes): Raw image data
@@ -24,36 +87,49 @@ class ImageProcessor:
             metadata (dict, optional): Additional metadata
             
         Returns:
-            str: Generated UUID for the image
+            str: Generated UUID for the image, or the UUID of the stored
+            image it duplicates
         """
-        # Generate UUID
-        image_id = str(uuid.uuid4())
-        
         # Load and process image
-        image = Image.open(io.BytesIO(image_data))
+        image = ImageProcessor._decode_image(image_data)
+
+        # Generate UUID, or find the stored copy of this image
+        plan = dedup.plan_batch(postgres_db, [image_data], [image])
+        image_id = plan.image_ids[0]
+        if not plan.new[0]:
+            return image_id
         
         # Generate embedding
-        embedding = clip_embedder.get_image_embedding(image)
+        embedding = ImageProcessor._embed_image(image)
+        dedup.check_near_duplicates(vector_db, plan, [0], [embedding])
+        if not plan.new[0]:
+            dedup.index_hashes(postgres_db, plan)
+            return plan.image_ids[0]
         
         # Upload image to S3 and add S3 URL to metadata
-        s3_url = upload_image_to_s3(image_data, image_id)
+        with span("s3_upload"):
+            s3_url = s3_utils.upload_image_to_s3(image_data, image_id)
         if metadata is None:
             metadata = {}
         metadata['s3_url'] = s3_url
         
         # Store metadata in PostgreSQL
-        postgres_db.insert_image_metadata(
-            image_id=image_id,
-            filename=filename,
-            metadata=metadata
-        )
+        with span("metadata_write"):
+            postgres_db.insert_image_metadata(
+                image_uuid=image_id,
+                filename=filename,
+                metadata=metadata
+            )
         
         # Store embedding in Qdrant
-        qdrant_db.insert_vector(
-            image_id=image_id,
-            vector=embedding,
-            metadata=metadata
-        )
+        with span("vector_write"):
+            vector_db.insert_vector(
+                image_id=image_id,
+                vector=embedding,
+                metadata=metadata
+            )
+        dedup.index_hashes(postgres_db, plan)
+        search_cache.bump_generation()
         
         return image_id
 
@@ -65,6 +141,9 @@ class ImageProcessor:
     ) -> List[str]:
         """
         Process multiple images in batch.
+
+        Images that are already stored, or repeat an earlier image of the
+        batch, are not processed again (see app.dedup).
         
         Args:
             image_data_list (list[bytes]): List of raw image data
@@ -72,71 +151,111 @@ class ImageProcessor:
             metadata_list (list[dict], optional): List of metadata for each image
             
         Returns:
-            list[str]: List of generated UUIDs
+            list[str]: List of generated UUIDs, in input order; duplicates get
+            the UUID of the image they duplicate
         """
         if metadata_list is None:
             metadata_list = [None] * len(image_data_list)
-            
-        # Generate UUIDs
-        image_ids = [str(uuid.uuid4()) for _ in range(len(image_data_list))]
         
         # Load and process images
-        images = [Image.open(io.BytesIO(data)) for data in image_data_list]
-        
-        # Generate embeddings
-        embeddings = clip_embedder.get_batch_embeddings(images)
-        
-        # Store metadata in PostgreSQL
-        for image_id, filename, metadata in zip(image_ids, filenames, metadata_list):
-            postgres_db.insert_image_metadata(
-                image_id=image_id,
-                filename=filename,
-                metadata=metadata
-            )
+        with span("decode"):
+            images = decode_images(image_data_list)
+
+        # Generate UUIDs, or find the stored copies of known images
+        plan = dedup.plan_batch(postgres_db, image_data_list, images)
+        todo = plan.new_indices
         
-        # Store embeddings in Qdrant
-        for image_id, embedding, metadata in zip(image_ids, embeddings, metadata_list):
-            qdrant_db.insert_vector(
-                image_id=image_id,
-                vector=embedding,
-                metadata=metadata
-            )
+        # Generate embeddings, then drop near duplicates of stored images
+        embeddings = []
+        if todo:
+            with span("embed"):
+                embeddings = cpu_executor.submit(
+                    clip_embedder.get_batch_embeddings, [images[i] for i in todo]
+                ).result()
+            dedup.check_near_duplicates(vector_db, plan, todo, embeddings)
+        embeddings = [embedding for i, embedding in zip(todo, embeddings) if plan.new[i]]
+        todo = plan.new_indices
+        image_ids = [plan.image_ids[i] for i in todo]
+        if todo:
+            # Upload images to S3 concurrently and add S3 URLs to metadata
+            with span("s3_upload"):
+                s3_urls = s3_utils.upload_images_to_s3([image_data_list[i] for i in todo], image_ids)
+            new_metadata = [
+                dict(metadata_list[i] or {}, s3_url=s3_url)
+                for i, s3_url in zip(todo, s3_urls)
+            ]
+
+            # Store metadata in PostgreSQL (one multi-row INSERT)
+            with span("metadata_write"):
+                postgres_db.insert_image_metadata_many(
+                    list(zip(image_ids, [filenames[i] for i in todo], new_metadata))
+                )
+
+            # Store embeddings in Qdrant (batched upserts)
+            with span("vector_write"):
+                vector_db.insert_vectors(
+                    image_ids,
+                    np.asarray(embeddings),
+                    new_metadata,
+                    batch_size=settings.QDRANT_UPSERT_BATCH_SIZE
+                )
+            search_cache.bump_generation()
+        dedup.index_hashes(postgres_db, plan)
         
-        return image_ids
+        return plan.image_ids
 
     @staticmethod
-    def search_similar(image_data: bytes, limit: int = 8) -> List[Dict]:
+    def search_similar(
+        image_data: bytes,
+        limit: int = 8,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Search for similar images using a query image.
         
         Args:
             image_data (bytes): Raw image data of the query image
             limit (int): Maximum number of results to return
+            metadata_source (str, optional): "postgres" or "payload",
+                defaults to settings.SEARCH_METADATA_SOURCE
+            score_threshold (float, optional): Drop matches scoring below this
+            hnsw_ef (int, optional): Qdrant search beam width, defaults to
+                settings.QDRANT_SEARCH_HNSW_EF
+            filters (dict, optional): Payload filters such as
+                {"style": "french", "tags": ["glitter", "matte"]}: every field
+                must match one of its values (see normalize_filters)
             
         Returns:
             list[dict]: List of similar images with their metadata
         """
-        # Load and process query image
-        query_image = Image.open(io.BytesIO(image_data))
-        query_embedding = clip_embedder.get_image_embedding(query_image)
-        
-        # Search in Qdrant
-        print("search_similar: query_vector shape", len(query_embedding))
-        similar_vectors = qdrant_db.search_similar(query_embedding, limit=limit)
-        print("Qdrant raw result:", similar_vectors)
-        
-        # Get metadata from PostgreSQL
-        results = []
-        for match in similar_vectors:
-            metadata = postgres_db.get_image_metadata(match.id)
-            if metadata:
-                results.append({
-                    'id': match.id,
-                    'score': match.score,
-                    'metadata': metadata
-                })
-        
-        return results
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        filters = normalize_filters(filters)
+        image_hash = content_hash(image_data)
+
+        def search():
+            # Load and process query image (skipped for an upload we have seen or stored)
+            query_embedding = search_cache.image_embedding(
+                image_hash, lambda: ImageProcessor._embed_query_image(image_data, image_hash)
+            )
+
+            # Search in Qdrant
+            with span("vector_search"):
+                similar_vectors = vector_db.search_similar(
+                    query_embedding,
+                    limit=limit,
+                    with_payload=metadata_source == "payload",
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("image", similar_vectors)
+            return ImageProcessor._attach_metadata(similar_vectors, metadata_source)
+
+        key = ("image", image_hash, limit, metadata_source, score_threshold, hnsw_ef, filters)
+        return search_cache.search_results(key, search)
 
     @staticmethod
     def delete_image(image_id: str):
@@ -146,52 +265,413 @@ class ImageProcessor:
         Args:
             image_id (str): UUID of the image to delete
         """
-        postgres_db.delete_image_metadata(image_id)
-        qdrant_db.delete_vector(image_id)
+        with span("metadata_write"):
+            postgres_db.delete_image_metadata(image_id)
+        with span("vector_write"):
+            vector_db.delete_vector(image_id)
+        search_cache.bump_generation()
 
     @staticmethod
-    def search_similar_by_text(text: str, limit: int = 18) -> List[Dict]:
+    def search_similar_by_text(
+        text: str,
+        limit: int = 18,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Search for similar images using a query text.
         Args:
             text (str): Query text
             limit (int): Maximum number of results to return
+            score_threshold (float, optional): Drop matches scoring below this
+            hnsw_ef (int, optional): Qdrant search beam width
+            filters (dict, optional): Payload filters, as for search_similar
         Returns:
             list[dict]: List of similar images with their id and score
         """
-        # Generate text embedding
-        query_embedding = clip_embedder.get_text_embedding(text)
-        print("text embedding:", query_embedding)
-        # Qdrant search
-        similar_vectors = qdrant_db.search_similar(query_embedding, limit=limit)
-        print("Qdrant search result:", similar_vectors)
-        # Only return id and score
-        results = []
-        for match in similar_vectors:
-            results.append({
-                'id': match.id,
-                'score': match.score
-            })
-        return results
+        filters = normalize_filters(filters)
+
+        def search():
+            # Generate text embedding
+            query_embedding = search_cache.text_embedding(text, lambda: ImageProcessor._embed_text(text))
+            # Qdrant search; only id and score are used, so skip the payload
+            with span("vector_search"):
+                similar_vectors = vector_db.search_similar(
+                    query_embedding,
+                    limit=limit,
+                    with_payload=False,
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("text", similar_vectors)
+            # Only return id and score
+            results = []
+            for match in similar_vectors:
+                results.append({
+                    'id': match.id,
+                    'score': match.score
+                })
+            return results
+
+        key = ("text", normalize_text(text), limit, score_threshold, hnsw_ef, filters)
+        return search_cache.search_results(key, search)
     
     
 
     @staticmethod
-    def search_similar_by_id(image_id: str, limit: int = 18) -> List[Dict]:
+    def search_batch(
+        texts: Optional[List[str]] = None,
+        images: Optional[List[bytes]] = None,
+        limit: int = 18,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Run many text and image searches with one forward pass per modality and one vector store call.
+
+        Args:
+            texts (list[str], optional): Query texts
+            images (list[bytes], optional): Raw query images
+            limit (int): Maximum number of results per query
+            metadata_source (str, optional): Image results' metadata as for
+                search_similar, or "none" for ids and scores only
+            filters (dict, optional): Payload filters applied to every query
+
+        Returns:
+            list[list[dict]]: Results for every text and then every image, in
+            order, shaped like search_similar_by_text / search_similar
+        """
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        filters = normalize_filters(filters)
+        texts, images = list(texts or []), list(images or [])
+        image_hashes = [content_hash(data) for data in images]
+        # Same keys as the single-query methods, so the caches are shared
+        generation = search_cache.generation
+        keys = (
+            [(generation, "text", normalize_text(t), limit, score_threshold, hnsw_ef, filters) for t in texts]
+            + [
+                (generation, "image", h, limit, metadata_source, score_threshold, hnsw_ef, filters)
+                for h in image_hashes
+            ]
+        )
+        results = [search_cache.get("results", key) for key in keys]
+        todo = [i for i, cached in enumerate(results) if cached is None]
+        if not todo:
+            return results
+
+        # Embeddings: cache hits first, then one batched forward pass per modality
+        embeddings = {}
+        text_todo = [i for i in todo if i < len(texts)]
+        image_todo = [i for i in todo if i >= len(texts)]
+        for indices, cache, cache_key in (
+            (text_todo, "text_embeddings", lambda i: normalize_text(texts[i])),
+            (image_todo, "image_embeddings", lambda i: image_hashes[i - len(texts)]),
+        ):
+            for i in indices:
+                cached = search_cache.get(cache, cache_key(i))
+                if cached is not None:
+                    embeddings[i] = cached
+        missing_texts = [i for i in text_todo if i not in embeddings]
+        if missing_texts:
+            with span("embed"):
+                batch = cpu_executor.submit(
+                    clip_embedder.get_batch_text_embeddings, [texts[i] for i in missing_texts]
+                ).result()
+            for i, embedding in zip(missing_texts, batch):
+                embeddings[i] = embedding
+                search_cache.set("text_embeddings", normalize_text(texts[i]), embedding)
+        stored = dedup.stored_embeddings(
+            postgres_db, vector_db, [image_hashes[i - len(texts)] for i in image_todo if i not in embeddings]
+        )
+        for i in image_todo:
+            if i not in embeddings and image_hashes[i - len(texts)] in stored:
+                embeddings[i] = stored[image_hashes[i - len(texts)]]
+                search_cache.set("image_embeddings", image_hashes[i - len(texts)], embeddings[i])
+        missing_images = [i for i in image_todo if i not in embeddings]
+        if missing_images:
+            with span("decode"):
+                decoded = decode_images([images[i - len(texts)] for i in missing_images])
+            with span("embed"):
+                batch = cpu_executor.submit(clip_embedder.get_batch_embeddings, decoded).result()
+            for i, embedding in zip(missing_images, batch):
+                embeddings[i] = embedding
+                search_cache.set("image_embeddings", image_hashes[i - len(texts)], embedding)
+
+        # One vector store round trip for every uncached query
+        with span("vector_search"):
+            hit_lists = vector_db.search_batch(
+                [embeddings[i] for i in todo],
+                limit=limit,
+                with_payload=bool(image_todo) and metadata_source == "payload",
+                score_threshold=score_threshold,
+                hnsw_ef=hnsw_ef,
+                filters=filters
+            )
+        hits_by_index = dict(zip(todo, hit_lists))
+        for i in text_todo:
+            results[i] = [{'id': match.id, 'score': match.score} for match in hits_by_index[i]]
+        image_results = ImageProcessor._attach_metadata_many(
+            [hits_by_index[i] for i in image_todo], metadata_source
+        )
+        for i, image_result in zip(image_todo, image_results):
+            results[i] = image_result
+        for i in todo:
+            search_cache.set("results", keys[i], results[i])
+        return [list(r) for r in results]
+
+    @staticmethod
+    def search_similar_by_id(
+        image_id: str,
+        limit: int = 18,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Search for similar images using an existing image's id (embedding).
+
+        The image itself is not part of the results.
         """
-        similar_vectors = qdrant_db.search_similar_by_id(image_id, limit=limit)
-        results = []
-        for match in similar_vectors:
-            metadata = postgres_db.get_image_metadata(match.id)
-            if metadata:
-                results.append({
-                    'id': match.id,
-                    'score': match.score,
-                    'metadata': metadata
-                })
-        return results
+        return ImageProcessor.recommend(
+            [image_id],
+            limit=limit,
+            metadata_source=metadata_source,
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=filters
+        )
+
+    @staticmethod
+    def recommend(
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 18,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        "More like these": images similar to ``positive_ids`` and unlike ``negative_ids``.
+
+        Args:
+            positive_ids (list[str]): Image UUIDs to search near
+            negative_ids (list[str], optional): Image UUIDs to steer away from
+            limit (int): Maximum number of results to return
+            metadata_source (str, optional): "postgres" or "payload"
+            filters (dict, optional): Payload filters, as for search_similar
+
+        Returns:
+            list[dict]: Similar images with their metadata, input ids excluded
+        """
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        filters = normalize_filters(filters)
+        positive_ids = [str(i) for i in positive_ids]
+        negative_ids = [str(i) for i in negative_ids or []]
+
+        def search():
+            # Qdrant looks up the vectors and searches in one call
+            with span("vector_search"):
+                similar_vectors = vector_db.recommend(
+                    positive_ids,
+                    negative_ids,
+                    limit=limit,
+                    with_payload=metadata_source == "payload",
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("recommend", similar_vectors)
+            return ImageProcessor._attach_metadata(similar_vectors, metadata_source)
+
+        key = (
+            "recommend", tuple(positive_ids), tuple(negative_ids), limit, metadata_source, score_threshold, hnsw_ef,
+            filters
+        )
+        return search_cache.search_results(key, search)
+
+    @staticmethod
+    def text_cursor(
+        text: str,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> SearchCursor:
+        """First-page cursor of a text search (ids and scores, like search_similar_by_text)."""
+        query_embedding = search_cache.text_embedding(text, lambda: ImageProcessor._embed_text(text))
+        return SearchCursor(
+            vector=np.asarray(query_embedding, dtype=np.float32),
+            metadata_source="none",
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=normalize_filters(filters)
+        )
+
+    @staticmethod
+    def image_cursor(
+        image_data: bytes,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> SearchCursor:
+        """First-page cursor of an image search; the embedding is cached as for search_similar."""
+        image_hash = content_hash(image_data)
+        query_embedding = search_cache.image_embedding(
+            image_hash, lambda: ImageProcessor._embed_query_image(image_data, image_hash)
+        )
+        return SearchCursor(
+            vector=np.asarray(query_embedding, dtype=np.float32),
+            metadata_source=metadata_source or settings.SEARCH_METADATA_SOURCE,
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=normalize_filters(filters)
+        )
+
+    @staticmethod
+    def recommend_cursor(
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> SearchCursor:
+        """First-page cursor of a by-id or recommend search (nothing to embed)."""
+        return SearchCursor(
+            positive_ids=[str(i) for i in positive_ids],
+            negative_ids=[str(i) for i in negative_ids or []],
+            metadata_source=metadata_source or settings.SEARCH_METADATA_SOURCE,
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=normalize_filters(filters)
+        )
+
+    @staticmethod
+    def _page_hits(cursor: SearchCursor, limit: int):
+        """Vector hits of the page at ``cursor`` and the cursor of the next page (None after the last)."""
+        with span("vector_search"):
+            if cursor.vector is not None:
+                hits = vector_db.search_similar(
+                    cursor.vector, limit=limit, with_payload=cursor.metadata_source == "payload",
+                    **cursor.search_options()
+                )
+            else:
+                hits = vector_db.recommend(
+                    cursor.positive_ids, cursor.negative_ids, limit=limit,
+                    with_payload=cursor.metadata_source == "payload", **cursor.search_options()
+                )
+        _log_hits("page", hits)
+        next_cursor = cursor.after(hits, limit)
+        return cursor.unseen(hits), next_cursor.encode() if next_cursor else None
+
+    @staticmethod
+    def search_page(cursor: SearchCursor, limit: int = 18) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of a paged search.
+
+        Args:
+            cursor (SearchCursor): From text_cursor, image_cursor or
+                recommend_cursor for the first page, SearchCursor.decode of a
+                returned ``next_cursor`` for the following ones
+            limit (int): Page size
+
+        Returns:
+            tuple: Results as for the matching search method, and the encoded
+            cursor of the next page (None after the last page)
+        """
+        def search():
+            hits, next_cursor = ImageProcessor._page_hits(cursor, limit)
+            return ImageProcessor._attach_metadata(hits, cursor.metadata_source), next_cursor
+
+        return search_cache.search_results(cursor.cache_key(limit), search)
+
+    @staticmethod
+    def _attach_metadata(similar_vectors, metadata_source: Optional[str] = None) -> List[Dict]:
+        """
+        Turn Qdrant hits into result dicts, keeping Qdrant's ranking order.
+
+        With the "postgres" source all rows are fetched in a single query and hits
+        without a row are dropped. With "payload" the metadata stored on the point
+        by insert_vector is used as-is and Postgres is not touched.
+        """
+        return ImageProcessor._attach_metadata_many([similar_vectors], metadata_source)[0]
+
+    @staticmethod
+    def _attach_metadata_many(hit_lists, metadata_source: Optional[str] = None) -> List[List[Dict]]:
+        """_attach_metadata for several result lists, with one Postgres query for all of them."""
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        rows = None
+        if metadata_source == "postgres":
+            with span("metadata_fetch"):
+                rows = postgres_db.get_image_metadata_many(ImageProcessor._hit_ids(hit_lists))
+        return ImageProcessor._merge_metadata(hit_lists, metadata_source, rows)
+
+    @staticmethod
+    def _hit_ids(hit_lists) -> List[str]:
+        return list(dict.fromkeys(str(match.id) for hits in hit_lists for match in hits))
+
+    @staticmethod
+    def _merge_metadata(hit_lists, metadata_source: str, rows: Optional[List[Dict]]) -> List[List[Dict]]:
+        """Build result dicts from hits and, for the "postgres" source, their metadata rows."""
+        if metadata_source == "none":
+            return [[{'id': match.id, 'score': match.score} for match in hits] for hits in hit_lists]
+        if metadata_source == "payload":
+            return [
+                [
+                    {
+                        'id': match.id,
+                        'score': match.score,
+                        'metadata': {'uuid': str(match.id), 'metadata': match.payload}
+                    }
+                    for match in similar_vectors
+                ]
+                for similar_vectors in hit_lists
+            ]
+        if metadata_source != "postgres":
+            raise ValueError(f"unknown metadata source: {metadata_source!r}")
+
+        rows_by_id = {str(row['uuid']): row for row in rows}
+        all_results = []
+        for similar_vectors in hit_lists:
+            results = []
+            for match in similar_vectors:
+                metadata = rows_by_id.get(str(match.id))
+                if metadata:
+                    results.append({
+                        'id': match.id,
+                        'score': match.score,
+                        'metadata': metadata
+                    })
+            all_results.append(results)
+        return all_results
+
+    @staticmethod
+    def warmup() -> Dict[str, float]:
+        """
+        Build every lazy singleton and run one embedding of each kind.
+
+        Returns the time each step took in ms, which shows where cold-start
+        time goes (model load vs first forward pass vs database connections).
+        """
+        timings = {}
+
+        def step(name, fn):
+            start = time.perf_counter()
+            fn()
+            timings[name] = (time.perf_counter() - start) * 1000
+
+        step("load_model", clip_embedder.resolve)
+        step("embed_text", lambda: ImageProcessor._embed_text("warmup"))
+        step("embed_image", lambda: ImageProcessor._embed_image(Image.new("RGB", (224, 224))))
+        step("vector_store_connect", lambda: vector_db.count())
+        step("postgres_connect", lambda: postgres_db.image_exists(str(uuid.UUID(int=0))))
+        return timings
 
     @staticmethod
     def get_metadata_by_id(image_id: str) -> Dict:
@@ -204,6 +684,352 @@ class ImageProcessor:
         Returns:
             dict: Image metadata or None if not found
         """
-        return postgres_db.get_image_metadata(image_id)
+        with span("metadata_fetch"):
+            return postgres_db.get_image_metadata(image_id)
+
+    # Async variants for the API's event loop. Vector store, Postgres and S3 calls
+    # go through async_vector_db, async_postgres_db and upload_image_to_s3_async:
+    # native async clients with ASYNC_IO_ENABLED, the blocking ones on the I/O
+    # pool otherwise. CLIP passes stay on the CPU pool.
+
+    @staticmethod
+    async def _embed_image_async(image: Image.Image):
+        with span("embed"):
+            if settings.EMBED_BATCHING_ENABLED:
+                return await asyncio.wrap_future(embedding_batcher.submit_image(image))
+            return await run_cpu(clip_embedder.get_image_embedding, image)
+
+    @staticmethod
+    async def _embed_text_async(text: str):
+        with span("embed"):
+            if settings.EMBED_BATCHING_ENABLED:
+                return await asyncio.wrap_future(embedding_batcher.submit_text(text))
+            return await run_cpu(clip_embedder.get_text_embedding, text)
+
+    @staticmethod
+    async def _decode_image_async(image_data: bytes) -> Image.Image:
+        # PIL releases the GIL while decoding; keep it off the loop and out of the CLIP queue
+        return await run_io(ImageProcessor._decode_image, image_data)
+
+    @staticmethod
+    async def _embed_query_image_async(image_data: bytes, image_hash: str):
+        """_embed_query_image for async callers."""
+        stored = await dedup.stored_embeddings_async(async_postgres_db, async_vector_db, [image_hash])
+        if image_hash in stored:
+            return stored[image_hash]
+        return await ImageProcessor._embed_image_async(await ImageProcessor._decode_image_async(image_data))
+
+    @staticmethod
+    async def _attach_metadata_async(similar_vectors, metadata_source: Optional[str] = None) -> List[Dict]:
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        rows = None
+        if metadata_source == "postgres":
+            with span("metadata_fetch"):
+                rows = await async_postgres_db.get_image_metadata_many(ImageProcessor._hit_ids([similar_vectors]))
+        return ImageProcessor._merge_metadata([similar_vectors], metadata_source, rows)[0]
+
+    @staticmethod
+    async def _upload_async(image_data: bytes, image_id: str) -> str:
+        with span("s3_upload"):
+            return await s3_utils.upload_image_to_s3_async(image_data, image_id)
+
+    @staticmethod
+    async def process_image_async(
+        image_data: bytes,
+        filename: str,
+        metadata: Optional[Dict] = None
+    ) -> str:
+        """
+        process_image for async callers.
+
+        The S3 upload runs while the image is embedded (unless the embedding
+        is needed first for the near-duplicate check), and the Postgres and
+        vector store writes run concurrently.
+        """
+        # Decode first so an invalid upload never reaches S3
+        image = await ImageProcessor._decode_image_async(image_data)
+        plan = await dedup.plan_batch_async(async_postgres_db, [image_data], [image])
+        image_id = plan.image_ids[0]
+        if not plan.new[0]:
+            return image_id
+        if settings.DEDUP_ENABLED and settings.DEDUP_COSINE_THRESHOLD:
+            embedding = await ImageProcessor._embed_image_async(image)
+            await dedup.check_near_duplicates_async(async_vector_db, plan, [0], [embedding])
+            if not plan.new[0]:
+                await dedup.index_hashes_async(async_postgres_db, plan)
+                return plan.image_ids[0]
+            s3_url = await ImageProcessor._upload_async(image_data, image_id)
+        else:
+            embedding, s3_url = await asyncio.gather(
+                ImageProcessor._embed_image_async(image),
+                ImageProcessor._upload_async(image_data, image_id)
+            )
+        metadata = dict(metadata or {}, s3_url=s3_url)
+        await asyncio.gather(
+            _timed("metadata_write", async_postgres_db.insert_image_metadata(
+                image_uuid=image_id, filename=filename, metadata=metadata
+            )),
+            _timed("vector_write", async_vector_db.insert_vector(
+                image_id=image_id, vector=embedding, metadata=metadata
+            ))
+        )
+        await dedup.index_hashes_async(async_postgres_db, plan)
+        await search_cache.bump_generation_async()
+        return image_id
+
+    @staticmethod
+    async def delete_image_async(image_id: str):
+        """delete_image for async callers; both deletes run concurrently."""
+        await asyncio.gather(
+            _timed("metadata_write", async_postgres_db.delete_image_metadata(image_id)),
+            _timed("vector_write", async_vector_db.delete_vector(image_id))
+        )
+        await search_cache.bump_generation_async()
+
+    @staticmethod
+    async def search_similar_async(
+        image_data: bytes,
+        limit: int = 8,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """search_similar for async callers; same arguments, results and cache entries."""
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        filters = normalize_filters(filters)
+        image_hash = content_hash(image_data)
+
+        async def search():
+            query_embedding = await search_cache.image_embedding_async(
+                image_hash, lambda: ImageProcessor._embed_query_image_async(image_data, image_hash)
+            )
+            with span("vector_search"):
+                similar_vectors = await async_vector_db.search_similar(
+                    query_embedding,
+                    limit=limit,
+                    with_payload=metadata_source == "payload",
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("image", similar_vectors)
+            return await ImageProcessor._attach_metadata_async(similar_vectors, metadata_source)
+
+        key = ("image", image_hash, limit, metadata_source, score_threshold, hnsw_ef, filters)
+        return await search_cache.search_results_async(key, search)
+
+    @staticmethod
+    async def search_similar_by_text_async(
+        text: str,
+        limit: int = 18,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """search_similar_by_text for async callers."""
+        filters = normalize_filters(filters)
+
+        async def search():
+            query_embedding = await search_cache.text_embedding_async(
+                text, lambda: ImageProcessor._embed_text_async(text)
+            )
+            with span("vector_search"):
+                similar_vectors = await async_vector_db.search_similar(
+                    query_embedding,
+                    limit=limit,
+                    with_payload=False,
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("text", similar_vectors)
+            return [{'id': match.id, 'score': match.score} for match in similar_vectors]
+
+        key = ("text", normalize_text(text), limit, score_threshold, hnsw_ef, filters)
+        return await search_cache.search_results_async(key, search)
+
+    @staticmethod
+    async def search_similar_by_id_async(
+        image_id: str,
+        limit: int = 18,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """search_similar_by_id for async callers."""
+        return await ImageProcessor.recommend_async(
+            [image_id],
+            limit=limit,
+            metadata_source=metadata_source,
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=filters
+        )
+
+    @staticmethod
+    async def recommend_async(
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 18,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """recommend for async callers."""
+        metadata_source = metadata_source or settings.SEARCH_METADATA_SOURCE
+        filters = normalize_filters(filters)
+        positive_ids = [str(i) for i in positive_ids]
+        negative_ids = [str(i) for i in negative_ids or []]
+
+        async def search():
+            with span("vector_search"):
+                similar_vectors = await async_vector_db.recommend(
+                    positive_ids,
+                    negative_ids,
+                    limit=limit,
+                    with_payload=metadata_source == "payload",
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    filters=filters
+                )
+            _log_hits("recommend", similar_vectors)
+            return await ImageProcessor._attach_metadata_async(similar_vectors, metadata_source)
+
+        key = (
+            "recommend", tuple(positive_ids), tuple(negative_ids), limit, metadata_source, score_threshold, hnsw_ef,
+            filters
+        )
+        return await search_cache.search_results_async(key, search)
+
+    @staticmethod
+    async def text_cursor_async(
+        text: str,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> SearchCursor:
+        """text_cursor for async callers."""
+        query_embedding = await search_cache.text_embedding_async(
+            text, lambda: ImageProcessor._embed_text_async(text)
+        )
+        return SearchCursor(
+            vector=np.asarray(query_embedding, dtype=np.float32),
+            metadata_source="none",
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=normalize_filters(filters)
+        )
+
+    @staticmethod
+    async def image_cursor_async(
+        image_data: bytes,
+        metadata_source: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> SearchCursor:
+        """image_cursor for async callers."""
+        image_hash = content_hash(image_data)
+        query_embedding = await search_cache.image_embedding_async(
+            image_hash, lambda: ImageProcessor._embed_query_image_async(image_data, image_hash)
+        )
+        return SearchCursor(
+            vector=np.asarray(query_embedding, dtype=np.float32),
+            metadata_source=metadata_source or settings.SEARCH_METADATA_SOURCE,
+            score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef,
+            filters=normalize_filters(filters)
+        )
+
+    @staticmethod
+    async def _page_hits_async(cursor: SearchCursor, limit: int):
+        """_page_hits for async callers."""
+        with span("vector_search"):
+            if cursor.vector is not None:
+                hits = await async_vector_db.search_similar(
+                    cursor.vector, limit=limit, with_payload=cursor.metadata_source == "payload",
+                    **cursor.search_options()
+                )
+            else:
+                hits = await async_vector_db.recommend(
+                    cursor.positive_ids, cursor.negative_ids, limit=limit,
+                    with_payload=cursor.metadata_source == "payload", **cursor.search_options()
+                )
+        _log_hits("page", hits)
+        next_cursor = cursor.after(hits, limit)
+        return cursor.unseen(hits), next_cursor.encode() if next_cursor else None
+
+    @staticmethod
+    async def search_page_async(cursor: SearchCursor, limit: int = 18) -> Tuple[List[Dict], Optional[str]]:
+        """search_page for async callers."""
+        async def search():
+            hits, next_cursor = await ImageProcessor._page_hits_async(cursor, limit)
+            return await ImageProcessor._attach_metadata_async(hits, cursor.metadata_source), next_cursor
+
+        return await search_cache.search_results_async(cursor.cache_key(limit), search)
+
+    @staticmethod
+    async def stream_page_async(
+        cursor: SearchCursor,
+        limit: int = 18,
+        batch_size: Optional[int] = None
+    ) -> Tuple[AsyncIterator[List[Dict]], Optional[str]]:
+        """
+        search_page_async for large pages: the results come as an async
+        iterator of batches of ``batch_size`` (default SEARCH_STREAM_BATCH_SIZE).
+
+        With the "postgres" source the metadata queries of up to
+        SEARCH_STREAM_PREFETCH batches run ahead of the one being yielded, so
+        the first results can go out while later rows are still being fetched.
+        Skips the search results cache.
+        """
+        hits, next_cursor = await ImageProcessor._page_hits_async(cursor, limit)
+        batch_size = batch_size or settings.SEARCH_STREAM_BATCH_SIZE
+        return ImageProcessor._iter_results_async(hits, cursor.metadata_source, batch_size), next_cursor
+
+    @staticmethod
+    async def _iter_results_async(hits, metadata_source: str, batch_size: int) -> AsyncIterator[List[Dict]]:
+        batches = [hits[start:start + batch_size] for start in range(0, len(hits), batch_size)]
+        if metadata_source != "postgres":
+            for batch in batches:
+                yield ImageProcessor._merge_metadata([batch], metadata_source, None)[0]
+            return
+
+        def start(batch):
+            return asyncio.ensure_future(async_postgres_db.get_image_metadata_many(ImageProcessor._hit_ids([batch])))
+
+        # Fetch a few batches ahead of the one being sent, not all of them:
+        # each pending query holds a pool connection while the client reads
+        depth = max(1, settings.SEARCH_STREAM_PREFETCH)
+        fetches = deque(start(batch) for batch in batches[:depth])
+        try:
+            for i, batch in enumerate(batches):
+                with span("metadata_fetch"):
+                    rows = await fetches.popleft()
+                if i + depth < len(batches):
+                    fetches.append(start(batches[i + depth]))
+                yield ImageProcessor._merge_metadata([batch], metadata_source, rows)[0]
+        finally:
+            # The client went away mid-stream: don't leave queries running for nobody
+            for fetch in fetches:
+                fetch.cancel()
+
+    @staticmethod
+    async def get_metadata_by_id_async(image_id: str) -> Dict:
+        """get_metadata_by_id for async callers."""
+        with span("metadata_fetch"):
+            return await async_postgres_db.get_image_metadata(image_id)
+
+    @staticmethod
+    async def aclose():
+        """Close the native async clients (they are bound to the event loop that opened them)."""
+        from .vector_store import async_vector_db as vector_client
+        for client in (async_postgres_db, vector_client):
+            if client.is_initialized:
+                await client.aclose()
+        await s3_utils.close_async_client()
 
 image_processor = ImageProcessor() 
\ No newline at end of file
@@ -0,0 +1,511 @@
+"""
+Re-embed the whole collection into a new Qdrant collection, then switch to it.
+
+    python -m app.reembed --model ViT-L-14 --pretrained laion2b_s32b_b82k \\
+        --workers 4 --checkpoint reembed.ckpt --latency-budget-ms 80
+
+QDRANT_COLLECTION is served through an alias. The job pages through
+``pretty_images_metadata`` in upload order (keyset pagination), downloads each
+original from its ``s3_url``, decodes and embeds batches of REEMBED_BATCH_SIZE
+images on ``--workers`` processes (each loads the model once) and upserts them
+into a new collection named after the model. Searches and ingestion keep using
+the live collection meanwhile. When every row is written, rows added during
+the run are caught up, the alias is moved to the new collection in one atomic
+request and the search caches are cleared; points of images deleted during
+the run are then removed.
+
+- progress is checkpointed after every written batch; re-running with the same
+  ``--checkpoint`` resumes, and images already in the new collection are never
+  embedded twice
+- with ``--latency-budget-ms`` the job probes search latency on the live
+  collection and pauses between batches while the p95 is over budget
+- the previous collection is kept for rollback (``--point-alias <name>``)
+  unless ``--delete-old``
+
+A deployment created before aliases has a plain collection named
+QDRANT_COLLECTION; the first switch must delete it (``--replace-collection``),
+so searches fail for the moment between the delete and the alias creation.
+
+Query embeddings must come from the model the live collection was built with,
+so the job only switches the alias when ``--model`` / ``--pretrained`` match
+this process's CLIP_MODEL_NAME / CLIP_PRETRAINED (``--switch-model-mismatch``
+overrides). When the model changes it builds without switching and prints
+ROLLOUT_STEPS.
+"""
+import argparse
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .image_io import decode_image
+from .search_cache import search_cache
+
+logger = logging.getLogger(__name__)
+
+# Rows are keyed by their transaction's start time, so a long transaction can
+# commit a row that sorts before the cursor; catch-up rescans this far back
+CATCH_UP_MARGIN = timedelta(minutes=5)
+ZERO_UUID = "00000000-0000-0000-0000-000000000000"
+
+ROLLOUT_STEPS = """\
+{collection} is built with {model}/{pretrained} but the API embeds queries with
+{live_model}/{live_pretrained}, so the alias was not switched. To roll out:
+  1. deploy the API workers with CLIP_MODEL_NAME={model}, CLIP_PRETRAINED={pretrained_env}
+     and QDRANT_COLLECTION={collection}
+  2. re-run this job with the same --checkpoint under that configuration; it
+     catches up and points {alias} at {collection}
+  3. set QDRANT_COLLECTION back to {alias} and redeploy
+  4. refit app.two_stage if SEARCH_MODE=two_stage"""
+
+
+@dataclass
+class ReembedReport:
+    embedded: int = 0
+    skipped: int = 0              # already in the new collection
+    failed: int = 0
+    pruned: int = 0               # deleted from Postgres during the run
+    throttled: float = 0.0        # seconds paused for the latency budget
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def images_per_second(self) -> float:
+        return self.embedded / self.elapsed if self.elapsed else 0.0
+
+
+def load_clip_embedder(model_name: str, pretrained: Optional[str]):
+    from .embedder import OpenCLIPEmbedder
+    return OpenCLIPEmbedder(model_name, pretrained or None)
+
+
+def collection_name(alias: str, model_name: str, pretrained: Optional[str]) -> str:
+    """A new collection name for ``alias`` built with the given weights."""
+    model = re.sub(r"[^0-9A-Za-z]+", "_", f"{model_name}_{pretrained or 'random'}").strip("_").lower()
+    return f"{alias}_{model}_{time.strftime('%Y%m%d%H%M%S')}"
+
+
+# Set in each embedding process by _init_worker
+_worker_embedder = None
+
+
+def _init_worker(embedder_factory: Callable, num_threads: int):
+    global _worker_embedder
+    if num_threads:
+        settings.TORCH_NUM_THREADS = num_threads
+    _worker_embedder = embedder_factory()
+
+
+def _embed_in_worker(image_data_list: List[bytes]):
+    return embed_images(_worker_embedder, image_data_list)
+
+
+def embed_images(embedder, image_data_list: List[bytes]) -> Tuple[List[int], np.ndarray, List[Tuple[int, str]]]:
+    """Decode and embed a batch: (indices embedded, their vectors, (index, error) for the rest)."""
+    indices, images, errors = [], [], []
+    for i, data in enumerate(image_data_list):
+        try:
+            images.append(decode_image(data))
+            indices.append(i)
+        except Exception as e:
+            errors.append((i, f"decode failed: {e}"))
+    if not images:
+        return [], np.empty((0, 0), dtype=np.float32), errors
+    return indices, np.asarray(embedder.get_batch_embeddings(images), dtype=np.float32), errors
+
+
+class LatencyThrottle:
+    """
+    Keeps live search latency within ``budget_ms`` by pausing between batches.
+
+    Every ``interval`` seconds one search runs against the live collection with
+    a stored vector. While the p95 of the last ``window`` probes is over budget
+    the pause doubles (up to ``max_pause``); while it is under, the pause halves.
+    """
+
+    def __init__(self, vector_db, budget_ms: float, interval: float = 1.0, window: int = 10, max_pause: float = 30.0):
+        self.vector_db = vector_db
+        self.budget_ms = budget_ms
+        self.interval = interval
+        self.max_pause = max_pause
+        self.pause = 0.0
+        self._samples = deque(maxlen=window)
+        self._queries = None
+        self._next_probe = 0.0
+
+    def _probe(self):
+        if self._queries is None:
+            # Stored vectors give realistic queries with the live collection's dimension
+            batch = next(iter(self.vector_db.iter_vectors(batch_size=16)), None)
+            self._queries = deque(batch[1]) if batch else deque()
+        if not self._queries:
+            return
+        query = self._queries[0]
+        self._queries.rotate(-1)
+        start = time.perf_counter()
+        self.vector_db.search_similar(query, limit=18, with_payload=False)
+        self._samples.append((time.perf_counter() - start) * 1000)
+
+    @property
+    def p95_ms(self) -> float:
+        return float(np.percentile(self._samples, 95)) if self._samples else 0.0
+
+    def wait(self) -> float:
+        """Probe if due, adjust the pause and sleep it; return the seconds slept."""
+        now = time.monotonic()
+        if now >= self._next_probe:
+            self._next_probe = now + self.interval
+            self._probe()
+            if self.p95_ms > self.budget_ms:
+                if self.pause == self.max_pause:
+                    logger.warning("search p95 %.1f ms still over the %.1f ms budget at a %.0f s pause; "
+                                   "is the budget below the idle latency?", self.p95_ms, self.budget_ms, self.pause)
+                self.pause = min(max(self.pause * 2, 0.05), self.max_pause)
+            else:
+                self.pause = self.pause / 2 if self.pause > 0.01 else 0.0
+        if self.pause:
+            time.sleep(self.pause)
+        return self.pause
+
+
+class ReembedJob:
+    """
+    Re-embedding of every image in Postgres into a new collection behind ``alias``.
+
+    ``postgres_db``, ``client`` (a QdrantClient) and ``fetch`` (URL -> image
+    bytes) default to the app's Postgres, Qdrant and S3; ``embedder_factory``
+    builds the embedder once per worker process (in this process with
+    ``workers=0``) and must be picklable when ``workers`` > 0.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.CLIP_MODEL_NAME,
+        pretrained: Optional[str] = settings.CLIP_PRETRAINED,
+        embedder_factory: Optional[Callable] = None,
+        postgres_db=None,
+        client=None,
+        fetch: Optional[Callable[[str], bytes]] = None,
+        alias: Optional[str] = None,
+        collection: Optional[str] = None,
+        workers: int = settings.REEMBED_WORKERS,
+        batch_size: int = settings.REEMBED_BATCH_SIZE,
+        fetch_workers: int = settings.REEMBED_FETCH_WORKERS,
+        latency_budget_ms: float = settings.REEMBED_LATENCY_BUDGET_MS,
+        qdrant_batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE,
+        checkpoint_path: Optional[str] = None
+    ):
+        from .db_qdrant import QdrantDB
+        if postgres_db is None:
+            from .db_postgres import postgres_db
+        if client is None:
+            from .db_qdrant import qdrant_db
+            client = qdrant_db.client
+        if fetch is None:
+            from .s3_utils import download_image_from_s3 as fetch
+        self.model_name = model_name
+        self.pretrained = pretrained or None
+        self.postgres_db = postgres_db
+        self.fetch = fetch
+        self.alias = alias or settings.QDRANT_COLLECTION
+        self.batch_size = batch_size
+        self.qdrant_batch_size = qdrant_batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = self._load_checkpoint()
+        collection = collection or self.checkpoint.get("collection") or collection_name(
+            self.alias, model_name, self.pretrained
+        )
+        self.live = QdrantDB(client, collection=self.alias)
+        self.target = QdrantDB(client, collection=collection)
+        self.throttle = LatencyThrottle(self.live, latency_budget_ms) if latency_budget_ms else None
+
+        embedder_factory = embedder_factory or functools.partial(load_clip_embedder, model_name, self.pretrained)
+        self._fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="reembed-fetch")
+        if workers > 0:
+            # spawn: forking after torch has started its thread pools can deadlock
+            self._embed_pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(embedder_factory, max(1, (os.cpu_count() or 1) // workers))
+            )
+            self._embed = _embed_in_worker
+        else:
+            # One thread, so fetching the next batch still overlaps the embedding
+            self._embed_pool = ThreadPoolExecutor(1, thread_name_prefix="reembed-embed")
+            self._embed = functools.partial(embed_images, embedder_factory())
+        self._depth = max(workers, 1) + 1   # batches in flight
+        self._target_exists = collection in self.live.collection_names()
+
+    @property
+    def model_mismatch(self) -> bool:
+        """Whether the new collection's model differs from the one the API embeds queries with."""
+        return (self.model_name, self.pretrained) != (settings.CLIP_MODEL_NAME, settings.CLIP_PRETRAINED or None)
+
+    def rollout_steps(self) -> str:
+        return ROLLOUT_STEPS.format(
+            collection=self.target.collection,
+            alias=self.alias,
+            model=self.model_name,
+            pretrained=self.pretrained or "random",
+            pretrained_env=self.pretrained or "",
+            live_model=settings.CLIP_MODEL_NAME,
+            live_pretrained=settings.CLIP_PRETRAINED or "random"
+        )
+
+    def _load_checkpoint(self) -> dict:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if (checkpoint["model_name"], checkpoint["pretrained"]) != (self.model_name, self.pretrained):
+            raise ValueError(
+                f"{self.checkpoint_path} is for {checkpoint['model_name']}/{checkpoint['pretrained']}, "
+                f"not {self.model_name}/{self.pretrained}"
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, after: Optional[tuple]):
+        self.checkpoint.update({
+            "collection": self.target.collection,
+            "model_name": self.model_name,
+            "pretrained": self.pretrained,
+            "after": [after[0].isoformat(), str(after[1])] if after else None,
+        })
+        if not self.checkpoint_path:
+            return
+        # Written aside and renamed, so a crash never leaves a torn checkpoint
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _checkpointed_after(self) -> Optional[tuple]:
+        after = self.checkpoint.get("after")
+        return (datetime.fromisoformat(after[0]), after[1]) if after else None
+
+    def _pages(self, after: Optional[tuple]):
+        while True:
+            rows = self.postgres_db.get_image_metadata_page(after, self.batch_size)
+            if not rows:
+                return
+            yield rows
+            after = (rows[-1]["upload_time"], str(rows[-1]["uuid"]))
+
+    def _fetch(self, row: dict) -> bytes:
+        url = (row.get("metadata") or {}).get("s3_url")
+        if not url:
+            raise ValueError("no s3_url in metadata")
+        return self.fetch(url)
+
+    def _submit(self, rows: List[dict], report: ReembedReport):
+        """Drop rows already in the new collection, download the rest and queue them for embedding."""
+        if self._target_exists:
+            done = {hit.id for hit in self.target.retrieve([str(row["uuid"]) for row in rows], with_vectors=False)}
+            report.skipped += sum(str(row["uuid"]) in done for row in rows)
+            rows = [row for row in rows if str(row["uuid"]) not in done]
+        downloads = [self._fetch_pool.submit(self._fetch, row) for row in rows]
+        fetched, image_data_list = [], []
+        for row, download in zip(rows, downloads):
+            try:
+                image_data_list.append(download.result())
+                fetched.append(row)
+            except Exception as e:
+                report.failed += 1
+                report.errors.append(f"{row['uuid']}: {e}")
+        return fetched, self._embed_pool.submit(self._embed, image_data_list)
+
+    def _write(self, rows: List[dict], embedding, report: ReembedReport):
+        indices, vectors, errors = embedding.result()
+        for i, error in errors:
+            report.failed += 1
+            report.errors.append(f"{rows[i]['uuid']}: {error}")
+        if indices:
+            if not self._target_exists:
+                self.target.ensure_collection(vector_size=vectors.shape[1])
+                self._target_exists = True
+            self.target.insert_vectors(
+                [str(rows[i]["uuid"]) for i in indices],
+                vectors,
+                [rows[i].get("metadata") or {} for i in indices],
+                batch_size=self.qdrant_batch_size
+            )
+        report.embedded += len(indices)
+
+    def _copy(self, after: Optional[tuple], report: ReembedReport, progress: bool = False, start: float = 0.0):
+        """Embed every row after ``after`` into the new collection, checkpointing each batch in order."""
+        in_flight = deque()
+
+        def write_oldest():
+            page, rows, embedding = in_flight.popleft()
+            self._write(rows, embedding, report)
+            self._save_checkpoint((page[-1]["upload_time"], str(page[-1]["uuid"])))
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"embedded={report.embedded} skipped={report.skipped} failed={report.failed} "
+                      f"{report.embedded / elapsed:.1f} img/s"
+                      + (f" search_p95={self.throttle.p95_ms:.1f}ms pause={self.throttle.pause:.2f}s"
+                         if self.throttle else ""))
+
+        for page in self._pages(after):
+            if self.throttle:
+                report.throttled += self.throttle.wait()
+            rows, embedding = self._submit(page, report)
+            in_flight.append((page, rows, embedding))
+            if len(in_flight) >= self._depth:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+
+    def _catch_up(self, report: ReembedReport, progress: bool = False, start: float = 0.0):
+        """Embed rows added since the checkpoint (plus CATCH_UP_MARGIN) that the new collection lacks."""
+        after = self._checkpointed_after()
+        if after is not None:
+            after = (after[0] - CATCH_UP_MARGIN, ZERO_UUID)
+        self._copy(after, report, progress, start)
+
+    def _prune(self, report: ReembedReport):
+        """Delete points of images whose metadata rows were deleted during the run."""
+        from qdrant_client.http.models import PointIdsList
+        offset = None
+        while True:
+            points, offset = self.target.client.scroll(
+                collection_name=self.target.collection,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids = [str(p.id) for p in points]
+            kept = {str(row["uuid"]) for row in self.postgres_db.get_image_metadata_many(ids)}
+            deleted = [image_id for image_id in ids if image_id not in kept]
+            if deleted:
+                self.target.client.delete(
+                    collection_name=self.target.collection,
+                    points_selector=PointIdsList(points=deleted)
+                )
+                report.pruned += len(deleted)
+            if offset is None:
+                return
+
+    def run(
+        self,
+        switch: bool = True,
+        replace_collection: bool = False,
+        delete_old: bool = False,
+        progress: bool = False,
+        switch_model_mismatch: bool = False
+    ) -> ReembedReport:
+        """
+        Build (or resume) the new collection, then with ``switch`` point the alias at it.
+
+        Raises ValueError before doing any work when switching to a model other
+        than the configured CLIP model, unless ``switch_model_mismatch``.
+        """
+        if switch and self.model_mismatch and not switch_model_mismatch:
+            raise ValueError(self.rollout_steps())
+        report = ReembedReport()
+        start = time.perf_counter()
+        self._copy(self._checkpointed_after(), report, progress, start)
+        self._catch_up(report, progress, start)
+        if switch:
+            if not self._target_exists:
+                raise ValueError("nothing was embedded, not switching to an empty collection")
+            previous = self.target.point_alias(self.alias, replace_collection=replace_collection)
+            logger.info("%s now points at %s (was %s)", self.alias, self.target.collection, previous)
+            search_cache.clear()
+            search_cache.bump_generation()
+            # Rows written to the old collection between the catch-up and the switch
+            self._catch_up(report, progress, start)
+            self._prune(report)
+            if delete_old and previous:
+                self.target.client.delete_collection(previous)
+                logger.info("deleted %s", previous)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def close(self):
+        self._fetch_pool.shutdown()
+        self._embed_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.CLIP_MODEL_NAME, help="open_clip architecture")
+    parser.add_argument("--pretrained", default=settings.CLIP_PRETRAINED, help="open_clip weights")
+    parser.add_argument("--workers", type=int, default=settings.REEMBED_WORKERS,
+                        help="embedding processes, 0 = embed in this process")
+    parser.add_argument("--batch-size", type=int, default=settings.REEMBED_BATCH_SIZE)
+    parser.add_argument("--fetch-workers", type=int, default=settings.REEMBED_FETCH_WORKERS)
+    parser.add_argument("--latency-budget-ms", type=float, default=settings.REEMBED_LATENCY_BUDGET_MS,
+                        help="pause while live search p95 exceeds this, 0 = never")
+    parser.add_argument("--checkpoint", help="checkpoint file for resumable runs")
+    parser.add_argument("--collection", help="name of the new collection (default: derived from the model)")
+    parser.add_argument("--no-switch", action="store_true", help="build the new collection but keep the alias")
+    parser.add_argument("--switch-model-mismatch", action="store_true",
+                        help="switch the alias even though --model/--pretrained differ from CLIP_MODEL_NAME/"
+                             "CLIP_PRETRAINED (queries will be embedded with the wrong model)")
+    parser.add_argument("--replace-collection", action="store_true",
+                        help=f"delete a plain collection named {settings.QDRANT_COLLECTION} to create the alias")
+    parser.add_argument("--delete-old", action="store_true", help="delete the previous collection after the switch")
+    parser.add_argument("--point-alias", metavar="COLLECTION",
+                        help="only point the alias at an existing collection (rollback)")
+    args = parser.parse_args()
+
+    if settings.VECTOR_BACKEND != "qdrant":
+        parser.error("re-embedding needs VECTOR_BACKEND=qdrant")
+    if args.point_alias:
+        from .db_qdrant import QdrantDB, qdrant_db
+        previous = QdrantDB(qdrant_db.client, collection=args.point_alias).point_alias(settings.QDRANT_COLLECTION)
+        search_cache.clear()
+        search_cache.bump_generation()
+        print(f"{settings.QDRANT_COLLECTION} -> {args.point_alias} (was {previous})")
+        return
+
+    job = ReembedJob(
+        model_name=args.model,
+        pretrained=args.pretrained,
+        collection=args.collection,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        fetch_workers=args.fetch_workers,
+        latency_budget_ms=args.latency_budget_ms,
+        checkpoint_path=args.checkpoint
+    )
+    print(f"re-embedding into {job.target.collection} with {args.model}/{args.pretrained or 'random'}")
+    hold = job.model_mismatch and not args.switch_model_mismatch
+    switch = not (args.no_switch or hold)
+    try:
+        report = job.run(
+            switch=switch,
+            replace_collection=args.replace_collection,
+            delete_old=args.delete_old,
+            progress=True,
+            switch_model_mismatch=args.switch_model_mismatch
+        )
+    finally:
+        job.close()
+    for error in report.errors:
+        print("failed:", error)
+    print(f"done: embedded={report.embedded} skipped={report.skipped} failed={report.failed} "
+          f"pruned={report.pruned} throttled={report.throttled:.1f}s "
+          f"in {report.elapsed:.1f}s ({report.images_per_second:.1f} images/s)")
+    if switch:
+        print(f"{job.alias} -> {job.target.collection}")
+    elif hold:
+        print(job.rollout_steps())
+
+
+if __name__ == "__main__":
+    main()
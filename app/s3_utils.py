@@ -1,31 +1,207 @@
-import boto3
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from PIL import Image
+
 from .config import settings
+from .executors import run_io
+from .lazy import Lazy
 
-def upload_image_to_s3(image_bytes: bytes, image_id: str, content_type: str = "image/jpeg") -> str:
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION,
-    )
-    key = f"images/{image_id}.jpg"
-    s3.put_object(
+# PIL format -> (key extension, Content-Type)
+IMAGE_TYPES = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+    "GIF": (".gif", "image/gif"),
+    "BMP": (".bmp", "image/bmp"),
+    "TIFF": (".tiff", "image/tiff"),
+}
+DEFAULT_IMAGE_TYPE = (".jpg", "image/jpeg")
+
+def detect_image_type(image_bytes: bytes) -> Tuple[str, str]:
+    """(extension, content type) from the image header; JPEG if PIL does not recognise it."""
+    try:
+        image_format = Image.open(io.BytesIO(image_bytes)).format  # reads the header only
+    except Exception:
+        return DEFAULT_IMAGE_TYPE
+    return IMAGE_TYPES.get(image_format, DEFAULT_IMAGE_TYPE)
+
+def _image_key(image_id: str, extension: str = ".jpg") -> str:
+    return f"images/{image_id}{extension}"
+
+def _object_url(key: str) -> str:
+    return f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_S3_REGION}.amazonaws.com/{key}"
+
+def _key_from_url(url: str) -> str:
+    """Object key of an ``_object_url`` URL (a bare key is returned as is)."""
+    return urlparse(url).path.lstrip("/") if "://" in url else url
+
+def _content_type_and_key(image_bytes: bytes, image_id: str, content_type: Optional[str]) -> Tuple[str, str]:
+    extension, detected = detect_image_type(image_bytes)
+    return content_type or detected, _image_key(image_id, extension)
+
+
+class S3Uploader:
+    """
+    Long-lived S3 uploader shared by every request and the ingest path.
+
+    - one boto3 client (clients are thread-safe) with a connection pool of
+      S3_MAX_POOL_CONNECTIONS, so credentials, endpoints and connections are
+      resolved once instead of per upload
+    - ``upload_many`` uploads a batch concurrently on S3_UPLOAD_WORKERS threads
+    - bodies over S3_MULTIPART_THRESHOLD go up as a multipart upload, with
+      S3_MULTIPART_WORKERS parts of S3_MULTIPART_CHUNKSIZE in flight
+    - key extension and Content-Type come from the image header
+
+    Pass ``client`` to upload somewhere other than AWS, e.g. a local stand-in.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        bucket: Optional[str] = None,
+        upload_workers: int = settings.S3_UPLOAD_WORKERS,
+        multipart_threshold: int = settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize: int = settings.S3_MULTIPART_CHUNKSIZE,
+        multipart_workers: int = settings.S3_MULTIPART_WORKERS
+    ):
+        self.client = client or self._make_client()
+        self.bucket = bucket or settings.AWS_S3_BUCKET
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        # Separate pools: a batch upload waiting on its parts must not hold the threads the parts need
+        self._upload_pool = ThreadPoolExecutor(upload_workers, thread_name_prefix="s3-upload")
+        self._part_pool = ThreadPoolExecutor(multipart_workers, thread_name_prefix="s3-part")
+
+    @staticmethod
+    def _make_client():
+        import boto3  # imported on first upload to keep cold starts short
+        from botocore.config import Config
+        return boto3.client(
+            "s3",
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION,
+            config=Config(
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                retries={"max_attempts": 5, "mode": "adaptive"}
+            )
+        )
+
+    def upload(self, image_bytes: bytes, image_id: str, content_type: Optional[str] = None) -> str:
+        """Upload one image and return its URL; ``content_type`` overrides detection."""
+        content_type, key = _content_type_and_key(image_bytes, image_id, content_type)
+        if len(image_bytes) > self.multipart_threshold:
+            self._upload_multipart(image_bytes, key, content_type)
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=image_bytes, ContentType=content_type)
+        return _object_url(key)
+
+    def upload_many(self, image_bytes_list: List[bytes], image_ids: List[str]) -> List[str]:
+        """Upload a batch concurrently; URLs come back in input order."""
+        return list(self._upload_pool.map(self.upload, image_bytes_list, image_ids))
+
+    def download(self, url: str) -> bytes:
+        """Body of an object uploaded by ``upload``, by its URL or key."""
+        return self.client.get_object(Bucket=self.bucket, Key=_key_from_url(url))["Body"].read()
+
+    def _upload_multipart(self, data: bytes, key: str, content_type: str):
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ContentType=content_type
+        )["UploadId"]
+
+        def upload_part(part_number: int) -> dict:
+            start = (part_number - 1) * self.multipart_chunksize
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data[start:start + self.multipart_chunksize]
+            )
+            return {"ETag": response["ETag"], "PartNumber": part_number}
+
+        part_count = -(-len(data) // self.multipart_chunksize)
+        try:
+            parts = list(self._part_pool.map(upload_part, range(1, part_count + 1)))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except Exception:
+            # Otherwise the uploaded parts are kept (and billed) until a lifecycle rule removes them
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def close(self):
+        self._upload_pool.shutdown()
+        self._part_pool.shutdown()
+
+
+# Built on first upload
+s3_uploader = Lazy(S3Uploader, name="s3_uploader")
+
+def upload_image_to_s3(image_bytes: bytes, image_id: str, content_type: Optional[str] = None) -> str:
+    return s3_uploader.upload(image_bytes, image_id, content_type)
+
+def upload_images_to_s3(image_bytes_list: List[bytes], image_ids: List[str]) -> List[str]:
+    return s3_uploader.upload_many(image_bytes_list, image_ids)
+
+def download_image_from_s3(url: str) -> bytes:
+    return s3_uploader.download(url)
+
+# aiobotocore client shared by async uploads, opened on first use
+_async_client = None
+_async_client_exit = None
+_async_client_lock = asyncio.Lock()
+
+async def _get_async_client():
+    global _async_client, _async_client_exit
+    if _async_client is None:
+        async with _async_client_lock:
+            if _async_client is None:
+                from aiobotocore.config import AioConfig
+                from aiobotocore.session import get_session  # optional, only needed with ASYNC_IO_ENABLED
+                context = get_session().create_client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION,
+                    config=AioConfig(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS)
+                )
+                _async_client = await context.__aenter__()
+                _async_client_exit = context.__aexit__
+    return _async_client
+
+async def upload_image_to_s3_async(image_bytes: bytes, image_id: str, content_type: Optional[str] = None) -> str:
+    """
+    upload_image_to_s3 for async callers: aiobotocore with ASYNC_IO_ENABLED,
+    else the shared S3Uploader on the I/O pool. API uploads are capped by
+    MAX_UPLOAD_BYTES, so the async path always uses a single PUT.
+    """
+    if not settings.ASYNC_IO_ENABLED:
+        return await run_io(upload_image_to_s3, image_bytes, image_id, content_type)
+    content_type, key = _content_type_and_key(image_bytes, image_id, content_type)
+    s3 = await _get_async_client()
+    await s3.put_object(
         Bucket=settings.AWS_S3_BUCKET,
         Key=key,
         Body=image_bytes,
         ContentType=content_type
     )
-    url = f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_S3_REGION}.amazonaws.com/{key}"
-    return url
+    return _object_url(key)
+
+async def close_async_client():
+    global _async_client, _async_client_exit
+    if _async_client_exit is not None:
+        exit_client, _async_client, _async_client_exit = _async_client_exit, None, None
+        await exit_client(None, None, None)
 
 # only for the first time to create the bucket
 def create_bucket_if_not_exists(bucket_name: str = "imagemtadata2025"):
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION,
-    )
+    s3 = s3_uploader.client
     buckets = [b["Name"] for b in s3.list_buckets()["Buckets"]]
     if bucket_name not in buckets:
         s3.create_bucket(
@@ -34,4 +210,4 @@ def create_bucket_if_not_exists(bucket_name: str = "imagemtadata2025"):
         )
         print(f"Bucket '{bucket_name}' created.")
     else:
-        print(f"Bucket '{bucket_name}' already exists.") 
\ No newline at end of file
+        print(f"Bucket '{bucket_name}' already exists.")
@@ -0,0 +1,173 @@
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+from .cache import RedisCache, TTLCache
+from .config import settings
+from .executors import run_io
+from .lazy import Lazy
+
+_MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a text query; open_clip's tokenizer lowercases and collapses whitespace too."""
+    return " ".join(text.lower().split())
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class SearchCache:
+    """
+    Query embedding and search result caches for ImageProcessor.
+
+    - text embeddings, keyed by normalized text
+    - query image embeddings, keyed by a hash of the uploaded bytes
+    - final search results, keyed by query + options and the collection generation
+
+    Embeddings only depend on the model, so they are never invalidated; Redis
+    keys include CLIP_MODEL_NAME / CLIP_PRETRAINED, so workers running
+    different weights (during a model rollout) never share them. Writes
+    to the collection call ``bump_generation()``, which orphans every cached
+    result; with the Redis backend the generation is shared, so a write on one
+    worker invalidates results on all of them.
+    """
+
+    def __init__(self, text_embeddings, image_embeddings, results, redis_client=None, enabled: bool = True):
+        self.text_embeddings = text_embeddings
+        self.image_embeddings = image_embeddings
+        self.results = results
+        self.enabled = enabled
+        self._redis = redis_client
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        if self._redis is not None:
+            return int(self._redis.get("search_cache:generation") or 0)
+        return self._generation
+
+    def bump_generation(self):
+        """Invalidate every cached search result (called after collection writes)."""
+        if self._redis is not None:
+            self._redis.incr("search_cache:generation")
+        else:
+            with self._lock:
+                self._generation += 1
+
+    @staticmethod
+    def _get_or_compute(cache, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            cache.set(key, value)
+        return value
+
+    def text_embedding(self, text: str, compute: Callable[[], Any]):
+        if not self.enabled:
+            return compute()
+        return self._get_or_compute(self.text_embeddings, normalize_text(text), compute)
+
+    def image_embedding(self, image_hash: str, compute: Callable[[], Any]):
+        if not self.enabled:
+            return compute()
+        return self._get_or_compute(self.image_embeddings, image_hash, compute)
+
+    def search_results(self, key: tuple, compute: Callable[[], Any]):
+        if not self.enabled:
+            return compute()
+        return list(self._get_or_compute(self.results, (self.generation,) + key, compute))
+
+    async def _call(self, fn, *args):
+        # Redis round trips go to the I/O pool; local lookups are cheap enough to run inline
+        if self._redis is not None:
+            return await run_io(fn, *args)
+        return fn(*args)
+
+    async def _get_or_compute_async(self, cache, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await self._call(cache.get, key, _MISSING)
+        if value is _MISSING:
+            value = await compute()
+            await self._call(cache.set, key, value)
+        return value
+
+    async def text_embedding_async(self, text: str, compute: Callable[[], Awaitable[Any]]):
+        """text_embedding with an async ``compute``; the other *_async methods mirror theirs too."""
+        if not self.enabled:
+            return await compute()
+        return await self._get_or_compute_async(self.text_embeddings, normalize_text(text), compute)
+
+    async def image_embedding_async(self, image_hash: str, compute: Callable[[], Awaitable[Any]]):
+        if not self.enabled:
+            return await compute()
+        return await self._get_or_compute_async(self.image_embeddings, image_hash, compute)
+
+    async def search_results_async(self, key: tuple, compute: Callable[[], Awaitable[Any]]):
+        if not self.enabled:
+            return await compute()
+        generation = await self._call(lambda: self.generation)
+        return list(await self._get_or_compute_async(self.results, (generation,) + key, compute))
+
+    async def bump_generation_async(self):
+        await self._call(self.bump_generation)
+
+    def get(self, cache: str, key: Hashable) -> Any:
+        """
+        Look up ``key`` in "text_embeddings", "image_embeddings" or "results"; None on a miss.
+
+        For bulk callers that compute their misses together; result keys must
+        start with the ``generation`` read before computing.
+        """
+        if not self.enabled:
+            return None
+        value = getattr(self, cache).get(key, _MISSING)
+        return None if value is _MISSING else value
+
+    def set(self, cache: str, key: Hashable, value: Any):
+        if self.enabled:
+            getattr(self, cache).set(key, value)
+
+    def clear(self):
+        for cache in (self.text_embeddings, self.image_embeddings, self.results):
+            cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": "redis" if self._redis is not None else "local",
+            "generation": self.generation,
+            "text_embeddings": self.text_embeddings.stats(),
+            "image_embeddings": self.image_embeddings.stats(),
+            "results": self.results.stats(),
+        }
+
+
+def create_search_cache() -> SearchCache:
+    """Build the caches selected by SEARCH_CACHE_BACKEND ("local" or "redis")."""
+    embedding_ttl = settings.EMBEDDING_CACHE_TTL or None
+    if settings.SEARCH_CACHE_BACKEND == "redis":
+        import redis
+        client = redis.Redis.from_url(settings.SEARCH_CACHE_REDIS_URL)
+        model = f"{settings.CLIP_MODEL_NAME}/{settings.CLIP_PRETRAINED or 'random'}"
+        return SearchCache(
+            RedisCache(None, f"search_cache:text:{model}", ttl=embedding_ttl, client=client),
+            RedisCache(None, f"search_cache:image:{model}", ttl=embedding_ttl, client=client),
+            RedisCache(None, "search_cache:results", ttl=settings.RESULT_CACHE_TTL, client=client),
+            redis_client=client,
+            enabled=settings.SEARCH_CACHE_ENABLED
+        )
+    if settings.SEARCH_CACHE_BACKEND != "local":
+        raise ValueError(f"unknown SEARCH_CACHE_BACKEND {settings.SEARCH_CACHE_BACKEND!r}, expected 'local' or 'redis'")
+    return SearchCache(
+        TTLCache(maxsize=settings.TEXT_EMBEDDING_CACHE_SIZE, ttl=embedding_ttl),
+        TTLCache(maxsize=settings.IMAGE_EMBEDDING_CACHE_SIZE, ttl=embedding_ttl),
+        TTLCache(maxsize=settings.RESULT_CACHE_SIZE, ttl=settings.RESULT_CACHE_TTL),
+        enabled=settings.SEARCH_CACHE_ENABLED
+    )
+
+
+# Built on first use so the Redis client is only created when needed
+search_cache = Lazy(create_search_cache, name="search_cache")
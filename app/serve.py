@@ -0,0 +1,176 @@
+"""
+Pre-fork server: load CLIP once and fork uvicorn workers that share its weights.
+
+``uvicorn --workers N`` starts every worker as a fresh interpreter, so each one
+imports torch and loads its own copy of the model. Memory, not CPU, then caps
+how many workers fit on a host. With SERVE_PRELOAD the parent imports the app
+and builds ``clip_embedder`` before forking: tensor storage is never written
+after loading, so its pages stay shared copy-on-write and a worker only adds
+its interpreter state, thread stacks and activations. ``gc.freeze()`` keeps the
+collector from writing to (and so copying) the objects created before the fork.
+
+The parent binds the socket, starts SERVE_WORKERS workers, restarts any that
+die (a restart forks from the loaded model, so it takes no model load) and
+passes SIGTERM/SIGINT on to them. It never runs a forward pass: a child can't
+use an OpenMP or ONNX Runtime thread pool started before the fork, so the
+``onnx`` inference mode, whose sessions start their pools on creation, loads
+per worker.
+
+    python -m app.serve --workers 4 --port 8000
+    python -m app.serve --workers 4 --no-preload   # every worker loads its own model
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import select
+import signal
+import sys
+import time
+
+import uvicorn
+
+from .config import settings
+
+# Named explicitly: run with -m this module is __main__, outside the "app" logger
+logger = logging.getLogger("app.serve")
+
+
+def preload():
+    """Import the app and load the model in this process, for workers forked from it to share."""
+    from .embedder import clip_embedder
+    from .main import app
+
+    clip_embedder.resolve()
+    return app
+
+
+async def _serve(server: uvicorn.Server, sockets, ready_fd: int):
+    task = asyncio.create_task(server.serve(sockets=sockets))
+    while not server.started and not task.done():
+        await asyncio.sleep(0.01)
+    if server.started:
+        os.write(ready_fd, b"\n")
+    await task
+
+
+def _run_worker(config: uvicorn.Config, sock, preloaded: bool, ready_fd: int):
+    """Body of a forked worker; never returns."""
+    status = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gc.enable()
+        if not preloaded:
+            preload()
+        config.setup_event_loop()
+        asyncio.run(_serve(uvicorn.Server(config), [sock], ready_fd))
+    except BaseException:
+        logger.exception("worker %d failed", os.getpid())
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+class PreforkServer:
+    """Bind once, then fork ``workers`` uvicorn servers on the shared socket and keep them running."""
+
+    def __init__(self, host: str, port: int, workers: int, preload_model: bool):
+        self.workers = workers
+        self.preload_model = preload_model
+        self.config = uvicorn.Config("app.main:app", host=host, port=port)
+        self.children = {}
+        self._stopping = False
+        self._ready_r, self._ready_w = os.pipe()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            os.close(self._ready_r)
+            _run_worker(self.config, self.sock, self.preload_model, self._ready_w)
+        self.children[pid] = time.monotonic()
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self, pid: int, status: int):
+        """Forget an exited worker and, unless shutting down, fork its replacement."""
+        spawned = self.children.pop(pid, None)
+        if spawned is None or self._stopping:
+            return
+        logger.warning("worker %d exited with code %d, restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - spawned < 1.0:
+            # Crashing on startup: don't fork in a tight loop
+            time.sleep(1.0)
+        self._spawn()
+
+    def _wait_ready(self, started: float):
+        """Block until ``workers`` workers have started serving."""
+        ready = 0
+        while ready < self.workers and not self._stopping:
+            readable, _, _ = select.select([self._ready_r], [], [], 0.5)
+            if readable:
+                ready += len(os.read(self._ready_r, self.workers - ready))
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self._reap(pid, status)
+        logger.info("%d workers ready in %.2fs", ready, time.monotonic() - started)
+
+    def run(self, started: float = None) -> int:
+        started = started or time.monotonic()
+        self.sock = self.config.bind_socket()
+        if self.preload_model:
+            if settings.CLIP_INFERENCE_MODE == "onnx":
+                logger.warning("ONNX Runtime sessions can't be forked, loading the model per worker")
+                self.preload_model = False
+            else:
+                preload()
+                logger.info("model loaded in the parent in %.2fs", time.monotonic() - started)
+                # Move everything allocated so far out of the collector's reach
+                gc.disable()
+                gc.freeze()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for _ in range(self.workers):
+            self._spawn()
+        self._wait_ready(started)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self._reap(pid, status)
+        self.sock.close()
+        return 0
+
+
+def main():
+    started = time.monotonic()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=settings.SERVE_PRELOAD,
+                        help="load the model in the parent and share it with the workers")
+    args = parser.parse_args()
+
+    # Workers split the cores between them (see torch_num_threads)
+    settings.SERVE_WORKERS = args.workers
+    from .log import configure_logging
+    configure_logging()
+    sys.exit(PreforkServer(args.host, args.port, args.workers, args.preload).run(started))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Two-stage search: a compact index picks candidates, exact cosine reranks them.
+
+With SEARCH_MODE=two_stage the vector store behind ``vector_db`` is wrapped in
+TwoStageStore. Each query is scored against a small in-memory representation
+of the collection (PCA-reduced float32 vectors or PCA sign bits) to fetch
+``limit * TWO_STAGE_CANDIDATES`` candidates, whose original embeddings are
+then fetched from the store and reranked exactly.
+
+The compact index is fitted from the existing collection and saved to
+TWO_STAGE_INDEX_PATH:
+
+    python -m app.two_stage --method pca --dim 128
+
+Workers load it at startup. Vectors inserted or deleted through a worker are
+applied to that worker's copy; refit after bulk ingestion so every worker sees them.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .vector_store import SearchFilters, SearchHit, VectorStore
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("pca", "binary")
+
+# +1/-1 for each bit of every byte value, in np.packbits order
+_BYTE_SIGNS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32) * 2 - 1
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+class CompactIndex:
+    """
+    First-stage representation of every vector in the collection.
+
+    - ``pca``: projection onto the top ``dim`` right singular vectors of the
+      (uncentered) sample, which best preserves inner products; scored by dot product
+    - ``binary``: signs of the mean-centered projection packed into bits
+      (``dim / 8`` bytes per vector); the query is not binarized but scored
+      against the bits through one 256-entry lookup table per byte, which
+      ranks far better than Hamming distance
+    """
+
+    def __init__(self, method: str, mean: np.ndarray, components: np.ndarray, ids: List[str], codes: np.ndarray):
+        if method not in METHODS:
+            raise ValueError(f"unknown two-stage method {method!r}, expected one of {METHODS}")
+        self.method = method
+        self.mean = mean
+        self.components = components
+        self.ids = list(ids)
+        self.codes = codes
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.row_of = {image_id: row for row, image_id in enumerate(self.ids)}
+        self._columns = None   # binary codes byte-major, rebuilt after add()
+        # add() and remove() may run while other threads search; searches read
+        # codes, alive and ids as one consistent snapshot taken under it
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fit(
+        cls,
+        batches: Iterable[Tuple[List[str], np.ndarray]],
+        method: str = "pca",
+        dim: int = 128,
+        sample_size: int = 50_000
+    ) -> "CompactIndex":
+        """Fit the projection on the first ``sample_size`` vectors, then encode all of them."""
+        index = None
+        all_ids, codes = [], []
+        pending_ids, pending = [], []
+        for ids, vectors in batches:
+            if index is None:
+                pending_ids.extend(ids)
+                pending.append(_normalize(vectors))
+                if len(pending_ids) < sample_size:
+                    continue
+                index = cls._from_sample(method, dim, np.concatenate(pending)[:sample_size])
+                ids, vectors = pending_ids, np.concatenate(pending)
+            all_ids.extend(ids)
+            codes.append(index.encode(vectors))
+        if index is None:
+            if not pending_ids:
+                raise ValueError("can't fit a two-stage index on an empty collection")
+            vectors = np.concatenate(pending)
+            index = cls._from_sample(method, dim, vectors)
+            all_ids, codes = pending_ids, [index.encode(vectors)]
+        # Encode chunk by chunk but concatenate once; ids are unique in the store
+        return cls(index.method, index.mean, index.components, all_ids, np.concatenate(codes))
+
+    @classmethod
+    def _from_sample(cls, method: str, dim: int, sample: np.ndarray) -> "CompactIndex":
+        if method == "binary":
+            mean = sample.mean(axis=0)
+            sample = sample - mean
+        else:
+            mean = np.zeros(sample.shape[1], dtype=np.float32)
+        dim = min(dim, sample.shape[1])
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        components = vt[:dim].T
+        if method == "binary":
+            # PCA piles the variance into the first bits; a random rotation
+            # spreads it evenly so every bit carries information
+            rotation, _ = np.linalg.qr(np.random.default_rng(0).standard_normal((dim, dim)))
+            components = components @ rotation
+        components = np.ascontiguousarray(components, dtype=np.float32)
+        width = dim if method == "pca" else (dim + 7) // 8
+        dtype = np.float32 if method == "pca" else np.uint8
+        return cls(method, mean.astype(np.float32), components, [], np.zeros((0, width), dtype=dtype))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        projected = (_normalize(vectors) - self.mean) @ self.components
+        if self.method == "pca":
+            return projected
+        return np.packbits(projected > 0, axis=-1)
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Encode and append vectors; an id that is already indexed is replaced."""
+        codes = self.encode(np.atleast_2d(vectors))
+        with self._lock:
+            self._remove(ids)
+            start = len(self.ids)
+            alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            self.codes, self.alive, self._columns = np.concatenate([self.codes, codes]), alive, None
+            # Only appended to: a snapshot's rows stay valid
+            self.ids.extend(str(i) for i in ids)
+            for offset, image_id in enumerate(ids):
+                self.row_of[str(image_id)] = start + offset
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            self._remove(ids)
+
+    def _remove(self, ids: List[str]):
+        for image_id in ids:
+            row = self.row_of.pop(str(image_id), None)
+            if row is not None:
+                self.alive[row] = False
+
+    def candidates(self, query: np.ndarray, k: int) -> List[str]:
+        """Ids of the ``k`` best first-stage matches, best first."""
+        with self._lock:
+            codes, alive, ids, columns = self.codes, self.alive, self.ids, self._columns
+            k = min(k, len(self.row_of))
+        if k <= 0:
+            return []
+        if self.method == "pca":
+            scores = codes @ self.encode(query[None])[0]
+        else:
+            projected = (_normalize(query) - self.mean) @ self.components
+            width = codes.shape[1]
+            projected = np.pad(projected, (0, width * 8 - len(projected))).reshape(width, 8)
+            table = projected @ _BYTE_SIGNS.T
+            if columns is None:
+                columns = np.ascontiguousarray(codes.T)
+                with self._lock:
+                    if self.codes is codes:
+                        self._columns = columns
+            scores = np.zeros(len(codes), dtype=np.float32)
+            for byte, column in enumerate(columns):
+                scores += table[byte].take(column)
+        scores = np.where(alive, scores, -np.inf)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [ids[row] for row in top]
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def save(self, path: str):
+        with self._lock:
+            live = np.flatnonzero(self.alive)
+            ids = np.array([self.ids[row] for row in live], dtype=str)
+            codes = self.codes[live]
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            method=np.array(self.method),
+            mean=self.mean,
+            components=self.components,
+            ids=ids,
+            codes=codes
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactIndex":
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["mean"], data["components"], data["ids"].tolist(), data["codes"])
+
+
+def fit_index(store: VectorStore, method: str = None, dim: int = None, sample_size: int = None) -> CompactIndex:
+    """Fit a CompactIndex over every vector in ``store`` (defaults from settings)."""
+    return CompactIndex.fit(
+        store.iter_vectors(),
+        method=method or settings.TWO_STAGE_METHOD,
+        dim=dim or settings.TWO_STAGE_DIM,
+        sample_size=sample_size or settings.TWO_STAGE_FIT_SAMPLE
+    )
+
+
+def rerank(
+    query: np.ndarray,
+    hits: List[SearchHit],
+    limit: int,
+    with_payload: bool = True,
+    with_vectors: bool = False,
+    score_threshold: Optional[float] = None
+) -> List[SearchHit]:
+    """Exact cosine scores for ``hits`` (which carry their vectors), best ``limit`` first."""
+    if not hits:
+        return []
+    scores = _normalize(np.array([hit.vector for hit in hits])) @ _normalize(query)
+    order = np.argsort(-scores)[:limit]
+    if score_threshold is not None:
+        order = order[scores[order] >= score_threshold]
+    return [
+        SearchHit(
+            id=hits[i].id,
+            score=float(scores[i]),
+            payload=hits[i].payload if with_payload else {},
+            vector=list(hits[i].vector) if with_vectors else None
+        )
+        for i in order
+    ]
+
+
+class TwoStageStore(VectorStore):
+    """
+    VectorStore wrapper that searches via a CompactIndex and reranks exactly.
+
+    Writes go to the wrapped store and are mirrored into the compact index.
+    Without a fitted index file, searches fall through to the wrapped store.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        index: CompactIndex = None,
+        index_path: str = None,
+        candidates: int = None
+    ):
+        self.store = store
+        self.index_path = index_path or settings.TWO_STAGE_INDEX_PATH
+        self.candidates = candidates or settings.TWO_STAGE_CANDIDATES
+        self.index = index
+        if index is None:
+            if os.path.exists(self.index_path):
+                self.index = CompactIndex.load(self.index_path)
+            else:
+                logger.warning("no two-stage index at %s, using exact search (run `python -m app.two_stage`)",
+                               self.index_path)
+
+    def fit(self, method: str = None, dim: int = None, sample_size: int = None, save: bool = True) -> CompactIndex:
+        """Fit a compact index from the wrapped store's vectors and start using it."""
+        index = fit_index(self.store, method=method, dim=dim, sample_size=sample_size)
+        if save:
+            index.save(self.index_path)
+        self.index = index
+        return index
+
+    def ensure_collection(self):
+        self.store.ensure_collection()
+
+    def insert_vector(self, image_id: str, vector: np.ndarray, metadata: dict = None):
+        self.store.insert_vector(image_id, vector, metadata)
+        if self.index is not None:
+            self.index.add([image_id], vector)
+
+    def insert_vectors(
+        self,
+        image_ids: List[str],
+        vectors: np.ndarray,
+        metadata_list: List[dict] = None,
+        batch_size: int = 256
+    ):
+        self.store.insert_vectors(image_ids, vectors, metadata_list, batch_size=batch_size)
+        if self.index is not None:
+            self.index.add(image_ids, vectors)
+
+    def delete_vector(self, image_id: str):
+        self.store.delete_vector(image_id)
+        if self.index is not None:
+            self.index.remove([image_id])
+
+    def search_similar(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        # The compact index knows nothing about payloads, and a selective filter would
+        # discard most of its candidates; the wrapped store filters while it searches
+        if self.index is None or filters:
+            return self.store.search_similar(
+                query_vector, limit=limit, with_payload=with_payload, with_vectors=with_vectors,
+                score_threshold=score_threshold, hnsw_ef=hnsw_ef, filters=filters, offset=offset
+            )
+        ids = self.index.candidates(np.asarray(query_vector, dtype=np.float32), (offset + limit) * self.candidates)
+        return rerank(
+            query_vector, self.store.retrieve(ids, with_vectors=True), offset + limit,
+            with_payload=with_payload, with_vectors=with_vectors, score_threshold=score_threshold
+        )[offset:]
+
+    def search_similar_by_id(self, image_id: str, limit: int = 10, **search_options):
+        if self.index is None or search_options.get("filters"):
+            return self.store.search_similar_by_id(image_id, limit=limit, **search_options)
+        points = self.store.retrieve([image_id], with_vectors=True)
+        if not points:
+            raise ValueError(f"can't find id={image_id} vectors, please check the vector store!")
+        return self.search_similar(np.asarray(points[0].vector, dtype=np.float32), limit=limit, **search_options)
+
+    def recommend(
+        self,
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        **search_options
+    ):
+        if self.index is None or search_options.get("filters"):
+            return self.store.recommend(positive_ids, negative_ids, limit=limit, **search_options)
+        return super().recommend(positive_ids, negative_ids, limit=limit, **search_options)
+
+    def count(self) -> int:
+        return self.store.count()
+
+    def retrieve(self, image_ids: List[str], with_vectors: bool = True) -> List[SearchHit]:
+        return self.store.retrieve(image_ids, with_vectors=with_vectors)
+
+    def iter_vectors(self, batch_size: int = 1024) -> Iterator[Tuple[List[str], np.ndarray]]:
+        return self.store.iter_vectors(batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the two-stage search index from the vector store.")
+    parser.add_argument("--method", choices=METHODS, default=settings.TWO_STAGE_METHOD)
+    parser.add_argument("--dim", type=int, default=settings.TWO_STAGE_DIM)
+    parser.add_argument("--sample", type=int, default=settings.TWO_STAGE_FIT_SAMPLE)
+    parser.add_argument("--output", default=settings.TWO_STAGE_INDEX_PATH)
+    args = parser.parse_args()
+
+    from .vector_store import create_backend
+    start = time.perf_counter()
+    index = fit_index(create_backend(), method=args.method, dim=args.dim, sample_size=args.sample)
+    index.save(args.output)
+    print(f"fitted {args.method} index over {len(index)} vectors in "
+          f"{time.perf_counter() - start:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
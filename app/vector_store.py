@@ -0,0 +1,221 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .config import settings
+from .executors import AsyncAdapter
+from .lazy import Lazy
+
+
+@dataclass
+class SearchHit:
+    """A search result; same ``id`` / ``score`` / ``payload`` shape as Qdrant's ScoredPoint."""
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+    vector: Optional[List[float]] = None
+
+
+# Normalized search filters: ((field, (value, ...)), ...), sorted by field
+SearchFilters = Tuple[Tuple[str, Tuple], ...]
+
+
+def filter_fields() -> List[str]:
+    """Payload fields searches can filter on (SEARCH_FILTER_FIELDS)."""
+    return [name.strip() for name in settings.SEARCH_FILTER_FIELDS.split(",") if name.strip()]
+
+
+def normalize_filters(filters: Optional[Union[Dict[str, Any], SearchFilters]]) -> Optional[SearchFilters]:
+    """
+    Validate ``{"field": value or [values]}`` filters into hashable SearchFilters.
+
+    A point matches when, for every field, its payload value (or any element
+    of it, for list fields such as tags) equals one of the given values.
+    Fields must be in SEARCH_FILTER_FIELDS, values strings, ints or bools.
+    Empty filters give None. Already normalized filters are returned as they are.
+    """
+    if not filters:
+        return None
+    items = filters.items() if isinstance(filters, dict) else filters
+    allowed = filter_fields()
+    normalized = []
+    for name, values in items:
+        if name not in allowed:
+            raise ValueError(f"can't filter on {name!r}, filterable fields are {allowed}")
+        values = tuple(values) if isinstance(values, (list, tuple)) else (values,)
+        if not values or not all(isinstance(v, (str, int, bool)) for v in values):
+            raise ValueError(f"filter {name!r} needs a string, integer or boolean value, or a list of them")
+        normalized.append((name, values))
+    return tuple(sorted(normalized))
+
+
+def payload_matches(payload: Optional[dict], filters: Optional[SearchFilters]) -> bool:
+    """Whether ``payload`` passes ``filters``, for backends that filter in process."""
+    payload = payload or {}
+    for name, values in filters or ():
+        value = payload.get(name)
+        candidates = value if isinstance(value, list) else [value]
+        if not any(candidate in values for candidate in candidates if candidate is not None):
+            return False
+    return True
+
+
+class VectorStore(ABC):
+    """
+    Storage and cosine top-k search over image embeddings.
+
+    Implemented by QdrantDB (app/db_qdrant.py) and LocalVectorDB (app/db_local.py);
+    VECTOR_BACKEND picks the one behind ``vector_db``. Search methods return
+    objects with ``id``, ``score`` and ``payload`` attributes, best match first.
+    """
+
+    def ensure_collection(self):
+        """Create whatever storage the backend needs (run by app.migrate)."""
+
+    @abstractmethod
+    def insert_vector(self, image_id: str, vector: np.ndarray, metadata: dict = None):
+        """Insert or replace one vector and its payload."""
+
+    def insert_vectors(
+        self,
+        image_ids: List[str],
+        vectors: np.ndarray,
+        metadata_list: List[dict] = None,
+        batch_size: int = 256
+    ):
+        """Insert or replace many vectors."""
+        if metadata_list is None:
+            metadata_list = [None] * len(image_ids)
+        for image_id, vector, metadata in zip(image_ids, vectors, metadata_list):
+            self.insert_vector(image_id, vector, metadata)
+
+    @abstractmethod
+    def search_similar(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        score_threshold: Optional[float] = None,
+        hnsw_ef: Optional[int] = None,
+        filters: Optional[SearchFilters] = None,
+        offset: int = 0
+    ):
+        """
+        Return the ``limit`` most similar vectors after the first ``offset``.
+
+        Skip payloads the caller does not read, drop hits scoring below
+        ``score_threshold``, only consider points matching ``filters`` (see
+        normalize_filters); ``hnsw_ef`` only applies to Qdrant.
+        """
+
+    def search_batch(self, query_vectors: np.ndarray, limit: int = 10, **search_options):
+        """search_similar for each query, one result list per query in order."""
+        return [self.search_similar(query, limit=limit, **search_options) for query in query_vectors]
+
+    @abstractmethod
+    def search_similar_by_id(self, image_id: str, limit: int = 10, **search_options):
+        """Search with the stored vector of ``image_id``; options as for search_similar."""
+
+    def recommend(
+        self,
+        positive_ids: List[str],
+        negative_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        **search_options
+    ):
+        """
+        "More like these": search near the positive ids and away from the negative ones.
+
+        Uses Qdrant's average_vector strategy, ``avg(pos) + (avg(pos) - avg(neg))``;
+        the input ids are never returned. Backends with a native recommend do it
+        in one call; this default retrieves the vectors and searches.
+        """
+        negative_ids = list(negative_ids or [])
+        input_ids = {str(i) for i in list(positive_ids) + negative_ids}
+        points = {str(p.id): p for p in self.retrieve(list(input_ids), with_vectors=True)}
+        missing = [str(i) for i in positive_ids if str(i) not in points]
+        if not positive_ids or missing:
+            raise ValueError(f"can't find ids={missing or list(positive_ids)} in the vector store")
+
+        def average(ids):
+            vectors = np.array([points[str(i)].vector for i in ids if str(i) in points], dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            return vectors.mean(axis=0)
+
+        query = average(positive_ids)
+        if any(str(i) in points for i in negative_ids):
+            query = query + (query - average(negative_ids))
+        offset = search_options.pop("offset", 0)
+        hits = self.search_similar(query, limit=offset + limit + len(input_ids), **search_options)
+        return [hit for hit in hits if str(hit.id) not in input_ids][offset:offset + limit]
+
+    @abstractmethod
+    def delete_vector(self, image_id: str):
+        """Delete a vector by ID."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored vectors."""
+
+    def retrieve(self, image_ids: List[str], with_vectors: bool = True) -> List[SearchHit]:
+        """Stored points for ``image_ids`` (score 0, missing ids skipped)."""
+        raise NotImplementedError(f"{type(self).__name__} does not support retrieve")
+
+    def iter_vectors(self, batch_size: int = 1024) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Yield ``(ids, vectors)`` batches covering every stored vector."""
+        raise NotImplementedError(f"{type(self).__name__} does not support iter_vectors")
+
+
+def create_backend() -> VectorStore:
+    """Build the backend selected by settings.VECTOR_BACKEND."""
+    if settings.VECTOR_BACKEND == "qdrant":
+        from .db_qdrant import QdrantDB
+        return QdrantDB()
+    if settings.VECTOR_BACKEND == "local":
+        from .db_local import LocalVectorDB
+        read_only = settings.LOCAL_INDEX_READ_ONLY
+        if read_only is None:
+            # Forked API workers only search; a separate process (e.g. app.ingest) writes
+            read_only = settings.SERVE_WORKERS > 1
+        return LocalVectorDB(
+            settings.LOCAL_INDEX_PATH,
+            dim=settings.VECTOR_SIZE,
+            dtype=settings.LOCAL_INDEX_DTYPE,
+            read_only=read_only
+        )
+    raise ValueError(f"unknown VECTOR_BACKEND {settings.VECTOR_BACKEND!r}, expected 'qdrant' or 'local'")
+
+
+def create_vector_store() -> VectorStore:
+    """The configured backend, wrapped for two-stage search if SEARCH_MODE says so."""
+    store = create_backend()
+    if settings.SEARCH_MODE == "two_stage":
+        from .two_stage import TwoStageStore
+        return TwoStageStore(store)
+    if settings.SEARCH_MODE != "exact":
+        raise ValueError(f"unknown SEARCH_MODE {settings.SEARCH_MODE!r}, expected 'exact' or 'two_stage'")
+    return store
+
+
+# The store the app searches; built on first use
+vector_db = Lazy(create_vector_store, name="vector_db")
+
+
+def create_async_vector_store():
+    """
+    Async access to the store behind ``vector_db``.
+
+    AsyncQdrantDB with ASYNC_IO_ENABLED and plain Qdrant search; otherwise (the
+    local backend, two-stage search, or async off) the blocking store's calls
+    run on the I/O pool.
+    """
+    if settings.ASYNC_IO_ENABLED and settings.VECTOR_BACKEND == "qdrant" and settings.SEARCH_MODE == "exact":
+        from .db_qdrant_async import AsyncQdrantDB
+        return AsyncQdrantDB()
+    return AsyncAdapter(vector_db)
+
+
+async_vector_db = Lazy(create_async_vector_store, name="async_vector_db")
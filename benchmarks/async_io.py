@@ -0,0 +1,103 @@
+"""
+Hundreds of I/O-bound requests in flight on one worker: blocking clients on
+the I/O pool vs native async clients.
+
+Fires ``--concurrency`` requests at once, alternating /api/images/{id} (one
+Postgres query) and /api/images/{id}/similar (a vector store recommend plus a
+Postgres query), through the app over an in-process ASGI transport. Every
+Postgres and vector store call costs ``--rtt-ms``:
+
+- threaded: the stand-ins sleep in the calling thread, so calls queue for the
+  IO_WORKERS threads, as psycopg2 / QdrantClient do
+- async: the stand-ins await the round trip on the event loop, as asyncpg /
+  AsyncQdrantClient do
+
+Vectors live in the local store (fast in-process search, so the simulated
+round trips dominate); search caches are off, so every request does its
+round trips.
+
+    python -m benchmarks.async_io --concurrency 500 --rtt-ms 20
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.standins import AsyncStandIn, install_app_standins, seed
+
+
+class _Blocking:
+    """Forward to ``target``, sleeping ``rtt`` in the calling thread first."""
+
+    def __init__(self, target, rtt: float):
+        self._target = target
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            time.sleep(self._rtt)
+            return getattr(self._target, name)(*args, **kwargs)
+        return call
+
+
+async def _round(client, ids, concurrency: int):
+    async def one(i):
+        image_id = ids[i % len(ids)]
+        path = f"/api/images/{image_id}" if i % 2 == 0 else f"/api/images/{image_id}/similar"
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    samples = sorted(await asyncio.gather(*(one(i) for i in range(concurrency))))
+    return time.perf_counter() - start, samples
+
+
+async def _run(args):
+    standins = install_app_standins()
+    import app.processor as processor
+    from app.config import settings
+    from app.db_local import LocalVectorDB
+    from app.executors import AsyncAdapter
+    from app.main import app
+    from app.search_cache import create_search_cache, search_cache
+
+    settings.SEARCH_CACHE_ENABLED = False
+    search_cache.override(create_search_cache())
+    tmp = tempfile.TemporaryDirectory()
+    postgres, vectors = standins["postgres_db"], LocalVectorDB(tmp.name, dim=settings.VECTOR_SIZE)
+    ids = seed(postgres, vectors, args.images)
+    rtt = args.rtt_ms / 1000
+    modes = {
+        "threaded": (AsyncAdapter(_Blocking(postgres, rtt)), AsyncAdapter(_Blocking(vectors, rtt))),
+        "async": (AsyncStandIn(postgres, rtt), AsyncStandIn(vectors, rtt)),
+    }
+
+    print(f"{args.concurrency} concurrent requests, {args.rtt_ms} ms per database call, "
+          f"IO_WORKERS={settings.IO_WORKERS}")
+    print(f"{'mode':>9} {'wall s':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for name, (async_postgres, async_vectors) in modes.items():
+            processor.async_postgres_db.override(async_postgres)
+            processor.async_vector_db.override(async_vectors)
+            await _round(client, ids, min(args.concurrency, 20))  # warm up
+            wall, samples = await _round(client, ids, args.concurrency)
+            print(f"{name:>9} {wall:>7.2f} {args.concurrency / wall:>8.0f} "
+                  f"{statistics.median(samples):>8.1f} {samples[int(0.99 * (len(samples) - 1))]:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--images", type=int, default=1000)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
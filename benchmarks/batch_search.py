@@ -0,0 +1,105 @@
+"""
+N single search requests vs one /api/search/batch request.
+
+Sends ``--texts`` text queries and ``--images`` image queries through the app
+over an in-process ASGI transport three ways: one request at a time,
+all single requests at once (the embedding batcher may coalesce them), and a
+single batch request. The stub embedder takes ``--embed-ms`` per forward pass,
+the stand-in Postgres ``--rtt-ms`` per query and the vector store (Qdrant
+in-memory) ``--vector-rtt-ms`` per call. Search caches are off so every round
+does the full work.
+
+    python -m benchmarks.batch_search --texts 16 --images 4
+"""
+import argparse
+import asyncio
+import functools
+import io
+import statistics
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.standins import install_app_standins, seed
+
+
+def _with_rtt(method, rtt: float):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        time.sleep(rtt)
+        return method(*args, **kwargs)
+    return call
+
+
+async def _run(args):
+    standins = install_app_standins(embed_delay=args.embed_ms / 1000)
+    standins["postgres_db"].rtt = args.rtt_ms / 1000
+    from app.config import settings
+    from app.main import app
+    from app.search_cache import create_search_cache, search_cache
+
+    settings.SEARCH_CACHE_ENABLED = False
+    search_cache.override(create_search_cache())
+    vector_db = standins["vector_db"]
+    seed(standins["postgres_db"], vector_db, args.seed)
+    for name in ("search_similar", "search_batch"):
+        setattr(vector_db, name, _with_rtt(getattr(vector_db, name), args.vector_rtt_ms / 1000))
+
+    texts = [f"red french tips {i}" for i in range(args.texts)]
+    images = []
+    for i in range(args.images):
+        buf = io.BytesIO()
+        Image.new("RGB", (224, 224), color=(i * 40 % 256, 80, 160)).save(buf, format="JPEG")
+        images.append(buf.getvalue())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        def singles():
+            return (
+                [client.post("/api/search/text", data={"text": t}) for t in texts]
+                + [client.post("/api/search/image", files={"file": (f"q{i}.jpg", data, "image/jpeg")})
+                   for i, data in enumerate(images)]
+            )
+
+        async def sequential():
+            return [await request for request in singles()]
+
+        async def concurrent():
+            return await asyncio.gather(*singles())
+
+        async def batch():
+            return [await client.post(
+                "/api/search/batch",
+                data={"texts": texts},
+                files=[("files", (f"q{i}.jpg", data, "image/jpeg")) for i, data in enumerate(images)]
+            )]
+
+        print(f"{len(texts)} texts + {len(images)} images, embed {args.embed_ms} ms, "
+              f"postgres {args.rtt_ms} ms, vector store {args.vector_rtt_ms} ms")
+        print(f"{'mode':>11} {'requests':>8} {'p50 ms':>8} {'min ms':>8}")
+        for name, run in (("sequential", sequential), ("concurrent", concurrent), ("batch", batch)):
+            samples = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                responses = await run()
+                samples.append((time.perf_counter() - start) * 1000)
+                for response in responses:
+                    response.raise_for_status()
+            print(f"{name:>11} {len(responses):>8} {statistics.median(samples):>8.1f} {min(samples):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=16)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--embed-ms", type=float, default=10.0)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--vector-rtt-ms", type=float, default=1.0)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cold-start breakdown: import time of app.main and first-request latency.
+
+1. ``python -X importtime -c "import app.main"`` in a fresh interpreter,
+   self time summed per top-level package (torch / qdrant_client / boto3 only show
+   up here if something imports them eagerly)
+2. time to the first /api/images/{image_id} response in a fresh interpreter,
+   with Postgres replaced by the in-memory stand-in
+3. with ``--warmup``: ImageProcessor.warmup() against the configured services,
+   which splits model load, first forward passes and database connects
+
+    python -m benchmarks.cold_start [--warmup]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+FIRST_REQUEST = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+import httpx
+from app.db_postgres import postgres_db
+from benchmarks.standins import FakePostgresDB
+fake = FakePostgresDB()
+fake.insert_image_metadata("00000000-0000-0000-0000-000000000001", "a.jpg", {})
+postgres_db.override(fake)
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t = time.perf_counter()
+        response = await client.get("/api/images/00000000-0000-0000-0000-000000000001")
+        response.raise_for_status()
+        return time.perf_counter() - t
+
+first_request_s = asyncio.run(first_request())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": first_request_s * 1000,
+    "heavy_modules_loaded": sorted(m for m in ("torch", "open_clip", "boto3", "qdrant_client") if m in sys.modules),
+}))
+"""
+
+WARMUP = """
+import json
+from app.processor import image_processor
+print(json.dumps(image_processor.warmup()))
+"""
+
+
+def _import_times(top: int):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True
+    ).stderr
+    per_package = defaultdict(int)
+    total_us = 0
+    for line in stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        # Self times summed per top-level package never double count nested imports
+        per_package[name.strip().split(".")[0]] += int(self_us)
+        total_us += int(self_us)
+    print(f"import app.main: {total_us / 1000:.0f} ms total, top packages:")
+    for name, us in sorted(per_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {name:<24} {us / 1000:>8.1f} ms")
+
+
+def _run_json(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--warmup", action="store_true", help="also time warmup against real services")
+    args = parser.parse_args()
+
+    _import_times(args.top)
+
+    r = _run_json(FIRST_REQUEST)
+    print(f"fresh process: import {r['import_ms']:.0f} ms, "
+          f"first /api/images/{{id}} {r['first_request_ms']:.1f} ms, "
+          f"heavy modules loaded: {', '.join(r['heavy_modules_loaded']) or 'none'}")
+
+    if args.warmup:
+        timings = _run_json(WARMUP)
+        print("warmup breakdown:")
+        for step, ms in timings.items():
+            print(f"  {step:<18} {ms:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
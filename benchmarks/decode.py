@@ -0,0 +1,128 @@
+"""
+Decode + preprocess cost for small vs 12 MP uploads, old path vs decode_image.
+
+- ``full``: Image.open on the raw bytes, then open_clip's preprocess (the old path)
+- ``fast``: app.image_io.decode_image (draft decode + early downscale), then preprocess
+
+Per-image time is the median over ``--repeats``; peak RSS is measured in a
+fresh subprocess per (size, mode) so the numbers do not contaminate each other.
+With ``--check-embeddings`` both paths are embedded with ViT-B-32 and their
+cosine similarity is compared against ``--tolerance`` (random weights unless
+``--pretrained`` names an open_clip checkpoint).
+
+    python -m benchmarks.decode --check-embeddings
+"""
+import argparse
+import io
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+SIZES = {"small": (640, 480), "12mp": (4000, 3000)}
+
+
+def _make_jpeg(size) -> bytes:
+    # Smooth gradients + noise: compresses like a photo rather than pure noise
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    pixels = np.stack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        (x + y) / 2 % 255,
+    ], axis=-1) + rng.normal(0, 8, (height, width, 3))
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _preprocess():
+    import open_clip
+    return open_clip.image_transform(224, is_train=False)
+
+
+def _paths(preprocess):
+    from app.image_io import decode_image
+    return {
+        "full": lambda data: preprocess(Image.open(io.BytesIO(data))),
+        "fast": lambda data: preprocess(decode_image(data)),
+    }
+
+
+def _measure(size_name, mode, repeats):
+    """Runs in a subprocess: time one path and report peak RSS."""
+    import resource
+    data = _make_jpeg(SIZES[size_name])
+    fn = _paths(_preprocess())[mode]
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - start) * 1000)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "ms": statistics.median(samples),
+        "peak_rss_mb": peak_kb / 1024,
+        "delta_rss_mb": (peak_kb - baseline_kb) / 1024,
+    }))
+
+
+def _check_embeddings(pretrained, tolerance):
+    import open_clip
+    import torch
+    model, _, preprocess = open_clip.create_model_and_transforms("ViT-B-32", pretrained=pretrained)
+    model.eval()
+    paths = _paths(preprocess)
+    ok = True
+    for size_name, size in SIZES.items():
+        data = _make_jpeg(size)
+        with torch.no_grad():
+            emb = {
+                mode: model.encode_image(fn(data).unsqueeze(0))[0].numpy()
+                for mode, fn in paths.items()
+            }
+        cos = float(np.dot(emb["full"], emb["fast"])
+                    / (np.linalg.norm(emb["full"]) * np.linalg.norm(emb["fast"])))
+        status = "ok" if cos >= 1 - tolerance else "FAIL"
+        ok &= status == "ok"
+        print(f"{size_name:>6}: cosine(full, fast) = {cos:.5f}  [{status}]")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--check-embeddings", action="store_true")
+    parser.add_argument("--pretrained", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed 1 - cosine")
+    parser.add_argument("--_measure", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._measure:
+        _measure(*args._measure, args.repeats)
+        return
+
+    print(f"{'input':>6} {'mode':>5} {'ms/img':>8} {'peak RSS MB':>12} {'+RSS MB':>8}")
+    for size_name in SIZES:
+        for mode in ("full", "fast"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.decode", "--repeats", str(args.repeats),
+                 "--_measure", size_name, mode],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            print(f"{size_name:>6} {mode:>5} {r['ms']:>8.1f} {r['peak_rss_mb']:>12.1f} {r['delta_rss_mb']:>8.1f}")
+
+    if args.check_embeddings and not _check_embeddings(args.pretrained, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
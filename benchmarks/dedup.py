@@ -0,0 +1,164 @@
+"""
+Ingest deduplication: CLIP passes and index growth saved on duplicate-heavy data.
+
+Writes a dataset of ``--images`` synthetic JPEGs of which ``--duplicate-share``
+are copies of other images in the set: half byte-identical (content hash
+match), half re-encoded at a lower quality and resized (perceptual hash
+match, with ``--perceptual``). The dataset is ingested with IngestPipeline,
+then ingested again as a scraper re-submitting it would, with DEDUP_ENABLED
+off and on. For each pass it reports the images embedded, the forward passes
+and the points added.
+
+Finally ``--queries`` image searches with already-ingested images are run
+through ImageProcessor.search_similar (search cache off) to count the CLIP
+passes saved by reusing stored embeddings.
+
+The stub embedder gives unrelated vectors to re-encoded copies, so
+DEDUP_COSINE_THRESHOLD is not exercised here; with CLIP, copies that
+escape both hashes land above ~0.95 cosine.
+
+    python -m benchmarks.dedup --images 2000 --duplicate-share 0.3
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.ingest import IngestPipeline, iter_directory
+from benchmarks.standins import FakePostgresDB, StubEmbedder, in_memory_qdrant_db, install_app_standins
+
+
+class CountingEmbedder:
+    """Forward to ``embedder``, counting forward passes and images embedded."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.calls = 0
+        self.images = 0
+
+    def get_image_embedding(self, image):
+        self.calls += 1
+        self.images += 1
+        return self.embedder.get_image_embedding(image)
+
+    def get_batch_embeddings(self, images):
+        self.calls += 1
+        self.images += len(images)
+        return self.embedder.get_batch_embeddings(images)
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+
+def _unique_image(rng, size: int) -> Image.Image:
+    # Smooth random structure, so a resized or re-encoded copy keeps its perceptual hash
+    coarse = rng.integers(0, 255, (6, 6, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((size, size), Image.BICUBIC)
+    noise = rng.normal(0, 6, (size, size, 3))
+    return Image.fromarray(np.clip(np.asarray(image) + noise, 0, 255).astype(np.uint8))
+
+
+def _write_dataset(directory: str, count: int, duplicate_share: float, size: int) -> int:
+    """Write ``count`` images, ``duplicate_share`` of them copies; return the number of unique images."""
+    rng = np.random.default_rng(0)
+    unique = count - int(count * duplicate_share)
+    originals = []
+    for i in range(unique):
+        buf = io.BytesIO()
+        _unique_image(rng, size).save(buf, format="JPEG", quality=90)
+        originals.append(buf.getvalue())
+    files = list(originals)
+    for i in range(count - unique):
+        source = originals[int(rng.integers(unique))]
+        if i % 2 == 0:
+            files.append(source)   # byte-identical copy
+        else:
+            image = Image.open(io.BytesIO(source))
+            image = image.resize((size * 3 // 4, size * 3 // 4), Image.BILINEAR)
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=70)
+            files.append(buf.getvalue())
+    order = rng.permutation(len(files))
+    for n, index in enumerate(order):
+        with open(os.path.join(directory, f"img_{n:06d}.jpg"), "wb") as f:
+            f.write(files[index])
+    return unique
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--duplicate-share", type=float, default=0.3)
+    parser.add_argument("--size", type=int, default=320, help="edge length of the synthetic images")
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--embed-ms", type=float, default=20.0, help="extra delay per stub forward pass")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--perceptual", action=argparse.BooleanOptionalAction, default=True,
+                        help="DEDUP_PERCEPTUAL (off by default in the app)")
+    args = parser.parse_args()
+    settings.DEDUP_PERCEPTUAL = args.perceptual
+
+    with tempfile.TemporaryDirectory() as tmp:
+        unique = _write_dataset(tmp, args.images, args.duplicate_share, args.size)
+        print(f"{args.images} images, {unique} unique, {args.images - unique} copies "
+              f"(half byte-identical, half re-encoded + resized)")
+        print(f"{'dedup':>5} {'pass':>9} {'embedded':>9} {'fwd passes':>10} {'points +':>9} "
+              f"{'duplicates':>10} {'seconds':>8}")
+        for enabled in (False, True):
+            settings.DEDUP_ENABLED = enabled
+            postgres_db, vector_db = FakePostgresDB(), in_memory_qdrant_db()
+            embedder = CountingEmbedder(StubEmbedder(delay=args.embed_ms / 1000))
+            for attempt in ("first", "re-ingest"):
+                calls, images, points = embedder.calls, embedder.images, vector_db.count()
+                pipeline = IngestPipeline(
+                    embedder=embedder,
+                    postgres_db=postgres_db,
+                    vector_db=vector_db,
+                    upload=False,
+                    chunk_size=args.chunk_size
+                )
+                report = pipeline.run(iter_directory(tmp))
+                pipeline.close()
+                print(f"{'on' if enabled else 'off':>5} {attempt:>9} {embedder.images - images:>9} "
+                      f"{embedder.calls - calls:>10} {vector_db.count() - points:>9} "
+                      f"{report.duplicates:>10} {report.elapsed:>8.2f}")
+            if enabled and vector_db.count() < unique:
+                print(f"      {unique - vector_db.count()} distinct images merged by a perceptual hash collision")
+
+        # Image search with uploads that are already in the collection
+        standins = install_app_standins()
+        import app.processor as processor
+        from app.db_postgres import postgres_db as postgres_proxy
+        from app.processor import ImageProcessor
+        from app.search_cache import create_search_cache, search_cache
+
+        settings.SEARCH_CACHE_ENABLED = False
+        settings.EMBED_BATCHING_ENABLED = False
+        search_cache.override(create_search_cache())
+        processor.vector_db.override(vector_db)
+        postgres_proxy.override(postgres_db)
+        query_embedder = CountingEmbedder(standins["embedder"])
+        processor.clip_embedder.override(query_embedder)
+        paths = sorted(os.listdir(tmp))[:args.queries]
+        queries = []
+        for name in paths:
+            with open(os.path.join(tmp, name), "rb") as f:
+                queries.append(f.read())
+        for enabled in (False, True):
+            settings.DEDUP_ENABLED = enabled
+            calls = query_embedder.calls
+            start = time.perf_counter()
+            for data in queries:
+                ImageProcessor.search_similar(data, limit=18)
+            elapsed = time.perf_counter() - start
+            print(f"search with {len(queries)} ingested images, dedup {'on' if enabled else 'off':>3}: "
+                  f"{query_embedder.calls - calls} CLIP passes, {elapsed / len(queries) * 1000:.1f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Throughput / latency benchmark for the query embedding micro-batcher.
+
+Runs N concurrent client threads issuing single-image (or single-text) embedding
+requests, once calling the embedder directly and once through EmbeddingBatcher,
+and reports queries/second, p50 and p99 latency per concurrency level.
+
+    python -m benchmarks.embedding_batcher --backend stub
+    python -m benchmarks.embedding_batcher --backend clip --modality text
+
+The ``stub`` backend needs no model weights: it models a forward pass as a fixed
+per-call overhead plus a per-item matmul, which is the cost shape batching exploits.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.batcher import EmbeddingBatcher
+from benchmarks.standins import StubEmbedder
+
+
+def _load_embedder(backend: str):
+    if backend == "stub":
+        return StubEmbedder()
+    from app.embedder import clip_embedder
+    return clip_embedder
+
+
+def _run(call, concurrency: int, requests_per_client: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            call()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat_ms = np.array(latencies) * 1000
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["stub", "clip"], default="stub")
+    parser.add_argument("--modality", choices=["image", "text"], default="image")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    embedder = _load_embedder(args.backend)
+    batcher = EmbeddingBatcher(embedder, args.max_batch_size, args.max_wait_ms)
+    image = Image.new("RGB", (224, 224), color=(200, 120, 140))
+    text = "glossy pink french tip nails"
+
+    if args.modality == "image":
+        direct = lambda: embedder.get_image_embedding(image)
+        batched = lambda: batcher.embed_image(image)
+    else:
+        direct = lambda: embedder.get_text_embedding(text)
+        batched = lambda: batcher.embed_text(text)
+
+    print(f"backend={args.backend} modality={args.modality} "
+          f"max_batch_size={args.max_batch_size} max_wait_ms={args.max_wait_ms}")
+    print(f"{'conc':>5} {'mode':>8} {'qps':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        for mode, call in (("direct", direct), ("batched", batched)):
+            r = _run(call, concurrency, args.requests)
+            print(f"{concurrency:>5} {mode:>8} {r['qps']:>9.1f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+    print("batcher stats:", batcher.stats())
+    batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Check that a slow CLIP pass does not stall unrelated requests on the same worker.
+
+Starts a /api/search/image request whose embedding takes ``--embed-delay``
+seconds, then issues a /api/images/{image_id} lookup while it is in flight and
+reports how long the lookup took. With inference on the CPU pool and blocking
+I/O on the I/O pool the lookup should finish in milliseconds, not after the
+embedding.
+
+    python -m benchmarks.event_loop_blocking --embed-delay 2
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.standins import install_app_standins, seed
+
+
+async def _run(embed_delay: float) -> float:
+    standins = install_app_standins(embed_delay=embed_delay)
+    from app.main import app
+
+    image_id = seed(standins["postgres_db"], standins["vector_db"], 10)[0]
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color=(255, 0, 128)).save(buf, format="JPEG")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        search = asyncio.create_task(client.post(
+            "/api/search/image", files={"file": ("q.jpg", buf.getvalue(), "image/jpeg")}
+        ))
+        await asyncio.sleep(0.1)  # let the search reach the embedder
+        start = time.perf_counter()
+        response = await client.get(f"/api/images/{image_id}")
+        lookup_s = time.perf_counter() - start
+        response.raise_for_status()
+        search_response = await search
+        search_response.raise_for_status()
+    return lookup_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embed-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    lookup_s = asyncio.run(_run(args.embed_delay))
+    print(f"metadata lookup during a {args.embed_delay:.1f}s embedding: {lookup_s * 1000:.1f} ms")
+    if lookup_s >= args.embed_delay / 2:
+        print("FAIL: the lookup waited for the embedding")
+        sys.exit(1)
+    print("OK: the lookup was not blocked")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Filtered search pushed into the vector store vs over-fetch-and-filter.
+
+Clients used to narrow a search by metadata by asking for a large ``limit``
+and dropping non-matching results themselves. This compares that with
+``filters`` passed down to the store, at several selectivities (share of the
+collection matching the filter):
+
+- pushdown: ``search_similar(query, limit, filters=...)``
+- over-fetch xN: ``search_similar(query, limit * N, with_payload=True)`` and
+  keep the first ``limit`` hits whose payload matches
+
+Recall is against an exact filtered top-``limit``. Over-fetching has to
+transfer N times the hits with their payloads, and once the filter is more
+selective than 1/N it returns fewer than ``limit`` results (often none).
+
+Runs on LocalVectorDB (the filter is a cached row mask) and Qdrant's
+in-memory mode (which scans payloads without indexes; a Qdrant server answers
+selective filters from the keyword indexes QdrantDB creates).
+
+    python -m benchmarks.filtered_search --vectors 100000 --qdrant-vectors 20000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from app.db_local import LocalVectorDB
+from app.db_qdrant import QdrantDB
+from app.vector_store import normalize_filters, payload_matches
+
+SELECTIVITIES = [0.5, 0.1, 0.01, 0.001]
+
+
+def _dataset(count: int, dim: int):
+    """Unit vectors and payloads whose ``style`` matches each selectivity's value for that share of points."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    draws = rng.random(count)
+    payloads = []
+    for i, draw in enumerate(draws):
+        # Disjoint bands: [0, 0.001) -> p0.001, [0.001, 0.011) -> p0.01, ...
+        style, low = "other", 0.0
+        for share in sorted(SELECTIVITIES):
+            if low <= draw < low + share:
+                style = f"p{share:g}"
+                break
+            low += share
+        payloads.append({"style": style, "tags": [f"t{i % 5}"], "s3_url": f"https://bucket/images/{i}.jpg"})
+    return vectors, payloads
+
+
+def _measure(store, queries, limit, filters, expected, overfetch=None):
+    """(ms per query, mean recall, mean result count)."""
+    recalls, counts = [], []
+    start = time.perf_counter()
+    for query, truth in zip(queries, expected):
+        if overfetch is None:
+            hits = store.search_similar(query, limit=limit, with_payload=False, filters=filters)
+        else:
+            hits = store.search_similar(query, limit=limit * overfetch, with_payload=True)
+            hits = [hit for hit in hits if payload_matches(hit.payload, filters)][:limit]
+        ids = {str(hit.id) for hit in hits}
+        recalls.append(len(ids & truth) / len(truth) if truth else 1.0)
+        counts.append(len(hits))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(queries) * 1000, float(np.mean(recalls)), float(np.mean(counts))
+
+
+def _run(label, store, vectors, payloads, ids, args):
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1)[:, None]
+    print(f"\n{label}: {len(ids)} vectors, limit {args.limit}")
+    print(f"{'selectivity':>11} {'matching':>8} {'method':>14} {'ms/query':>9} {'recall':>7} {'results':>8}")
+    scores = queries @ vectors.T
+    for share in SELECTIVITIES:
+        filters = normalize_filters({"style": f"p{share:g}"})
+        matching = np.array([payload_matches(p, filters) for p in payloads])
+        expected = []
+        for row in scores:
+            masked = np.where(matching, row, -np.inf)
+            top = np.argsort(-masked)[:min(args.limit, int(matching.sum()))]
+            expected.append({ids[i] for i in top})
+        store.search_similar(queries[0], limit=args.limit, filters=filters)   # warm the filter mask
+        for method, overfetch in [("pushdown", None)] + [(f"over-fetch x{n}", n) for n in args.overfetch]:
+            ms, recall, count = _measure(store, queries, args.limit, filters, expected, overfetch)
+            print(f"{share:>11.1%} {int(matching.sum()):>8} {method:>14} {ms:>9.2f} {recall:>7.2f} {count:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000, help="LocalVectorDB collection size")
+    parser.add_argument("--qdrant-vectors", type=int, default=10000, help="in-memory Qdrant collection size")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--limit", type=int, default=18)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--overfetch", type=int, nargs="+", default=[10, 50])
+    args = parser.parse_args()
+
+    vectors, payloads = _dataset(args.vectors, args.dim)
+    ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(args.vectors)]
+    with tempfile.TemporaryDirectory() as tmp:
+        local = LocalVectorDB(tmp, dim=args.dim)
+        local.insert_vectors(ids, vectors, payloads)
+        _run("LocalVectorDB", local, vectors, payloads, ids, args)
+
+    n = args.qdrant_vectors
+    qdrant = QdrantDB(client=QdrantClient(":memory:"), collection="benchmark_filtered_search")
+    qdrant.ensure_collection(vector_size=args.dim)
+    qdrant.insert_vectors(ids[:n], vectors[:n], payloads[:n], batch_size=1024)
+    _run("Qdrant in-memory", qdrant, vectors[:n], payloads[:n], ids[:n], args)
+
+
+if __name__ == "__main__":
+    main()
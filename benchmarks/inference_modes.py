@@ -0,0 +1,102 @@
+"""
+Evaluate OpenCLIPEmbedder inference modes against the fp32 baseline.
+
+For every mode, on a fixed sample of synthetic images and nail prompts, reports:
+
+- single image / single text latency (median ms)
+- batched image throughput (images/s at ``--batch-size``)
+- cosine agreement with fp32 embeddings (min and mean over the sample)
+
+    python -m benchmarks.inference_modes
+    python -m benchmarks.inference_modes --modes fp32 int8 onnx --threads 4
+    python -m benchmarks.inference_modes --pretrained none   # random weights, no download
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+TEXTS = [
+    "glossy pink french tip nails",
+    "matte black coffin nails",
+    "pastel rainbow almond nails",
+    "gold chrome nails with rhinestones",
+    "short red nails",
+    "white marble nail art",
+    "blue ombre stiletto nails",
+    "nude nails with floral accents",
+]
+
+
+def _sample_images(count=8, size=320):
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        base = rng.integers(0, 255, 3)
+        pixels = np.clip(base + rng.normal(0, 40, (size, size, 3)), 0, 255).astype(np.uint8)
+        images.append(Image.fromarray(pixels))
+    return images
+
+
+def _median_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _agreement(a, b):
+    cos = (a * b).sum(axis=1)   # rows are already unit-normalized
+    return float(cos.min()), float(cos.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["fp32", "inference_mode", "int8", "bf16", "onnx"])
+    parser.add_argument("--model", default="ViT-B-32")
+    parser.add_argument("--pretrained", default="laion2b_s34b_b79k", help="'none' for random weights")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="TORCH_NUM_THREADS override")
+    args = parser.parse_args()
+
+    from app.config import settings
+    if args.threads:
+        settings.TORCH_NUM_THREADS = args.threads
+    from app.embedder import OpenCLIPEmbedder
+
+    pretrained = None if args.pretrained.lower() == "none" else args.pretrained
+    images = _sample_images()
+    batch = (images * (args.batch_size // len(images) + 1))[:args.batch_size]
+
+    baseline = None
+    print(f"model={args.model} pretrained={pretrained} threads={torch.get_num_threads() if not args.threads else args.threads}")
+    print(f"{'mode':>15} {'img ms':>8} {'txt ms':>8} {'img/s':>8} "
+          f"{'img cos min':>12} {'img cos mean':>13} {'txt cos min':>12}")
+    for mode in ["fp32"] + [m for m in args.modes if m != "fp32"]:
+        torch.manual_seed(0)   # identical weights across modes when pretrained is None
+        embedder = OpenCLIPEmbedder(args.model, pretrained, inference_mode=mode)
+        image_emb = embedder.get_batch_embeddings(images)
+        text_emb = embedder.get_batch_text_embeddings(TEXTS)
+        if baseline is None:
+            baseline = (image_emb, text_emb)
+
+        embedder.get_image_embedding(images[0])   # warm up
+        img_ms = _median_ms(lambda: embedder.get_image_embedding(images[0]), args.repeats)
+        txt_ms = _median_ms(lambda: embedder.get_text_embedding(TEXTS[0]), args.repeats)
+        batch_ms = _median_ms(lambda: embedder.get_batch_embeddings(batch), max(3, args.repeats // 3))
+        img_min, img_mean = _agreement(image_emb, baseline[0])
+        txt_min, _ = _agreement(text_emb, baseline[1])
+        label = mode if embedder.inference_mode == mode else f"{mode}->{embedder.inference_mode}"
+        if mode in args.modes:
+            print(f"{label:>15} {img_ms:>8.1f} {txt_ms:>8.1f} {len(batch) / batch_ms * 1000:>8.1f} "
+                  f"{img_min:>12.5f} {img_mean:>13.5f} {txt_min:>12.5f}")
+
+
+if __name__ == "__main__":
+    main()
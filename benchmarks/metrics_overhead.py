@@ -0,0 +1,96 @@
+"""
+Cost of the request instrumentation: metrics on vs off.
+
+1. Times ``--spans`` empty ``span()`` blocks with METRICS_ENABLED on and off.
+2. Sends ``--requests`` sequential /api/search/text and /api/images/{id}
+   requests through the app (stand-in embedder and Postgres, local vector
+   store, search caches off) with METRICS_ENABLED on and off.
+3. Prints the /metrics series recorded for the text search route.
+
+    python -m benchmarks.metrics_overhead --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.standins import install_app_standins, seed
+
+
+def _span_cost(count: int) -> float:
+    from app.metrics import span, stage_duration
+    start = time.perf_counter()
+    for _ in range(count):
+        with span("bench"):
+            pass
+    elapsed = time.perf_counter() - start
+    stage_duration.clear()
+    return elapsed / count * 1e9
+
+
+async def _requests(client, ids, count: int):
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        if i % 2 == 0:
+            response = await client.post("/api/search/text", data={"text": f"prompt {i % 50}"})
+        else:
+            response = await client.get(f"/api/images/{ids[i % len(ids)]}")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return sorted(samples)
+
+
+async def _run(args):
+    standins = install_app_standins()
+    import app.processor as processor
+    from app import metrics
+    from app.config import settings
+    from app.db_local import LocalVectorDB
+    from app.main import app
+    from app.search_cache import create_search_cache, search_cache
+
+    for enabled in (False, True):
+        settings.METRICS_ENABLED = enabled
+        print(f"span(), METRICS_ENABLED={enabled!s:<5}: {_span_cost(args.spans):7.0f} ns")
+
+    settings.SEARCH_CACHE_ENABLED = False
+    settings.EMBED_BATCHING_ENABLED = False
+    search_cache.override(create_search_cache())
+    tmp = tempfile.TemporaryDirectory()
+    vector_db = LocalVectorDB(tmp.name, dim=settings.VECTOR_SIZE)
+    processor.vector_db.override(vector_db)
+    ids = seed(standins["postgres_db"], vector_db, args.images)
+
+    print(f"{args.requests} requests (text search / metadata by id, alternating)")
+    print(f"{'metrics':>8} {'p50 us':>8} {'p99 us':>8} {'mean us':>8}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled in (False, True, False, True):
+            settings.METRICS_ENABLED = enabled
+            metrics.request_duration.clear()
+            metrics.stage_duration.clear()
+            await _requests(client, ids, 50)  # warm up
+            samples = await _requests(client, ids, args.requests)
+            print(f"{'on' if enabled else 'off':>8} {statistics.median(samples):>8.0f} "
+                  f"{samples[int(0.99 * (len(samples) - 1))]:>8.0f} {statistics.fmean(samples):>8.0f}")
+        response = await client.get("/metrics")
+    print()
+    for line in response.text.splitlines():
+        if "/api/search/text" in line and ("_count" in line or "_sum" in line):
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=1000)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
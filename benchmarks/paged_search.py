@@ -0,0 +1,195 @@
+"""
+Paged and streamed search: time to first result and total latency, and "load more".
+
+Serves ``app.main`` with uvicorn on a local port (in process, against the
+stand-ins) so responses really stream; httpx's ASGI transport would buffer
+them. ``--images`` vectors sit in a LocalVectorDB, and the async Postgres
+stand-in awaits ``--rtt-ms`` plus ``--row-us`` per row, so a 1000-row metadata
+query costs what transferring and decoding the rows would. The stub embedder
+takes ``--embed-ms`` per forward pass and the search caches are off.
+
+1. ``/api/images/{id}/similar`` (results with metadata) at each ``--limits``,
+   as one JSON body and as NDJSON (``stream=true``): time until the first
+   result can be shown and until the last one arrived, median over
+   ``--requests``.
+2. Text search, reaching ``--load-more`` results ``--page`` at a time: the old
+   way, repeating the search with a growing ``limit``, vs following
+   ``next_cursor``, which neither embeds the text again nor resends earlier
+   results.
+
+    python -m benchmarks.paged_search --limits 18 100 500 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.standins import AsyncStandIn, install_app_standins, seed
+
+
+class RowCostPostgres(AsyncStandIn):
+    """AsyncStandIn whose metadata queries also await ``row_cost`` seconds per row returned."""
+
+    def __init__(self, target, rtt: float = 0.0, row_cost: float = 0.0):
+        super().__init__(target, rtt)
+        self.row_cost = row_cost
+
+    async def get_image_metadata_many(self, image_uuids):
+        await asyncio.sleep(self.rtt + self.row_cost * len(image_uuids))
+        return self._target.get_image_metadata_many(image_uuids)
+
+
+class CountingEmbedder:
+    """Forward to ``embedder``, counting text forward passes."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.text_calls = 0
+
+    def get_text_embedding(self, text):
+        self.text_calls += 1
+        return self.embedder.get_text_embedding(text)
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(app) -> str:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    # Off the main thread uvicorn installs no signal handlers
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def _json_page(client, url, params):
+    """(ms to first result, ms total, result count) of a JSON response."""
+    start = time.perf_counter()
+    response = client.get(url, params=params)
+    response.raise_for_status()
+    results = response.json()["results"]
+    total = (time.perf_counter() - start) * 1000
+    # Nothing can be shown before the whole body is parsed
+    return total, total, len(results)
+
+
+def _stream_page(client, url, params):
+    """(ms to first result, ms total, result count) of an NDJSON response."""
+    start = time.perf_counter()
+    first, count = None, 0
+    with client.stream("GET", url, params=dict(params, stream="true")) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            item = json.loads(line)
+            if "next_cursor" in item:
+                continue
+            count += 1
+            if first is None:
+                first = (time.perf_counter() - start) * 1000
+    total = (time.perf_counter() - start) * 1000
+    return first if first is not None else total, total, count
+
+
+def _latencies(client, ids, limits, requests):
+    print(f"\n/api/images/{{id}}/similar, median of {requests}")
+    print(f"{'limit':>6} {'mode':>7} {'first ms':>9} {'total ms':>9} {'results':>8}")
+    for limit in limits:
+        for mode, fetch in (("json", _json_page), ("ndjson", _stream_page)):
+            samples = [
+                fetch(client, f"/api/images/{ids[i % len(ids)]}/similar", {"limit": limit})
+                for i in range(requests)
+            ]
+            first, total, count = (statistics.median(column) for column in zip(*samples))
+            print(f"{limit:>6} {mode:>7} {first:>9.1f} {total:>9.1f} {count:>8.0f}")
+
+
+def _load_more(client, embedder, target, page, requests):
+    print(f"\ntext search, {target} results {page} at a time, median of {requests}")
+    print(f"{'method':>14} {'total ms':>9} {'last page ms':>12} {'results sent':>12} {'embeds':>7}")
+    for method in ("growing limit", "cursor"):
+        totals, lasts, sent = [], [], 0
+        embedder.text_calls = 0
+        for i in range(requests):
+            text = f"pink glitter nails {i}"
+            cursor, seen = None, 0
+            start = time.perf_counter()
+            while seen < target:
+                page_start = time.perf_counter()
+                if method == "cursor":
+                    data = {} if cursor else {"text": text}
+                    params = {"limit": page, **({"cursor": cursor} if cursor else {})}
+                    body = client.post("/api/search/text", data=data, params=params).json()
+                    cursor = body["next_cursor"]
+                else:
+                    body = client.post("/api/search/text", data={"text": text}, params={"limit": seen + page}).json()
+                seen += page
+                sent += len(body["results"])
+                last = (time.perf_counter() - page_start) * 1000
+            totals.append((time.perf_counter() - start) * 1000)
+            lasts.append(last)
+        print(f"{method:>14} {statistics.median(totals):>9.1f} {statistics.median(lasts):>12.1f} "
+              f"{sent // requests:>12} {embedder.text_calls / requests:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[18, 100, 250, 500, 1000])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--embed-ms", type=float, default=30.0, help="extra delay per stub forward pass")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="async Postgres round trip")
+    parser.add_argument("--row-us", type=float, default=50.0, help="async Postgres cost per metadata row")
+    parser.add_argument("--page", type=int, default=100, help="page size of the load-more run")
+    parser.add_argument("--load-more", type=int, default=1000, help="results the load-more run reaches")
+    args = parser.parse_args()
+
+    standins = install_app_standins(embed_delay=args.embed_ms / 1000)
+    import app.processor as processor
+    from app.config import settings
+    from app.db_local import LocalVectorDB
+    from app.main import app
+    from app.search_cache import create_search_cache, search_cache
+
+    embedder = CountingEmbedder(standins["embedder"])
+    processor.clip_embedder.override(embedder)
+    settings.EMBED_BATCHING_ENABLED = False
+    settings.SEARCH_CACHE_ENABLED = False
+    search_cache.override(create_search_cache())
+    tmp = tempfile.TemporaryDirectory()
+    vector_db = LocalVectorDB(tmp.name, dim=settings.VECTOR_SIZE)
+    processor.vector_db.override(vector_db)
+    processor.async_vector_db.override(AsyncStandIn(vector_db))
+    processor.async_postgres_db.override(
+        RowCostPostgres(standins["postgres_db"], rtt=args.rtt_ms / 1000, row_cost=args.row_us / 1e6)
+    )
+    ids = seed(standins["postgres_db"], vector_db, args.images)
+
+    print(f"{args.images} images, Postgres {args.rtt_ms:g} ms + {args.row_us:g} us/row, "
+          f"stream batches of {settings.SEARCH_STREAM_BATCH_SIZE}, embed {args.embed_ms:g} ms, "
+          f"{os.cpu_count()} cores")
+    with httpx.Client(base_url=_start_server(app), timeout=120) as client:
+        _latencies(client, ids, args.limits, args.requests)
+        _load_more(client, embedder, args.load_more, args.page, args.requests)
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Sweep Qdrant collection and query settings; report recall@k and latency.
+
+For each collection config (HNSW ``m`` / ``ef_construct``, on-disk vectors,
+int8 scalar quantization) a throwaway ``benchmark_qdrant_tuning`` collection
+is created through QdrantDB.ensure_collection with those settings, loaded with
+random vectors and a payload the size of a real metadata row, and queried
+through QdrantDB.search_similar with each ``hnsw_ef`` and payload/vector
+option. Recall is measured against exact numpy top-k.
+
+Without ``--url`` Qdrant's local in-memory mode is used. It searches by brute
+force and ignores HNSW, on-disk and quantization settings, so there only the
+payload/vector options and transport overhead show up; point ``--url`` at a
+server (``--grpc`` to use gRPC) for the full sweep.
+
+    python -m benchmarks.qdrant_tuning --size 20000
+    python -m benchmarks.qdrant_tuning --url http://localhost:6333 --size 100000
+"""
+import argparse
+import itertools
+import statistics
+import time
+import uuid
+from urllib.parse import urlparse
+
+import numpy as np
+
+from app.config import settings
+
+COLLECTION = "benchmark_qdrant_tuning"
+
+
+def _client(args):
+    from qdrant_client import QdrantClient
+    if not args.url:
+        return QdrantClient(":memory:")
+    url = urlparse(args.url)
+    return QdrantClient(
+        host=url.hostname, port=url.port or 6333, https=url.scheme == "https",
+        prefer_grpc=args.grpc, grpc_port=args.grpc_port
+    )
+
+
+def _wait_indexed(db, timeout: float = 600.0):
+    """Wait until the server has finished optimizing (no-op in local mode)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = db.client.get_collection(COLLECTION)
+        if str(getattr(info.status, "value", info.status)) == "green":
+            return
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Qdrant server, e.g. http://localhost:6333")
+    parser.add_argument("--grpc", action="store_true")
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=18)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construct", type=int, nargs="+", default=[100])
+    parser.add_argument("--quantization", choices=["off", "int8", "both"], default="both")
+    parser.add_argument("--on-disk", choices=["off", "on", "both"], default="off")
+    parser.add_argument("--hnsw-ef", type=int, nargs="+", default=[16, 64, 128])
+    args = parser.parse_args()
+
+    from app.db_qdrant import QdrantDB
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((args.size, settings.VECTOR_SIZE)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Queries near existing points, as with search-by-image
+    queries = vectors[rng.integers(0, args.size, args.queries)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(settings.VECTOR_SIZE)
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(args.size)]
+    truth = [set(np.argsort(-(vectors @ q))[:args.limit]) for q in queries]
+    row_of = {image_id: row for row, image_id in enumerate(ids)}
+    payload = {"s3_url": "https://bucket.s3.amazonaws.com/images/" + "x" * 40 + ".jpg",
+               "style": "french", "colors": ["red", "white"], "salon_id": "x" * 32}
+
+    choices = {"off": [False], "on": [True], "int8": [True], "both": [False, True]}
+    settings.QDRANT_COLLECTION = COLLECTION
+    settings.QDRANT_INDEXING_THRESHOLD = 1000   # index small benchmark collections too
+    db = QdrantDB(client=_client(args))
+    mode = f"server {args.url} ({'grpc' if args.grpc else 'http'})" if args.url else "local in-memory"
+    print(f"{mode}, size={args.size}, limit={args.limit}, latency in ms over {args.queries} queries")
+    print(f"{'m':>3} {'efc':>4} {'quant':>5} {'disk':>4} {'load s':>7} {'hnsw_ef':>7} "
+          f"{'payload':>7} {'vectors':>7} {'p50':>7} {'p95':>7} {'recall':>7}")
+
+    for m, ef_construct, quantization, on_disk in itertools.product(
+        args.m, args.ef_construct, choices[args.quantization], choices[args.on_disk]
+    ):
+        settings.QDRANT_HNSW_M = m
+        settings.QDRANT_HNSW_EF_CONSTRUCT = ef_construct
+        settings.QDRANT_SCALAR_QUANTIZATION = quantization
+        settings.QDRANT_ON_DISK = on_disk
+        if COLLECTION in [c.name for c in db.client.get_collections().collections]:
+            db.client.delete_collection(COLLECTION)
+        db.ensure_collection()
+        start = time.perf_counter()
+        db.insert_vectors(ids, vectors, [payload] * len(ids), batch_size=512)
+        _wait_indexed(db)
+        load = time.perf_counter() - start
+
+        for hnsw_ef, with_payload, with_vectors in itertools.product(args.hnsw_ef, [True, False], [False, True]):
+            if with_payload and with_vectors:
+                continue
+            samples, recalls = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                hits = db.search_similar(
+                    query, limit=args.limit, hnsw_ef=hnsw_ef,
+                    with_payload=with_payload, with_vectors=with_vectors
+                )
+                samples.append((time.perf_counter() - start) * 1000)
+                recalls.append(len({row_of[str(hit.id)] for hit in hits} & expected) / args.limit)
+            samples.sort()
+            print(f"{m:>3} {ef_construct:>4} {'int8' if quantization else 'off':>5} {'on' if on_disk else 'off':>4} "
+                  f"{load:>7.1f} {hnsw_ef:>7} {str(with_payload):>7} {str(with_vectors):>7} "
+                  f"{statistics.median(samples):>7.2f} {samples[int(0.95 * (len(samples) - 1))]:>7.2f} "
+                  f"{statistics.mean(recalls):>7.3f}")
+    db.client.delete_collection(COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
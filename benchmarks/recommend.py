@@ -0,0 +1,107 @@
+"""
+"More like this" latency: retrieve + search (two calls) vs native recommend (one).
+
+Runs against Qdrant's in-memory mode with ``--rtt-ms`` of simulated network
+latency added to every client call, or against a real server with ``--url``
+(``--rtt-ms 0`` then, the network supplies it). Reports client calls per
+query, median / p95 latency and how many results the two paths share once
+the source image is removed from the two-call results.
+
+In-memory mode implements recommend in Python and is slower per call than
+its search, so there the simulated RTT is what separates the paths; the
+server numbers are the ones that matter.
+
+    python -m benchmarks.recommend --rtt-ms 2
+    python -m benchmarks.recommend --url http://localhost:6333 --rtt-ms 0
+"""
+import argparse
+import functools
+import statistics
+import time
+import uuid
+
+import numpy as np
+
+from app.config import settings
+
+
+class _CountingClient:
+    """Forward to a QdrantClient, counting calls and sleeping ``rtt`` per call."""
+
+    def __init__(self, client, rtt: float):
+        self._client = client
+        self._rtt = rtt
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            self.calls += 1
+            if self._rtt:
+                time.sleep(self._rtt)
+            return attr(*args, **kwargs)
+        return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=18)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from app.db_qdrant import QdrantDB
+
+    settings.QDRANT_COLLECTION = "benchmark_recommend"
+    client = QdrantClient(url=args.url) if args.url else QdrantClient(":memory:")
+    db = QdrantDB(client=client)
+    if settings.QDRANT_COLLECTION in [c.name for c in client.get_collections().collections]:
+        client.delete_collection(settings.QDRANT_COLLECTION)
+    db.ensure_collection()
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((args.size, settings.VECTOR_SIZE)).astype(np.float32)
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(args.size)]
+    db.insert_vectors(ids, vectors, [{"n": i} for i in range(args.size)], batch_size=512)
+
+    counting = _CountingClient(client, args.rtt_ms / 1000)
+    db.client = counting
+    clicked = [ids[i] for i in rng.integers(0, args.size, args.queries)]
+    paths = {
+        "retrieve+search": lambda image_id: db.search_similar_by_id(image_id, limit=args.limit + 1),
+        "recommend": lambda image_id: db.recommend([image_id], limit=args.limit),
+    }
+    results = {}
+    print(f"size={args.size} limit={args.limit} rtt={args.rtt_ms} ms ({'server' if args.url else 'in-memory'})")
+    print(f"{'path':>16} {'calls/q':>8} {'p50 ms':>8} {'p95 ms':>8} {'self in results':>16}")
+    for name, search in paths.items():
+        counting.calls = 0
+        samples, hits = [], []
+        for image_id in clicked:
+            start = time.perf_counter()
+            found = search(image_id)
+            samples.append((time.perf_counter() - start) * 1000)
+            hits.append([str(hit.id) for hit in found])
+        samples.sort()
+        self_included = sum(image_id in found for image_id, found in zip(clicked, hits))
+        results[name] = hits
+        print(f"{name:>16} {counting.calls / len(clicked):>8.1f} {statistics.median(samples):>8.2f} "
+              f"{samples[int(0.95 * (len(samples) - 1))]:>8.2f} {self_included:>10}/{len(clicked)}")
+
+    overlap = statistics.mean(
+        len(set(r) & {i for i in s if i != image_id}) / args.limit
+        for image_id, s, r in zip(clicked, results["retrieve+search"], results["recommend"])
+    )
+    print(f"result overlap after dropping the source image: {overlap:.3f}")
+    db.client = client
+    client.delete_collection(settings.QDRANT_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Re-embedding job: throughput, resume, and live search during the switch.
+
+Seeds ``--images`` synthetic JPEGs into a fake S3 bucket, FakePostgresDB and
+an in-memory Qdrant collection served through the QDRANT_COLLECTION alias,
+then re-embeds them with ReembedJob and the stub embedder (``--embed-ms`` per
+forward pass) while a background thread searches the alias the whole time.
+
+1. throughput with ``--workers`` embedding processes and in-process
+2. a run that crashes halfway, resumed from its checkpoint
+3. ``--workers`` again with ``--latency-budget-ms``: how much the throttle
+   paused, and the live p95 it held
+
+For each run it reports images/s, the live searches' p95 and whether any of
+them failed across the alias switch.
+
+    python -m benchmarks.reembed --images 3000 --workers 2 --latency-budget-ms 8
+"""
+import argparse
+import functools
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from PIL import Image
+from qdrant_client import QdrantClient
+
+from app.config import settings
+from app.db_qdrant import QdrantDB
+from app.reembed import ReembedJob
+from app.s3_utils import S3Uploader
+from benchmarks.standins import FakePostgresDB, FakeS3Client, StubEmbedder, seed
+
+
+class CrashingPostgres:
+    """Forward to ``postgres_db``, raising after ``pages`` metadata pages."""
+
+    def __init__(self, postgres_db, pages: int):
+        self.postgres_db = postgres_db
+        self.pages = pages
+
+    def get_image_metadata_page(self, after=None, limit: int = 1000):
+        if self.pages == 0:
+            raise RuntimeError("simulated crash")
+        self.pages -= 1
+        return self.postgres_db.get_image_metadata_page(after, limit)
+
+    def __getattr__(self, name):
+        return getattr(self.postgres_db, name)
+
+
+class LiveSearches:
+    """Search the alias in a loop on a background thread, recording latency and failures."""
+
+    def __init__(self, vector_db, lock):
+        self.vector_db = vector_db
+        self.lock = lock
+        self.latencies = []
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        rng = np.random.default_rng(2)
+        while not self._stop.is_set():
+            query = rng.standard_normal(settings.VECTOR_SIZE).astype(np.float32)
+            start = time.perf_counter()
+            try:
+                with self.lock:
+                    self.vector_db.search_similar(query, limit=18, with_payload=False)
+            except Exception:
+                self.failures += 1
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def p95_ms(self) -> float:
+        return float(np.percentile(self.latencies, 95)) if self.latencies else 0.0
+
+
+class LockedClient:
+    """QdrantClient(":memory:") is not thread-safe; serialize calls like a server would queue them."""
+
+    def __init__(self, client, lock):
+        self._target = client
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
+
+
+def _setup(count: int, size: int):
+    """Fresh stores with ``count`` images: (client, lock, postgres_db, s3)."""
+    lock = threading.RLock()
+    client = LockedClient(QdrantClient(":memory:"), lock)
+    live = QdrantDB(client, collection=f"{settings.QDRANT_COLLECTION}_v1")
+    live.ensure_collection()
+    live.point_alias(settings.QDRANT_COLLECTION)
+    postgres_db = FakePostgresDB()
+    ids = seed(postgres_db, live, count)
+    s3 = S3Uploader(client=FakeS3Client())
+    rng = np.random.default_rng(0)
+    now = datetime.now(timezone.utc)
+    for n, image_id in enumerate(ids):
+        coarse = rng.integers(0, 255, (4, 4, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(coarse).resize((size, size), Image.BICUBIC).save(buf, format="JPEG", quality=85)
+        url = s3.upload(buf.getvalue(), image_id)
+        row = postgres_db._rows[image_id]
+        row["metadata"] = dict(row["metadata"] or {}, s3_url=url)
+        # Uploads a minute apart, so the catch-up pass only rescans the last few
+        row["upload_time"] = now - timedelta(minutes=count - n)
+    return client, lock, postgres_db, s3
+
+
+def _run(args, label, workers, checkpoint=None, crash_after=None, budget=0.0):
+    client, lock, postgres_db, s3 = _setup(args.images, args.size)
+    alias = QdrantDB(client)
+    factory = functools.partial(StubEmbedder, delay=args.embed_ms / 1000)
+
+    def make_job(pg):
+        return ReembedJob(
+            model_name="stub",
+            pretrained=None,
+            embedder_factory=factory,
+            postgres_db=pg,
+            client=client,
+            fetch=s3.download,
+            workers=workers,
+            batch_size=args.batch_size,
+            latency_budget_ms=budget,
+            checkpoint_path=checkpoint
+        )
+
+    with LiveSearches(alias, lock) as idle:
+        time.sleep(2.0)
+    if budget < 0:
+        # Relative to the latency without the job
+        budget = idle.p95_ms * -budget
+    with LiveSearches(alias, lock) as live:
+        start = time.perf_counter()
+        crashed = 0
+        if crash_after is not None:
+            job = make_job(CrashingPostgres(postgres_db, crash_after))
+            try:
+                job.run(switch_model_mismatch=True)
+            except RuntimeError:
+                crashed = client.count(job.target.collection).count
+            finally:
+                job.close()
+        job = make_job(postgres_db)
+        try:
+            # The stub stands in for the configured model
+            report = job.run(switch_model_mismatch=True)
+        finally:
+            job.close()
+        elapsed = time.perf_counter() - start
+    target = client.get_aliases().aliases[0].collection_name
+    print(f"{label:<22} {report.embedded:>8} {report.skipped:>8} {crashed:>8} "
+          f"{args.images / elapsed:>8.1f} {report.throttled:>9.1f} {idle.p95_ms:>9.1f} {live.p95_ms:>9.1f} "
+          f"{live.failures:>8} {'ok' if client.count(settings.QDRANT_COLLECTION).count == args.images else 'MISSING':>7} "
+          f"{target[-14:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=256, help="edge length of the synthetic images")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--embed-ms", type=float, default=400.0, help="extra delay per stub forward pass")
+    parser.add_argument("--latency-budget-ms", type=float, default=-1.5,
+                        help="negative: that multiple of the idle search p95")
+    args = parser.parse_args()
+
+    print(f"{args.images} images, batches of {args.batch_size}, {args.embed_ms:.0f} ms per forward pass, "
+          f"{os.cpu_count()} cores")
+    print(f"{'run':<22} {'embedded':>8} {'skipped':>8} {'crashed':>8} {'img/s':>8} {'paused s':>9} "
+          f"{'idle p95':>9} {'live p95':>9} {'failures':>8} {'points':>7} alias target")
+    _run(args, "in-process", workers=0)
+    _run(args, f"{args.workers} workers", workers=args.workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = args.images // args.batch_size // 2
+        _run(args, "crash + resume", workers=0, checkpoint=os.path.join(tmp, "reembed.ckpt"), crash_after=pages)
+    budget = f"{-args.latency_budget_ms:g}x idle" if args.latency_budget_ms < 0 else f"{args.latency_budget_ms:g} ms"
+    _run(args, f"{args.workers} w, budget {budget}", workers=args.workers,
+         budget=args.latency_budget_ms)
+
+
+if __name__ == "__main__":
+    main()
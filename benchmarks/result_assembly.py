@@ -0,0 +1,89 @@
+"""
+Result-assembly latency for image search: per-hit lookups vs one bulk query vs payload.
+
+For each limit, takes that many Qdrant-style hits and times turning them into
+result dicts three ways:
+
+- ``n+1``: one ``get_image_metadata`` call per hit (the old search path)
+- ``bulk``: one ``get_image_metadata_many`` call (``uuid = ANY(...)``)
+- ``payload``: metadata from the point payload, no Postgres at all
+
+    python -m benchmarks.result_assembly --backend standin --rtt-ms 0.5
+    python -m benchmarks.result_assembly --backend postgres   # uses .env settings
+
+The ``postgres`` backend inserts its seed rows into pretty_images_metadata and
+deletes them again afterwards.
+"""
+import argparse
+import statistics
+import time
+import types
+import uuid
+
+
+def _hits(ids):
+    return [
+        types.SimpleNamespace(id=image_id, score=1.0 - i / len(ids), payload={"style": "bench"})
+        for i, image_id in enumerate(ids)
+    ]
+
+
+def _n_plus_one(postgres_db, hits):
+    results = []
+    for match in hits:
+        metadata = postgres_db.get_image_metadata(match.id)
+        if metadata:
+            results.append({"id": match.id, "score": match.score, "metadata": metadata})
+    return results
+
+
+def _time(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["standin", "postgres"], default="standin")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="simulated round trip (standin only)")
+    parser.add_argument("--limits", type=int, nargs="+", default=[8, 18, 100])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    from benchmarks.standins import install_app_standins
+    standins = install_app_standins()
+    if args.backend == "standin":
+        postgres_db = standins["postgres_db"]
+        postgres_db.rtt = args.rtt_ms / 1000
+    else:
+        # Real Postgres, stand-ins for everything else
+        import app.db_postgres
+        postgres_db = app.db_postgres.PostgresDB()
+        postgres_db._init_db()
+        app.db_postgres.postgres_db.override(postgres_db)
+
+    from app.processor import ImageProcessor
+
+    ids = [str(uuid.uuid4()) for _ in range(max(args.limits))]
+    for image_id in ids:
+        postgres_db.insert_image_metadata(image_id, "bench.jpg", {"style": "bench"})
+    try:
+        print(f"backend={args.backend} (median of {args.repeats} runs, ms)")
+        print(f"{'limit':>6} {'n+1':>9} {'bulk':>9} {'payload':>9}")
+        for limit in args.limits:
+            hits = _hits(ids[:limit])
+            n1 = _time(lambda: _n_plus_one(postgres_db, hits), args.repeats)
+            bulk = _time(lambda: ImageProcessor._attach_metadata(hits, "postgres"), args.repeats)
+            payload = _time(lambda: ImageProcessor._attach_metadata(hits, "payload"), args.repeats)
+            print(f"{limit:>6} {n1:>9.2f} {bulk:>9.2f} {payload:>9.3f}")
+    finally:
+        for image_id in ids:
+            postgres_db.delete_image_metadata(image_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+S3 upload throughput: client per call vs the shared S3Uploader.
+
+1. Builds ``boto3.client("s3")`` a few times (no network), which is what the
+   old upload_image_to_s3 paid on every upload.
+2. Uploads ``--images`` small JPEG/PNG images to FakeS3Client (``--rtt-ms``
+   per request) one at a time, then with S3Uploader.upload_many.
+3. Uploads one ``--large-mb`` body as a single PUT and as a multipart upload
+   over a link of ``--bandwidth-mbps`` per connection.
+
+    python -m benchmarks.s3_upload --images 1000
+"""
+import argparse
+import io
+import time
+import uuid
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.s3_utils import S3Uploader
+from benchmarks.standins import FakeS3Client
+
+
+def _images(count: int):
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        buf = io.BytesIO()
+        pixels = rng.integers(0, 255, (96, 96, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(buf, format="PNG" if i % 4 == 0 else "JPEG")
+        images.append(buf.getvalue())
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--large-mb", type=int, default=64)
+    parser.add_argument("--bandwidth-mbps", type=float, default=400.0)
+    args = parser.parse_args()
+
+    import boto3
+    start = time.perf_counter()
+    for _ in range(5):
+        boto3.client("s3", region_name=settings.AWS_S3_REGION,
+                     aws_access_key_id="x", aws_secret_access_key="x")
+    print(f"boto3.client() construction: {(time.perf_counter() - start) / 5 * 1000:.1f} ms per call")
+
+    images = _images(args.images)
+    ids = [str(uuid.uuid4()) for _ in images]
+    rtt = args.rtt_ms / 1000
+    print(f"{len(images)} images, {sum(map(len, images)) / len(images) / 1024:.0f} KiB average, {args.rtt_ms} ms per request")
+
+    client = FakeS3Client(rtt=rtt)
+    uploader = S3Uploader(client=client)
+    sample = images[:max(1, len(images) // 10)]
+    start = time.perf_counter()
+    for data, image_id in zip(sample, ids):
+        uploader.upload(data, image_id)
+    elapsed = time.perf_counter() - start
+    print(f"{'sequential':>18}: {len(sample) / elapsed:8.1f} images/s (first {len(sample)} images)")
+    for workers in args.workers:
+        client = FakeS3Client(rtt=rtt)
+        uploader = S3Uploader(client=client, upload_workers=workers)
+        start = time.perf_counter()
+        urls = uploader.upload_many(images, ids)
+        elapsed = time.perf_counter() - start
+        uploader.close()
+        png = sum(url.endswith(".png") for url in urls)
+        print(f"{f'upload_many x{workers}':>18}: {len(images) / elapsed:8.1f} images/s "
+              f"({png} stored as image/png)")
+
+    data = np.random.default_rng(1).integers(0, 255, args.large_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+    bandwidth = args.bandwidth_mbps * 1e6 / 8
+    print(f"{args.large_mb} MiB body, {args.bandwidth_mbps} Mbit/s per connection")
+    for name, threshold in (("single PUT", len(data) + 1), ("multipart", settings.S3_MULTIPART_THRESHOLD)):
+        client = FakeS3Client(rtt=rtt, bandwidth=bandwidth)
+        uploader = S3Uploader(client=client, multipart_threshold=threshold)
+        start = time.perf_counter()
+        url = uploader.upload(data, "large")
+        elapsed = time.perf_counter() - start
+        uploader.close()
+        stored = client.objects[url.split(".amazonaws.com/")[1]][0]
+        assert stored == data
+        print(f"{name:>18}: {elapsed:6.2f} s  requests={client.calls}")
+
+
+if __name__ == "__main__":
+    main()
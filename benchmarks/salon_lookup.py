@@ -0,0 +1,138 @@
+"""
+Salon lookup benchmark on a synthetic 100k-row salons table.
+
+Builds ``salons`` / ``salon_images`` in a scratch schema (``salon_bench`` by
+default, dropped afterwards) on the Postgres configured in .env, then times
+resolving ``top_k`` salon image ids to salon rows:
+
+- ``per-hit``: the old path, two queries per hit with REPLACE() on salons
+- ``joined``: fetch_salons_for_images, one joined query, cache cleared each run
+- ``joined+idx``: the same after ensure_salon_indexes()
+- ``cached``: fetch_salons_for_images served from the in-process cache
+
+    python -m benchmarks.salon_lookup --salons 100000 --top-k 4 18
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.config import settings
+from app.db_pool import PostgresPool
+import match_salons.salon_recommendation_v2 as salon_module
+
+
+def _per_hit(pool, image_ids):
+    results = []
+    with pool.connection() as conn, conn.cursor() as cur:
+        for img_id in image_ids:
+            cur.execute("SELECT salon_id FROM salon_images WHERE image_id = %s", (img_id,))
+            row = cur.fetchone()
+            if not row:
+                continue
+            cur.execute("""
+                SELECT salon_id, business_name, address, overall_price_level, review_total, average_rating, amenities
+                FROM salons WHERE REPLACE(salon_id, '-', '') = %s
+            """, (row[0].replace("-", ""),))
+            results.append(cur.fetchone())
+    return results
+
+
+def _time(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _create_tables(pool, schema, n_salons):
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute("""
+            CREATE TABLE salons (
+                salon_id TEXT PRIMARY KEY, business_name TEXT, address TEXT,
+                overall_price_level TEXT, review_total INT, average_rating REAL, amenities TEXT
+            )
+        """)
+        # salon_images keeps the dash-free id form, as in production
+        cur.execute("CREATE TABLE salon_images (image_id UUID, salon_id TEXT)")
+        cur.execute("""
+            INSERT INTO salons
+            SELECT gen_random_uuid()::text, 'Salon ' || g, g || ' Main St', '$$',
+                   (g % 500), 3 + (g % 20) / 10.0, 'wifi'
+            FROM generate_series(1, %s) AS g
+        """, (n_salons,))
+        cur.execute("""
+            INSERT INTO salon_images
+            SELECT gen_random_uuid(), REPLACE(salon_id, '-', '') FROM salons
+        """)
+        cur.execute("ANALYZE salons; ANALYZE salon_images")
+        cur.execute("SELECT image_id::text FROM salon_images")
+        image_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    return image_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salons", type=int, default=100_000)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[4, 18])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--schema", default="salon_bench")
+    args = parser.parse_args()
+
+    pool = PostgresPool(
+        conn_params={
+            'dbname': settings.POSTGRES_DB,
+            'user': settings.POSTGRES_USER,
+            'password': settings.POSTGRES_PASSWORD,
+            'host': settings.POSTGRES_HOST,
+            'port': settings.POSTGRES_PORT,
+            'options': f"-c search_path={args.schema}",
+        },
+        max_size=2
+    )
+    # Route the recommender's queries to the scratch schema
+    salon_module.pg_pool = pool
+
+    image_ids = _create_tables(pool, args.schema, args.salons)
+    rng = random.Random(0)
+    try:
+        print(f"salons={args.salons} (median of {args.repeats} runs, ms)")
+        rows = []
+        for top_k in args.top_k:
+            ids = rng.sample(image_ids, top_k)
+
+            def joined():
+                salon_module.invalidate_salon_cache()
+                salon_module.fetch_salons_for_images(ids)
+
+            rows.append([top_k, _time(lambda: _per_hit(pool, ids), args.repeats), _time(joined, args.repeats)])
+
+        salon_module.ensure_salon_indexes()
+        for row, top_k in zip(rows, args.top_k):
+            ids = rng.sample(image_ids, top_k)
+
+            def joined():
+                salon_module.invalidate_salon_cache()
+                salon_module.fetch_salons_for_images(ids)
+
+            row.append(_time(joined, args.repeats))
+            salon_module.fetch_salons_for_images(ids)
+            row.append(_time(lambda: salon_module.fetch_salons_for_images(ids), args.repeats))
+
+        print(f"{'top_k':>6} {'per-hit':>10} {'joined':>10} {'joined+idx':>11} {'cached':>8}")
+        for top_k, per_hit, joined, indexed, cached in rows:
+            print(f"{top_k:>6} {per_hit:>10.2f} {joined:>10.2f} {indexed:>11.2f} {cached:>8.3f}")
+    finally:
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            conn.commit()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
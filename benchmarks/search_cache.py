@@ -0,0 +1,82 @@
+"""
+Repeated-query workload with the search caches off vs on.
+
+Replays a skewed (Zipf) mix of text searches over ``--prompts`` distinct
+prompts and by-id searches over the seeded images through ImageProcessor,
+with the stand-in embedder taking ``--embed-ms`` per call and the stand-in
+Postgres ``--rtt-ms`` per query. An upload every ``--write-every`` requests
+bumps the cache generation, as process_image does in production.
+
+    python -m benchmarks.search_cache --requests 2000
+"""
+import argparse
+import io
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.standins import install_app_standins, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--prompts", type=int, default=50)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--embed-ms", type=float, default=20.0)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--write-every", type=int, default=500)
+    args = parser.parse_args()
+
+    standins = install_app_standins(embed_delay=args.embed_ms / 1000)
+    standins["postgres_db"].rtt = args.rtt_ms / 1000
+    import app.processor as processor
+    from app.config import settings
+    from app.db_local import LocalVectorDB
+    from app.processor import ImageProcessor
+    from app.search_cache import create_search_cache, search_cache
+
+    settings.EMBED_BATCHING_ENABLED = False
+    tmp = tempfile.TemporaryDirectory()
+    vector_db = LocalVectorDB(tmp.name, dim=settings.VECTOR_SIZE)
+    processor.vector_db.override(vector_db)
+    ids = seed(standins["postgres_db"], vector_db, args.images)
+    rng = np.random.default_rng(0)
+    workload = [
+        ("text", f"prompt {rng.zipf(1.3) % args.prompts}") if rng.random() < 0.5
+        else ("id", ids[rng.zipf(1.3) % len(ids)])
+        for _ in range(args.requests)
+    ]
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color=(10, 200, 30)).save(buf, format="JPEG")
+    upload = buf.getvalue()
+
+    for enabled in (False, True):
+        settings.SEARCH_CACHE_ENABLED = enabled
+        search_cache.override(create_search_cache())
+        samples = []
+        start_all = time.perf_counter()
+        for i, (kind, query) in enumerate(workload):
+            if args.write_every and i and i % args.write_every == 0:
+                ImageProcessor.process_image(upload, "bench.jpg", {})
+            start = time.perf_counter()
+            if kind == "text":
+                ImageProcessor.search_similar_by_text(query, limit=18)
+            else:
+                ImageProcessor.search_similar_by_id(query, limit=18)
+            samples.append((time.perf_counter() - start) * 1000)
+        total = time.perf_counter() - start_all
+        samples.sort()
+        stats = search_cache.stats()
+        print(f"cache {'on ' if enabled else 'off'}: total {total:.2f}s  "
+              f"p50 {statistics.median(samples):.2f} ms  p95 {samples[int(0.95 * (len(samples) - 1))]:.2f} ms")
+        if enabled:
+            for name in ("text_embeddings", "results"):
+                print(f"  {name}: {stats[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Memory per worker and startup time of ``app.serve``, with and without preloading the model.
+
+For each ``--workers`` count, with SERVE_PRELOAD on and off, starts
+``python -m app.serve`` on a local vector index of ``--images`` vectors with ``--clip-model``
+(random weights unless ``--clip-pretrained``, so nothing is downloaded), waits
+for "workers ready", sends ``--requests`` concurrent text searches so the
+workers have run forward passes, then reads /proc/<pid>/smaps_rollup:
+
+- RSS: what ``ps`` and most dashboards show; counts shared pages in every process
+- PSS: shared pages split between the processes that map them
+- USS: private pages, what one more worker costs
+- total PSS: parent and workers together, the memory the host actually spends
+
+Startup is the time from launch until every worker accepts requests. Runs
+whose footprint, extrapolated from the previous run in the same mode, exceeds
+MemAvailable are skipped rather than run into the OOM killer.
+
+    python -m benchmarks.serve_memory --workers 1 4 8
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+from app.db_local import LocalVectorDB
+
+
+def _smaps(pid: int) -> dict:
+    """Rss, Pss and private (USS) kB of one process."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":"):
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _children(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                ppid = next(int(line.split()[1]) for line in f if line.startswith("PPid:"))
+        except (OSError, StopIteration):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def _mem_available_kb() -> int:
+    with open("/proc/meminfo") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("MemAvailable:"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run(args, workers: int, preload: bool, index_path: str):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        CLIP_MODEL_NAME=args.clip_model,
+        CLIP_PRETRAINED=args.clip_pretrained,
+        VECTOR_BACKEND="local",
+        LOCAL_INDEX_PATH=index_path,
+        LOCAL_INDEX_READ_ONLY="true",
+        SEARCH_CACHE_ENABLED="false",
+    )
+    command = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--host", "127.0.0.1",
+               "--port", str(port), "--preload" if preload else "--no-preload"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    ready = threading.Event()
+    output = []
+
+    def drain():
+        # Keep reading so access logs never fill the pipe
+        for line in proc.stdout:
+            output.append(line)
+            if "workers ready" in line:
+                ready.set()
+    threading.Thread(target=drain, daemon=True).start()
+
+    try:
+        if not ready.wait(args.timeout) or proc.poll() is not None:
+            raise RuntimeError("server did not start:\n" + "".join(output[-20:]))
+        startup = time.perf_counter() - start
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            def search(i):
+                return client.post("/api/search/text", data={"text": f"pink glitter nails {i}"}).status_code
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                statuses = list(pool.map(search, range(args.requests or 4 * workers)))
+        pids = _children(proc.pid)
+        usage = [_smaps(pid) for pid in pids]
+        parent = _smaps(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    errors = sum(status != 200 for status in statuses)
+    n = max(1, len(usage))
+    return {
+        "startup": startup,
+        "rss": sum(u["rss"] for u in usage) / n,
+        "pss": sum(u["pss"] for u in usage) / n,
+        "uss": sum(u["uss"] for u in usage) / n,
+        "total_pss": parent["pss"] + sum(u["pss"] for u in usage),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--clip-model", default="ViT-B-32")
+    parser.add_argument("--clip-pretrained", default="", help="open_clip weights, empty for random (no download)")
+    parser.add_argument("--images", type=int, default=10000, help="vectors in the local index")
+    parser.add_argument("--dim", type=int, default=512, help="embedding size of --clip-model")
+    parser.add_argument("--requests", type=int, default=0, help="text searches per run, 0 = 4 per worker")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for the workers")
+    args = parser.parse_args()
+
+    mb = 1024
+    print(f"{args.clip_model}/{args.clip_pretrained or 'random'}, {os.cpu_count()} cores, "
+          f"{_mem_available_kb() // mb} MB available")
+    print(f"{'workers':>7} {'preload':>7} {'startup s':>9} {'RSS/worker':>10} {'PSS/worker':>10} "
+          f"{'USS/worker':>10} {'total PSS':>9} {'errors':>6}  (MB)")
+    # Measured footprint of the previous run per mode: (fixed kB, kB per worker)
+    footprint = {}
+    with tempfile.TemporaryDirectory() as index_path:
+        # Workers open it read-only, like API workers next to a separate writer
+        rng = np.random.default_rng(0)
+        LocalVectorDB(index_path, dim=args.dim).insert_vectors(
+            [f"00000000-0000-0000-0000-{i:012d}" for i in range(args.images)],
+            rng.standard_normal((args.images, args.dim)).astype(np.float32),
+            [{} for _ in range(args.images)]
+        )
+        for workers in args.workers:
+            for preload in (False, True):
+                mode = "on" if preload else "off"
+                if mode in footprint:
+                    fixed, per_worker = footprint[mode]
+                    if fixed + per_worker * workers > _mem_available_kb():
+                        print(f"{workers:>7} {mode:>7}  skipped: needs ~{(fixed + per_worker * workers) / mb:.0f} MB")
+                        continue
+                result = _run(args, workers, preload, index_path)
+                # Without preload every worker holds a full copy; with it they share the parent's
+                footprint[mode] = (result["total_pss"] - result["uss"] * workers, result["uss"]) if preload \
+                    else (0, result["rss"])
+                print(f"{workers:>7} {mode:>7} {result['startup']:>9.2f} "
+                      f"{result['rss'] / mb:>10.0f} {result['pss'] / mb:>10.0f} {result['uss'] / mb:>10.0f} "
+                      f"{result['total_pss'] / mb:>9.0f} {result['errors']:>6}")
+
+if __name__ == "__main__":
+    main()
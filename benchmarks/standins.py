@@ -0,0 +1,405 @@
+"""
+Local stand-ins for the service's external dependencies.
+
+Lets benchmarks run ``app.main`` without CLIP weights, Postgres, a Qdrant
+server or S3.
+"""
+import asyncio
+import contextlib
+import hashlib
+import io
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+class StubEmbedder:
+    """
+    CPU-bound stand-in for OpenCLIPEmbedder.
+
+    A forward pass costs a fixed per-call overhead plus a per-item matmul, which
+    is the cost shape batching exploits. ``delay`` adds a GIL-releasing sleep per
+    forward pass to model a slow model.
+    """
+
+    def __init__(self, dim: int = 512, call_overhead: int = 768, item_cost: int = 96,
+                 delay: float = 0.0):
+        rng = np.random.default_rng(0)
+        self.dim = dim
+        self.delay = delay
+        self._overhead = rng.standard_normal((call_overhead, call_overhead)).astype(np.float32)
+        self._proj = rng.standard_normal((item_cost * item_cost, dim)).astype(np.float32)
+        self._item_cost = item_cost
+
+    def _forward(self, n: int) -> np.ndarray:
+        if self.delay:
+            time.sleep(self.delay)
+        self._overhead @ self._overhead
+        x = np.random.standard_normal((n, self._item_cost * self._item_cost)).astype(np.float32)
+        out = x @ self._proj
+        return out / np.linalg.norm(out, axis=1)[:, None]
+
+    def get_image_embedding(self, image):
+        return self._forward(1)[0]
+
+    def get_batch_embeddings(self, images):
+        return self._forward(len(images))
+
+    def get_text_embedding(self, text):
+        return self._forward(1)[0]
+
+    def get_batch_text_embeddings(self, texts):
+        return self._forward(len(texts))
+
+
+class HashEmbedder:
+    """
+    Tiny deterministic stand-in for OpenCLIPEmbedder.
+
+    The vector is derived from a hash of the input, so the same image or text
+    always embeds the same way and runs are reproducible. Costs next to nothing,
+    which leaves the rest of the request path as the thing being measured.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _vector(self, key: bytes) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def get_image_embedding(self, image):
+        return self._vector(image.tobytes())
+
+    def get_batch_embeddings(self, images):
+        return np.stack([self.get_image_embedding(image) for image in images])
+
+    def get_text_embedding(self, text):
+        return self._vector(text.encode())
+
+    def get_batch_text_embeddings(self, texts):
+        return np.stack([self.get_text_embedding(text) for text in texts])
+
+
+class FakePostgresDB:
+    """In-memory stand-in for PostgresDB; ``rtt`` seconds are slept per query."""
+
+    def __init__(self, rtt: float = 0.0):
+        self.rtt = rtt
+        self._rows = {}
+        self._hashes = {}   # content_hash -> (content_hash, phash, uuid)
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def insert_image_metadata(self, image_uuid: str, filename: str, metadata: dict = None):
+        self._round_trip()
+        with self._lock:
+            self._rows[str(image_uuid)] = {
+                "uuid": str(image_uuid),
+                "filename": filename,
+                "upload_time": datetime.now(timezone.utc),
+                "metadata": metadata,
+            }
+
+    def insert_image_metadata_many(self, rows):
+        self._round_trip()
+        with self._lock:
+            for image_uuid, filename, metadata in rows:
+                self._rows[str(image_uuid)] = {
+                    "uuid": str(image_uuid),
+                    "filename": filename,
+                    "upload_time": datetime.now(timezone.utc),
+                    "metadata": metadata,
+                }
+
+    def get_image_metadata(self, image_uuid: str) -> dict:
+        self._round_trip()
+        row = self._rows.get(str(image_uuid))
+        return dict(row) if row else None
+
+    def get_image_metadata_many(self, image_uuids) -> list:
+        self._round_trip()
+        return [dict(self._rows[str(u)]) for u in image_uuids if str(u) in self._rows]
+
+    def get_image_metadata_page(self, after=None, limit: int = 1000, filters=None) -> list:
+        from app.vector_store import payload_matches
+        self._round_trip()
+        with self._lock:
+            rows = sorted(self._rows.values(), key=lambda row: (row["upload_time"], row["uuid"]))
+        rows = [row for row in rows if payload_matches(row["metadata"], filters)]
+        if after is not None:
+            rows = [row for row in rows if (row["upload_time"], row["uuid"]) > (after[0], str(after[1]))]
+        return [dict(row) for row in rows[:limit]]
+
+    def delete_image_metadata(self, image_uuid: str):
+        self._round_trip()
+        with self._lock:
+            self._rows.pop(str(image_uuid), None)
+            self._hashes = {k: row for k, row in self._hashes.items() if row[2] != str(image_uuid)}
+
+    def find_images_by_hash(self, content_hashes, phashes=()) -> list:
+        self._round_trip()
+        content_hashes, phashes = set(content_hashes), set(phashes)
+        return [row for row in self._hashes.values() if row[0] in content_hashes or row[1] in phashes]
+
+    def insert_image_hashes(self, rows):
+        self._round_trip()
+        with self._lock:
+            for content_hash, phash, image_uuid in rows:
+                self._hashes.setdefault(content_hash, (content_hash, phash, str(image_uuid)))
+
+    def image_exists(self, image_uuid: str) -> bool:
+        self._round_trip()
+        return str(image_uuid) in self._rows
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the boto3 S3 client calls S3Uploader makes.
+
+    Each call sleeps ``rtt`` seconds plus body size / ``bandwidth`` (bytes/s per
+    connection, 0 = unlimited), so concurrency and multipart parallelism show up
+    as they would against S3. ``calls`` counts requests by operation.
+    """
+
+    def __init__(self, rtt: float = 0.0, bandwidth: float = 0.0):
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.objects = {}      # key -> (body, content_type)
+        self.calls = {}
+        self._uploads = {}     # upload id -> (key, content_type, {part_number: body})
+        self._lock = threading.Lock()
+
+    def _request(self, operation: str, body: bytes = b""):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.rtt + (len(body) / self.bandwidth if self.bandwidth else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self._request("put_object", Body)
+        with self._lock:
+            self.objects[Key] = (bytes(Body), ContentType)
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[Key][0]
+        self._request("get_object", body)
+        return {"Body": io.BytesIO(body), "ContentType": self.objects[Key][1]}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        self._request("create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = (Key, ContentType, {})
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._request("upload_part", Body)
+        with self._lock:
+            self._uploads[UploadId][2][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._request("complete_multipart_upload")
+        with self._lock:
+            key, content_type, parts = self._uploads.pop(UploadId)
+            numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+            self.objects[key] = (b"".join(parts[n] for n in numbers), content_type)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._request("abort_multipart_upload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+
+def fake_upload_image_to_s3(image_bytes: bytes, image_id: str, content_type: str = "image/jpeg") -> str:
+    return f"https://standin-bucket.s3.local/images/{image_id}.jpg"
+
+
+async def fake_upload_image_to_s3_async(image_bytes: bytes, image_id: str, content_type: str = "image/jpeg") -> str:
+    return fake_upload_image_to_s3(image_bytes, image_id, content_type)
+
+
+class AsyncStandIn:
+    """
+    Native-async stand-in over a local object, for async_postgres_db / async_vector_db.
+
+    Each call awaits ``rtt`` seconds on the event loop, like a network round trip
+    on an async client, then runs the target's method inline.
+    """
+
+    def __init__(self, target, rtt: float = 0.0):
+        self._target = target
+        self.rtt = rtt
+
+    def __getattr__(self, name: str):
+        async def call(*args, **kwargs):
+            if self.rtt:
+                await asyncio.sleep(self.rtt)
+            return getattr(self._target, name)(*args, **kwargs)
+        return call
+
+    async def aclose(self):
+        pass
+
+
+def in_memory_qdrant_db():
+    """A real QdrantDB over Qdrant's local in-memory mode, collection created."""
+    from qdrant_client import QdrantClient
+    from app.db_qdrant import QdrantDB
+
+    db = QdrantDB(client=QdrantClient(":memory:"))
+    db.ensure_collection()
+    return db
+
+
+def install_app_standins(embed_delay: float = 0.0, embedder=None) -> dict:
+    """
+    Point the app's lazy singletons at local stand-ins.
+
+    Uses the stub embedder (or ``embedder``), FakePostgresDB, in-memory Qdrant and FakeS3Client,
+    with AsyncStandIn wrappers for the async data path. Nothing heavy
+    (torch, a Qdrant server, Postgres) is touched.
+    """
+    import app.processor as processor
+    import app.s3_utils as s3_utils
+    from app.batcher import EmbeddingBatcher
+    from app.config import settings
+    from app.db_postgres import postgres_db
+    from app.executors import cpu_executor
+
+    embedder = embedder or StubEmbedder(delay=embed_delay)
+    standins = {
+        "embedder": embedder,
+        "embedding_batcher": EmbeddingBatcher(
+            embedder,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+            executor=cpu_executor,
+        ),
+        "postgres_db": FakePostgresDB(),
+        "vector_db": in_memory_qdrant_db(),
+    }
+    processor.clip_embedder.override(standins["embedder"])
+    processor.embedding_batcher.override(standins["embedding_batcher"])
+    processor.vector_db.override(standins["vector_db"])
+    postgres_db.override(standins["postgres_db"])
+    processor.async_vector_db.override(AsyncStandIn(standins["vector_db"]))
+    processor.async_postgres_db.override(AsyncStandIn(standins["postgres_db"]))
+    s3_utils.s3_uploader.override(s3_utils.S3Uploader(client=FakeS3Client()))
+    s3_utils.upload_image_to_s3_async = fake_upload_image_to_s3_async
+    return standins
+
+
+def seed(postgres_db, vector_db, count: int, dim: int = 512, batch_size: int = 1024):
+    """Insert ``count`` random unit vectors with matching metadata rows; return their ids."""
+    rng = np.random.default_rng(1)
+    ids = []
+    for start in range(0, count, batch_size):
+        batch = range(start, min(start + batch_size, count))
+        batch_ids = [str(uuid.uuid4()) for _ in batch]
+        vectors = rng.standard_normal((len(batch_ids), dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+        metadata_list = [{"style": f"style-{i % 7}"} for i in batch]
+        postgres_db.insert_image_metadata_many([
+            (image_id, f"seed_{i}.jpg", metadata)
+            for image_id, i, metadata in zip(batch_ids, batch, metadata_list)
+        ])
+        vector_db.insert_vectors(batch_ids, vectors, metadata_list)
+        ids.extend(batch_ids)
+    return ids
+
+
+class FakeSalonPostgres:
+    """
+    Stand-in for the salon tables behind match_salons' ``get_pg_conn``.
+
+    Answers the joined salon lookup (the only query the recommendation path
+    runs) from ``rows``: image_id -> salon row tuple in SALONS_FOR_IMAGES_SQL
+    column order. ``rtt`` seconds are slept per query.
+    """
+
+    def __init__(self, rows: dict, rtt: float = 0.0):
+        self.rows = rows
+        self.rtt = rtt
+        self._result = []
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    @contextlib.contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql, params=()):
+        if self.rtt:
+            time.sleep(self.rtt)
+        self._result = [self.rows[i] for i in sorted(params[0]) if i in self.rows] if params else []
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        pass
+
+
+def install_salon_standins(vector_db, query_ids, count: int, salons: int = 0, dim: int = 512) -> FakeSalonPostgres:
+    """
+    Back the salon recommendation router with local stand-ins.
+
+    The query collection is served from ``vector_db``'s in-memory Qdrant
+    client (its vectors are the ``query_ids``); ``count`` salon images spread
+    over ``salons`` salons go into a new salon collection on the same client,
+    and their salon rows into a FakeSalonPostgres.
+    """
+    import match_salons.salon_recommendation_v2 as salon_module
+    from qdrant_client import models
+
+    client = vector_db.client
+    salons = salons or max(1, count // 4)
+    rng = np.random.default_rng(2)
+    image_ids = [str(uuid.uuid4()) for _ in range(count)]
+    salon_ids = [uuid.UUID(bytes=rng.bytes(16)).hex for _ in range(salons)]
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    for name in (salon_module.QUERY_COLLECTION, salon_module.SALON_COLLECTION):
+        client.recreate_collection(
+            collection_name=name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE)
+        )
+    # The query collection mirrors the app's collection, so seeded image ids are valid queries
+    for start in range(0, len(query_ids), 1024):
+        hits = vector_db.retrieve(query_ids[start:start + 1024])
+        client.upsert(salon_module.QUERY_COLLECTION, points=[
+            models.PointStruct(id=hit.id, vector=hit.vector, payload={}) for hit in hits
+        ])
+    rows = {}
+    points = []
+    for i, (image_id, vector) in enumerate(zip(image_ids, vectors)):
+        salon_id = salon_ids[i % salons]
+        points.append(models.PointStruct(
+            id=image_id, vector=vector.tolist(), payload={salon_module.SALON_ID_FIELD: salon_id}
+        ))
+        rows[image_id] = (image_id, salon_id, f"Salon {i % salons}", f"{i % salons} Main St", "$$",
+                          i % 500, 3 + (i % 20) / 10, "wifi")
+    for start in range(0, len(points), 1024):
+        client.upsert(salon_module.SALON_COLLECTION, points=points[start:start + 1024])
+
+    pg = FakeSalonPostgres(rows)
+    salon_module.qdrant_client.override(client)
+    salon_module.async_qdrant_client.override(AsyncStandIn(client))
+    salon_module.get_pg_conn = pg.connection
+    salon_module.invalidate_salon_cache()
+    return pg
@@ -0,0 +1,295 @@
+"""
+End-to-end benchmark suite: every endpoint under load, plus embedder microbenchmarks.
+
+Boots ``app.main`` in process against local stand-ins: in-memory Qdrant,
+FakePostgresDB (``--rtt-ms`` per query), FakeS3Client, the salon tables in a
+FakeSalonPostgres and one of two embedders:
+
+- ``hash``: deterministic, near-free vectors, so the request path is measured
+- ``stub``: the CPU-bound StubEmbedder (``--embed-ms`` extra per forward pass)
+
+Seeds ``--images`` vectors and ``--salon-images`` salon images, then runs
+``--requests`` requests per endpoint at each ``--concurrency`` level (closed
+loop: that many clients, each sending its next request when the last one
+returns) and records throughput and p50/p95/p99 latency. Search caches are off
+unless ``--search-cache``, so repeated queries still do their work.
+
+The embedder section times OpenCLIPEmbedder's four methods on a real model
+(``--clip-pretrained none`` for random weights, no download; ``--skip-clip``
+to leave it out).
+
+Results go to ``--output`` as JSON. ``--compare`` prints the change against an
+earlier results file and exits 1 when throughput or p95 got worse by more than
+``--tolerance``:
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks.standins import HashEmbedder, StubEmbedder, install_app_standins, install_salon_standins, seed
+
+TEXTS = [
+    "glossy pink french tip nails",
+    "matte black coffin nails",
+    "pastel rainbow almond nails",
+    "gold chrome nails with rhinestones",
+    "short red nails",
+    "white marble nail art",
+    "blue ombre stiletto nails",
+    "nude nails with floral accents",
+]
+
+
+def _jpegs(count: int, size: int = 224):
+    rng = np.random.default_rng(3)
+    images = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8)).save(buf, format="JPEG")
+        images.append(buf.getvalue())
+    return images
+
+
+def _endpoints(ids, jpegs):
+    """name -> function(i) returning (method, path, httpx request kwargs) for the i-th request."""
+    def image(i):
+        return ("q.jpg", jpegs[i % len(jpegs)], "image/jpeg")
+
+    return {
+        "get_image": lambda i: ("GET", f"/api/images/{ids[i % len(ids)]}", {}),
+        "similar": lambda i: ("GET", f"/api/images/{ids[i % len(ids)]}/similar", {}),
+        "search_text": lambda i: ("POST", "/api/search/text", {"data": {"text": f"{TEXTS[i % len(TEXTS)]} {i}"}}),
+        "search_text_filtered": lambda i: ("POST", "/api/search/text", {
+            "data": {"text": f"{TEXTS[i % len(TEXTS)]} {i}"},
+            "params": {"filters": json.dumps({"style": f"style-{i % 7}"})},
+        }),
+        "search_image": lambda i: ("POST", "/api/search/image", {"files": {"file": image(i)}}),
+        "search_batch": lambda i: ("POST", "/api/search/batch", {
+            "data": {"texts": [f"{text} {i}" for text in TEXTS[:4]]},
+            "files": [("files", image(i)), ("files", image(i + 1))],
+        }),
+        "recommend": lambda i: ("POST", "/api/search/recommend", {"json": {
+            "positive_ids": [ids[i % len(ids)], ids[(i + 1) % len(ids)]],
+            "negative_ids": [ids[(i + 2) % len(ids)]],
+        }}),
+        "salon_recommendation": lambda i: ("GET", "/api/api/salon-recommendation-v2", {
+            "params": {"image_id": ids[i % len(ids)], "top_k": 4}
+        }),
+        "search_cache_stats": lambda i: ("GET", "/api/stats/search-cache", {}),
+        "db_pool_stats": lambda i: ("GET", "/api/stats/db-pool", {}),
+        "metrics": lambda i: ("GET", "/metrics", {}),
+    }
+
+
+def _percentile(samples, q: float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _summary(samples_ms) -> dict:
+    samples = sorted(samples_ms)
+    return {
+        "p50_ms": round(_percentile(samples, 0.50), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "p99_ms": round(_percentile(samples, 0.99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+async def _load(client, build, requests: int, concurrency: int) -> dict:
+    samples = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, path, kwargs = build(i)
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            samples.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 1),
+        **_summary(samples),
+    }
+
+
+async def _run_endpoints(args) -> list:
+    embedder = HashEmbedder() if args.embedder == "hash" else StubEmbedder(delay=args.embed_ms / 1000)
+    standins = install_app_standins(embedder=embedder)
+    standins["postgres_db"].rtt = args.rtt_ms / 1000
+    import app.processor as processor
+    from app.config import settings
+    from app.executors import AsyncAdapter
+    from app.main import app
+    from app.search_cache import create_search_cache, search_cache
+
+    # The blocking stand-ins on the I/O pool, as production runs PostgresDB and
+    # QdrantDB without ASYNC_IO_ENABLED; their round trips never block the loop
+    processor.async_postgres_db.override(AsyncAdapter(standins["postgres_db"]))
+    processor.async_vector_db.override(AsyncAdapter(standins["vector_db"]))
+    settings.SEARCH_CACHE_ENABLED = args.search_cache
+    search_cache.override(create_search_cache())
+    start = time.perf_counter()
+    ids = seed(standins["postgres_db"], standins["vector_db"], args.images)
+    salon_pg = install_salon_standins(standins["vector_db"], ids, args.salon_images)
+    salon_pg.rtt = args.rtt_ms / 1000
+    print(f"seeded {args.images} images and {args.salon_images} salon images "
+          f"in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    endpoints = _endpoints(ids, _jpegs(16))
+    selected = args.endpoints or list(endpoints)
+    results = []
+    print(f"{'endpoint':>22} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for name in selected:
+            build = endpoints[name]
+            await _load(client, build, min(args.requests, 20), 4)  # warm up
+            for concurrency in args.concurrency:
+                result = {"endpoint": name, "concurrency": concurrency,
+                          **await _load(client, build, args.requests, concurrency)}
+                results.append(result)
+                print(f"{name:>22} {concurrency:>5} {result['throughput_rps']:>9.1f} {result['p50_ms']:>8.2f} "
+                      f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>6}")
+    return results
+
+
+def _run_embedder(args) -> list:
+    from app.embedder import OpenCLIPEmbedder
+
+    pretrained = None if args.clip_pretrained.lower() == "none" else args.clip_pretrained
+    embedder = OpenCLIPEmbedder(args.clip_model, pretrained)
+    images = [Image.open(io.BytesIO(data)).convert("RGB") for data in _jpegs(args.clip_batch_size)]
+    texts = (TEXTS * (args.clip_batch_size // len(TEXTS) + 1))[:args.clip_batch_size]
+    cases = [
+        ("get_image_embedding", 1, lambda: embedder.get_image_embedding(images[0])),
+        ("get_batch_embeddings", len(images), lambda: embedder.get_batch_embeddings(images)),
+        ("get_text_embedding", 1, lambda: embedder.get_text_embedding(texts[0])),
+        ("get_batch_text_embeddings", len(texts), lambda: embedder.get_batch_text_embeddings(texts)),
+    ]
+    results = []
+    print(f"\n{'embedder method':>26} {'batch':>5} {'p50 ms':>8} {'p95 ms':>8} {'items/s':>9}")
+    for name, batch, fn in cases:
+        fn()  # warm up
+        samples = []
+        for _ in range(args.clip_repeats):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        result = {"method": name, "batch": batch, **_summary(samples)}
+        result["items_per_s"] = round(batch / result["p50_ms"] * 1000, 1)
+        results.append(result)
+        print(f"{name:>26} {batch:>5} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['items_per_s']:>9.1f}")
+    return results
+
+
+def _environment(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    from app.config import settings
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "args": vars(args),
+        "settings": {key: getattr(settings, key) for key in (
+            "SEARCH_MODE", "VECTOR_BACKEND", "ASYNC_IO_ENABLED", "EMBED_BATCHING_ENABLED",
+            "CPU_WORKERS", "IO_WORKERS", "CLIP_INFERENCE_MODE", "METRICS_ENABLED",
+        )},
+    }
+
+
+def _compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Print the change against ``baseline``; return the number of regressions."""
+    regressions = 0
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline.get("endpoints", [])}
+    print(f"\nvs {baseline['environment'].get('git_commit')} ({baseline['environment'].get('timestamp')}), "
+          f"tolerance {tolerance:.0%}")
+    print(f"{'endpoint':>22} {'conc':>5} {'req/s':>8} {'p95':>8}")
+    for result in current["endpoints"]:
+        old = previous.get((result["endpoint"], result["concurrency"]))
+        if old is None:
+            continue
+        throughput = result["throughput_rps"] / old["throughput_rps"] - 1
+        p95 = result["p95_ms"] / old["p95_ms"] - 1
+        worse = throughput < -tolerance or p95 > tolerance or result["errors"] > old["errors"]
+        regressions += worse
+        print(f"{result['endpoint']:>22} {result['concurrency']:>5} {throughput:>+8.1%} {p95:>+8.1%}"
+              f"{'  REGRESSION' if worse else ''}")
+    previous = {(r["method"], r["batch"]): r for r in baseline.get("embedder", [])}
+    for result in current["embedder"]:
+        old = previous.get((result["method"], result["batch"]))
+        if old is None:
+            continue
+        p50 = result["p50_ms"] / old["p50_ms"] - 1
+        worse = p50 > tolerance
+        regressions += worse
+        print(f"{result['method']:>26} p50 {p50:>+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10_000)
+    parser.add_argument("--salon-images", type=int, default=2_000)
+    parser.add_argument("--requests", type=int, default=500, help="per endpoint and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--endpoints", nargs="+", help="subset of endpoints to run (default: all)")
+    parser.add_argument("--embedder", choices=("hash", "stub"), default="hash")
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="extra delay per stub forward pass")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="per Postgres query")
+    parser.add_argument("--search-cache", action="store_true")
+    parser.add_argument("--skip-clip", action="store_true")
+    parser.add_argument("--clip-model", default="ViT-B-32")
+    parser.add_argument("--clip-pretrained", default="laion2b_s34b_b79k", help="'none' for random weights")
+    parser.add_argument("--clip-batch-size", type=int, default=16)
+    parser.add_argument("--clip-repeats", type=int, default=10)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = {
+        "environment": _environment(args),
+        "endpoints": asyncio.run(_run_endpoints(args)),
+        "embedder": [] if args.skip_clip else _run_embedder(args),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if _compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Recall@k vs latency: exact search vs two-stage (compact index + exact rerank).
+
+The collection is synthetic but shaped like CLIP embeddings: most variance
+sits in a low-dimensional subspace plus isotropic noise (``--latent-dim``,
+``--noise``). Uniform random vectors have no such structure and would make
+any PCA look useless. Queries are perturbed collection vectors.
+
+Both stages run over a LocalVectorDB, so the numbers compare search work and
+not network hops; ``--qdrant`` reranks against in-memory Qdrant instead.
+
+    python -m benchmarks.two_stage --size 100000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.db_local import LocalVectorDB
+from app.two_stage import CompactIndex, TwoStageStore
+
+
+def _collection(size: int, dim: int, latent_dim: int, noise: float, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scales = 1.0 / np.sqrt(np.arange(1, latent_dim + 1))
+    basis = rng.standard_normal((latent_dim, dim)).astype(np.float32)
+    vectors = (rng.standard_normal((size, latent_dim)) * scales).astype(np.float32) @ basis
+    vectors += noise * rng.standard_normal((size, dim)).astype(np.float32) * np.sqrt(latent_dim / dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _run(db, queries, exact, limit):
+    samples, recalls = [], []
+    for query, truth in zip(queries, exact):
+        start = time.perf_counter()
+        hits = db.search_similar(query, limit=limit)
+        samples.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({str(hit.id) for hit in hits} & truth) / limit)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))], statistics.mean(recalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--latent-dim", type=int, default=64)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--limit", type=int, default=18)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--configs", nargs="+", default=["pca:32", "pca:64", "pca:128", "binary:128", "binary:256"],
+                        help="method:dim pairs")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--qdrant", action="store_true", help="rerank against in-memory Qdrant")
+    args = parser.parse_args()
+
+    vectors = _collection(args.size, args.dim, args.latent_dim, args.noise)
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(args.size)]
+    rng = np.random.default_rng(2)
+    queries = vectors[rng.integers(0, args.size, args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.qdrant:
+            from benchmarks.standins import in_memory_qdrant_db
+            store = in_memory_qdrant_db()
+        else:
+            store = LocalVectorDB(f"{tmp}/index", dim=args.dim)
+        store.insert_vectors(ids, vectors, [{} for _ in ids], batch_size=1024)
+        exact = [{hit.id for hit in store.search_similar(q, limit=args.limit)} for q in queries]
+        exact = [{str(i) for i in truth} for truth in exact]
+
+        print(f"size={args.size} limit={args.limit} (latency in ms over {args.queries} queries)")
+        print(f"{'config':>12} {'cand':>5} {'fit s':>6} {'MB':>7} {'p50':>8} {'p95':>8} {'recall':>7}")
+        p50, p95, recall = _run(store, queries, exact, args.limit)
+        print(f"{'exact':>12} {'-':>5} {'-':>6} {vectors.nbytes / 1e6:>7.1f} {p50:>8.2f} {p95:>8.2f} {recall:>7.3f}")
+        for config in args.configs:
+            method, dim = config.split(":")
+            start = time.perf_counter()
+            index = CompactIndex.fit(store.iter_vectors(), method=method, dim=int(dim))
+            fit = time.perf_counter() - start
+            for candidates in args.candidates:
+                two_stage = TwoStageStore(store, index=index, candidates=candidates)
+                p50, p95, recall = _run(two_stage, queries, exact, args.limit)
+                print(f"{config:>12} {candidates:>5} {fit:>6.1f} {index.codes.nbytes / 1e6:>7.1f} "
+                      f"{p50:>8.2f} {p95:>8.2f} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
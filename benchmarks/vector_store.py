@@ -0,0 +1,85 @@
+"""
+Top-k search latency: LocalVectorDB (float32 / float16) vs Qdrant.
+
+Random unit vectors are loaded into each backend, then ``--queries`` searches
+are timed one by one; the table shows median / p95 latency and recall@k
+against the exact float32 result. Qdrant runs in its local in-memory mode
+unless ``--qdrant-url`` points at a server (e.g. http://localhost:6333),
+which is the comparison that includes the network hop; the server run uses a
+throwaway ``benchmark_vector_store`` collection and drops it afterwards.
+
+    python -m benchmarks.vector_store --sizes 10000 100000
+    python -m benchmarks.vector_store --sizes 1000000 --backends local-float32 local-float16
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from app.db_local import LocalVectorDB
+
+BACKENDS = ("local-float32", "local-float16", "qdrant")
+
+
+def _vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _make_backend(name: str, tmp: str, dim: int, qdrant_url: str):
+    if name.startswith("local-"):
+        return LocalVectorDB(f"{tmp}/{name}", dim=dim, dtype=name.split("-")[1])
+    from qdrant_client import QdrantClient
+    from app.config import settings
+    from app.db_qdrant import QdrantDB
+    settings.QDRANT_COLLECTION = "benchmark_vector_store"
+    db = QdrantDB(client=QdrantClient(url=qdrant_url) if qdrant_url else QdrantClient(":memory:"))
+    db.ensure_collection()
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--limit", type=int, default=18)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    queries = _vectors(args.queries, args.dim, seed=2)
+    print(f"{'size':>9} {'backend':>14} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+    for size in args.sizes:
+        vectors = _vectors(size, args.dim, seed=1)
+        ids = [str(uuid.UUID(int=i + 1)) for i in range(size)]
+        exact = [set(np.argsort(-(vectors @ q))[:args.limit]) for q in queries]
+        id_to_row = {image_id: row for row, image_id in enumerate(ids)}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in args.backends:
+                db = _make_backend(name, tmp, args.dim, args.qdrant_url)
+                start = time.perf_counter()
+                db.insert_vectors(ids, vectors, [{} for _ in ids], batch_size=1024)
+                load = time.perf_counter() - start
+
+                samples, recalls = [], []
+                for query, truth in zip(queries, exact):
+                    start = time.perf_counter()
+                    hits = db.search_similar(query, limit=args.limit)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    found = {id_to_row[str(hit.id)] for hit in hits}
+                    recalls.append(len(found & truth) / args.limit)
+                samples.sort()
+                p95 = samples[int(0.95 * (len(samples) - 1))]
+                print(f"{size:>9} {name:>14} {load:>8.2f} {statistics.median(samples):>8.2f} "
+                      f"{p95:>8.2f} {statistics.mean(recalls):>7.3f}")
+                if name == "qdrant":
+                    db.client.delete_collection("benchmark_vector_store")
+
+
+if __name__ == "__main__":
+    main()
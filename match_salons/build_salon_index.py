@@ -0,0 +1,99 @@
+"""
+Build / refresh the salon_id payload used for salon-grouped search.
+
+Copies each salon image's (dash-free) salon id from Postgres ``salon_images``
+onto its point in ``salon_images_clip`` and makes sure the payload index
+exists, so ``search_groups(group_by="salon_id")`` can return distinct salons.
+
+By default only points that do not have a salon_id yet are visited, so the
+command can be re-run cheaply after new salon images are ingested; ``--full``
+rewrites every point (e.g. after images were moved between salons).
+
+    python -m match_salons.build_salon_index [--full] [--batch-size 512]
+"""
+import argparse
+from collections import defaultdict
+
+from qdrant_client.http import models
+
+from match_salons.salon_recommendation_v2 import (
+    SALON_COLLECTION,
+    SALON_ID_FIELD,
+    get_pg_conn,
+    qdrant_client,
+)
+
+
+def _salon_ids_for(image_ids):
+    """Map image_id -> dash-free salon_id for the given ids (one query)."""
+    with get_pg_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT image_id::text, REPLACE(salon_id, '-', '')
+            FROM salon_images WHERE image_id IN %s
+            """,
+            (tuple(image_ids),)
+        )
+        return dict(cur.fetchall())
+
+
+def rebuild_salon_index(full: bool = False, batch_size: int = 512, client=qdrant_client) -> dict:
+    """Fill the salon_id payload on salon image points; return counters."""
+    client.create_payload_index(
+        collection_name=SALON_COLLECTION,
+        field_name=SALON_ID_FIELD,
+        field_schema=models.PayloadSchemaType.KEYWORD
+    )
+    scroll_filter = None
+    if not full:
+        scroll_filter = models.Filter(must=[
+            models.IsEmptyCondition(is_empty=models.PayloadField(key=SALON_ID_FIELD))
+        ])
+
+    stats = {"scanned": 0, "updated": 0, "without_salon": 0}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=SALON_COLLECTION,
+            scroll_filter=scroll_filter,
+            limit=batch_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        if not points:
+            break
+        stats["scanned"] += len(points)
+        salon_ids = _salon_ids_for([str(point.id) for point in points])
+
+        by_salon = defaultdict(list)
+        for point in points:
+            salon_id = salon_ids.get(str(point.id))
+            if salon_id is None:
+                stats["without_salon"] += 1
+            else:
+                by_salon[salon_id].append(point.id)
+        for salon_id, point_ids in by_salon.items():
+            client.set_payload(
+                collection_name=SALON_COLLECTION,
+                payload={SALON_ID_FIELD: salon_id},
+                points=point_ids,
+                wait=False
+            )
+            stats["updated"] += len(point_ids)
+        if offset is None:
+            break
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="rewrite every point, not just new ones")
+    parser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+    stats = rebuild_salon_index(full=args.full, batch_size=args.batch_size)
+    print(f"scanned={stats['scanned']} updated={stats['updated']} without_salon={stats['without_salon']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,150 @@
-from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from pydantic import BaseModel
 from typing import List, Optional
-import psycopg2
-from qdrant_client import QdrantClient
+import logging
 import os
 from dotenv import load_dotenv
+from app.admin import require_admin_token
+from app.cache import TTLCache
+from app.config import settings
+from app.db_pool import pg_pool
+from app.db_postgres_async import async_postgres_db
+from app.executors import run_io
+from app.lazy import Lazy
+from app.log import log_fields
+from app.metrics import span
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-# Qdrant client
-qdrant_client = QdrantClient(host="localhost", port=6333)
+# Same Qdrant server and connection settings as app.db_qdrant
+def _qdrant_options() -> dict:
+    return {
+        "host": settings.QDRANT_HOST,
+        "port": settings.QDRANT_PORT,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC,
+        "api_key": settings.QDRANT_API_KEY or None,
+        "https": settings.QDRANT_HTTPS,
+    }
 
-print("DB:", os.getenv("POSTGRES_DB"))
-print("USER:", os.getenv("POSTGRES_USER"))
-print("HOST:", os.getenv("POSTGRES_HOST"))
-print("PORT:", os.getenv("POSTGRES_PORT"))
+# Qdrant client, created on first use
+def _make_qdrant_client():
+    from qdrant_client import QdrantClient
+    return QdrantClient(**_qdrant_options())
 
-# Database connection 
+qdrant_client = Lazy(_make_qdrant_client, name="salon_qdrant_client")
+
+# Async client for the ASYNC_IO_ENABLED path
+def _make_async_qdrant_client():
+    from qdrant_client import AsyncQdrantClient
+    return AsyncQdrantClient(**_qdrant_options())
+
+async_qdrant_client = Lazy(_make_async_qdrant_client, name="salon_async_qdrant_client")
+
+QUERY_COLLECTION = "pretty_images_clip"
+SALON_COLLECTION = "salon_images_clip"
+# Payload field holding the dash-free salon id, filled by build_salon_index
+SALON_ID_FIELD = "salon_id"
+
+# Database connection, borrowed from the pool shared with PostgresDB
 def get_pg_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("POSTGRES_HOST"),
-        port=os.getenv("POSTGRES_PORT"),
-    )
+    return pg_pool.connection()
+
+# image_id -> salon row fields (without image_id / similarity); None marks
+# images with no salon so they are not looked up again until expiry
+salon_cache = TTLCache(maxsize=settings.SALON_CACHE_SIZE, ttl=settings.SALON_CACHE_TTL)
+_MISSING = object()
+
+# salons.salon_id is stored with and without dashes, so rows are matched on
+# the dash-free form; the expression index makes that join an index lookup
+SALON_INDEXES = [
+    """
+    CREATE INDEX IF NOT EXISTS salons_salon_id_nodash_idx
+    ON salons ((REPLACE(salon_id, '-', '')))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS salon_images_image_id_idx
+    ON salon_images (image_id)
+    """,
+]
+
+_SALONS_FOR_IMAGES_SQL = """
+    SELECT DISTINCT ON (si.image_id)
+           si.image_id::text, s.salon_id, s.business_name, s.address,
+           s.overall_price_level, s.review_total, s.average_rating, s.amenities
+    FROM salon_images si
+    JOIN salons s ON REPLACE(s.salon_id, '-', '') = REPLACE(si.salon_id, '-', '')
+    WHERE si.image_id {}
+    ORDER BY si.image_id
+"""
+SALONS_FOR_IMAGES_SQL = _SALONS_FOR_IMAGES_SQL.format("IN %s")         # psycopg2
+SALONS_FOR_IMAGES_SQL_ASYNC = _SALONS_FOR_IMAGES_SQL.format("= ANY($1)")  # asyncpg
+
+def ensure_salon_indexes():
+    """Create the indexes the recommendation query relies on (idempotent, run by app.migrate)."""
+    with get_pg_conn() as conn:
+        with conn.cursor() as cur:
+            for statement in SALON_INDEXES:
+                cur.execute(statement)
+        conn.commit()
+
+def _cached_salons(image_ids: List[str]):
+    """Split ids into (found, pending): cached salon rows, and ids still to query."""
+    found = {}
+    pending = []
+    for img_id in image_ids:
+        cached = salon_cache.get(str(img_id), _MISSING)
+        if cached is _MISSING:
+            pending.append(str(img_id))
+        elif cached is not None:
+            found[str(img_id)] = cached
+    return found, pending
+
+def _store_salons(found: dict, pending: List[str], rows) -> dict:
+    """Add queried rows to ``found`` and cache the outcome for every pending id."""
+    for row in rows:
+        found[row[0]] = {
+            "salon_id": row[1],
+            "business_name": row[2],
+            "address": row[3],
+            "overall_price_level": row[4],
+            "review_total": row[5],
+            "average_rating": row[6],
+            "features": row[7],
+        }
+    for img_id in pending:
+        salon_cache.set(img_id, found.get(img_id))
+    return found
+
+def fetch_salons_for_images(image_ids: List[str]) -> dict:
+    """
+    Map image_id -> salon fields for the given salon image ids.
+
+    Cached entries are served in-process; everything else is resolved with a
+    single joined query, whatever the number of ids.
+    """
+    found, pending = _cached_salons(image_ids)
+    if not pending:
+        return found
+    with span("metadata_fetch"), get_pg_conn() as conn, conn.cursor() as cur:
+        cur.execute(SALONS_FOR_IMAGES_SQL, (tuple(pending),))
+        rows = cur.fetchall()
+    return _store_salons(found, pending, rows)
+
+async def fetch_salons_for_images_async(image_ids: List[str]) -> dict:
+    """fetch_salons_for_images on the async Postgres pool."""
+    found, pending = _cached_salons(image_ids)
+    if not pending:
+        return found
+    with span("metadata_fetch"):
+        rows = await async_postgres_db.fetch(SALONS_FOR_IMAGES_SQL_ASYNC, pending)
+    return _store_salons(found, pending, rows)
+
+def invalidate_salon_cache():
+    """Drop every cached salon row, e.g. after salons or salon_images change."""
+    salon_cache.clear()
 
 class SalonResult(BaseModel):
     salon_id: str
@@ -38,63 +157,118 @@ class SalonResult(BaseModel):
     image_id: str
     similarity: float
 
+@router.post("/api/salon-recommendation-v2/cache/invalidate", dependencies=[Depends(require_admin_token)])
+async def invalidate_salon_recommendation_cache():
+    """Clear cached salon rows so the next requests read fresh data (needs X-Admin-Token)."""
+    invalidate_salon_cache()
+    return {"status": "ok", "cache": salon_cache.stats()}
+
 @router.get("/api/salon-recommendation-v2", response_model=List[SalonResult])
-async def recommend_salon_by_image_id(image_id: str = Query(...), top_k: int = 4):
+async def recommend_salon_by_image_id(
+    image_id: str = Query(...),
+    top_k: int = 4,
+    distinct_salons: Optional[bool] = None
+):
+    if distinct_salons is None:
+        distinct_salons = settings.SALON_SEARCH_DISTINCT
+    if settings.ASYNC_IO_ENABLED:
+        return await _recommend_salon_by_image_id_async(image_id, top_k, distinct_salons)
+    # Qdrant and psycopg2 calls block, so keep them off the event loop
+    return await run_io(_recommend_salon_by_image_id, image_id, top_k, distinct_salons)
+
+def _search_salon_images(embedding, top_k: int, distinct_salons: bool):
+    """
+    Return (image_id, score) hits from salon_images_clip.
+
+    With ``distinct_salons`` Qdrant groups hits on the salon_id payload and
+    returns the best image of each of the ``top_k`` closest salons in one query.
+    """
+    if not distinct_salons:
+        hits = qdrant_client.search(
+            collection_name=SALON_COLLECTION,
+            query_vector=embedding,
+            limit=top_k
+        )
+        return [(hit.id, hit.score) for hit in hits]
+    groups = qdrant_client.search_groups(
+        collection_name=SALON_COLLECTION,
+        query_vector=embedding,
+        group_by=SALON_ID_FIELD,
+        limit=top_k,
+        group_size=1
+    ).groups
+    return [(group.hits[0].id, group.hits[0].score) for group in groups]
+
+def _log_salon_hits(image_id: str, hits):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("salon search", extra=log_fields(
+            image_id=image_id, hits=len(hits), top_score=hits[0][1] if hits else None
+        ))
+
+def _recommend_salon_by_image_id(image_id: str, top_k: int, distinct_salons: bool = False) -> List[SalonResult]:
     # 1. get embedding from pretty_images_clip
-    point = qdrant_client.retrieve(
-        collection_name="pretty_images_clip",
-        ids=[image_id],
-        with_vectors=True
-    )
+    with span("vector_fetch"):
+        point = qdrant_client.retrieve(
+            collection_name=QUERY_COLLECTION,
+            ids=[image_id],
+            with_vectors=True
+        )
     if not point or point[0].vector is None:
         raise HTTPException(status_code=404, detail="Image embedding not found in pretty_images_clip")
     embedding = point[0].vector
 
     # 2. use this embedding to find similar images in salon_images_clip
-    hits = qdrant_client.search(
-        collection_name="salon_images_clip",
-        query_vector=embedding,
-        limit=top_k
-    )
-    image_ids = [hit.id for hit in hits]
-    similarities = [hit.score for hit in hits]
-    print(f"[DEBUG] Qdrant hits image_ids: {image_ids}")
-    print(f"[DEBUG] Qdrant similarities: {similarities}")
+    with span("vector_search"):
+        hits = _search_salon_images(embedding, top_k, distinct_salons)
+    image_ids = [img_id for img_id, _ in hits]
+    similarities = [score for _, score in hits]
+    _log_salon_hits(image_id, hits)
 
+    # 3. one PostgreSQL round trip for every hit not already cached
+    salons = fetch_salons_for_images(image_ids)
 
     results = []
-    # 3. find PostgreSQL
-    conn = get_pg_conn()
-    with conn.cursor() as cur:
-        for img_id, similarity in zip(image_ids, similarities):
-            # find salon_id
-            cur.execute("SELECT salon_id FROM salon_images WHERE image_id = %s", (img_id,))
-            row = cur.fetchone()
-            print(f"[DEBUG] find salon_images image_id={img_id} result: {row}")
-            if not row:
-                continue
-            salon_id = row[0]
-            # remove dash from salon_id
-            salon_id_no_dash = salon_id.replace("-", "") if isinstance(salon_id, str) else salon_id
-            # find salon info
-            cur.execute("""
-                SELECT salon_id, business_name, address, overall_price_level, review_total, average_rating, amenities
-                FROM salons WHERE REPLACE(salon_id, '-', '') = %s
-            """, (salon_id_no_dash,))
-            salon = cur.fetchone()
-            print(f"[DEBUG] find salons salon_id={salon_id} result: {salon}")
-            if not salon:
-                continue
-            results.append(SalonResult(
-                salon_id=salon[0],
-                business_name=salon[1],
-                address=salon[2],
-                overall_price_level=salon[3],
-                review_total=salon[4],
-                average_rating=salon[5],
-                features=salon[6],  
-                image_id=img_id,
-                similarity=similarity
-            ))
-    conn.close()
-    return results
\ No newline at end of file
+    for img_id, similarity in zip(image_ids, similarities):
+        salon = salons.get(str(img_id))
+        if not salon:
+            continue
+        results.append(SalonResult(**salon, image_id=img_id, similarity=similarity))
+    return results
+
+async def _search_salon_images_async(embedding, top_k: int, distinct_salons: bool):
+    if not distinct_salons:
+        hits = await async_qdrant_client.search(
+            collection_name=SALON_COLLECTION,
+            query_vector=embedding,
+            limit=top_k
+        )
+        return [(hit.id, hit.score) for hit in hits]
+    groups = (await async_qdrant_client.search_groups(
+        collection_name=SALON_COLLECTION,
+        query_vector=embedding,
+        group_by=SALON_ID_FIELD,
+        limit=top_k,
+        group_size=1
+    )).groups
+    return [(group.hits[0].id, group.hits[0].score) for group in groups]
+
+async def _recommend_salon_by_image_id_async(image_id: str, top_k: int, distinct_salons: bool = False) -> List[SalonResult]:
+    """_recommend_salon_by_image_id on AsyncQdrantClient and asyncpg."""
+    with span("vector_fetch"):
+        point = await async_qdrant_client.retrieve(
+            collection_name=QUERY_COLLECTION,
+            ids=[image_id],
+            with_vectors=True
+        )
+    if not point or point[0].vector is None:
+        raise HTTPException(status_code=404, detail="Image embedding not found in pretty_images_clip")
+
+    with span("vector_search"):
+        hits = await _search_salon_images_async(point[0].vector, top_k, distinct_salons)
+    _log_salon_hits(image_id, hits)
+    salons = await fetch_salons_for_images_async([img_id for img_id, _ in hits])
+    return [
+        SalonResult(**salons[str(img_id)], image_id=img_id, similarity=similarity)
+        for img_id, similarity in hits
+        if salons.get(str(img_id))
+    ]
@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.standins import install_app_standins
+
+
+def _post(path: str, token: str = None) -> int:
+    from app.main import app
+
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"X-Admin-Token": token} if token is not None else {}
+            return (await client.post(path, headers=headers)).status_code
+
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def admin_token():
+    install_app_standins()
+    from app.config import settings
+
+    previous = settings.ADMIN_TOKEN
+    settings.ADMIN_TOKEN = "s3cret"
+    yield settings
+    settings.ADMIN_TOKEN = previous
+
+
+@pytest.mark.parametrize("path", [
+    "/api/search-cache/clear",
+    "/api/api/salon-recommendation-v2/cache/invalidate",
+])
+def test_cache_flush_needs_the_admin_token(admin_token, path):
+    assert _post(path) == 403
+    assert _post(path, "wrong") == 403
+    assert _post(path, "s3cret") == 200
+    admin_token.ADMIN_TOKEN = ""
+    # Without a configured token the endpoint does not exist
+    assert _post(path, "") == 404
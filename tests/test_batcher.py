@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.batcher import EmbeddingBatcher
+
+
+class SlowEmbedder:
+    """Batch embedder whose forward passes block until ``release`` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def _forward(self, items):
+        self.started.set()
+        self.release.wait(5)
+        return [np.full(4, len(str(item)), dtype=np.float32) for item in items]
+
+    get_batch_embeddings = _forward
+    get_batch_text_embeddings = _forward
+
+
+def test_cancelled_waiter_does_not_stop_the_queue():
+    embedder = SlowEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=1, max_wait_ms=0)
+
+    async def scenario():
+        # The first request holds the queue thread; the second waits behind it
+        running = asyncio.ensure_future(asyncio.wrap_future(batcher.submit_text("a")))
+        queued = asyncio.ensure_future(asyncio.wrap_future(batcher.submit_text("bb")))
+        await asyncio.get_running_loop().run_in_executor(None, embedder.started.wait, 5)
+        queued.cancel()
+        running.cancel()
+        await asyncio.sleep(0)
+        embedder.release.set()
+        return await asyncio.wait_for(asyncio.wrap_future(batcher.submit_text("ccc")), 5)
+
+    try:
+        assert asyncio.run(scenario()).tolist() == [3.0] * 4
+        assert batcher._text_queue._thread.is_alive()
+    finally:
+        embedder.release.set()
+        batcher.close()
+
+
+def test_failed_batch_reaches_callers_and_the_queue_keeps_going():
+    class FailingOnce(SlowEmbedder):
+        def _forward(self, items):
+            if not self.started.is_set():
+                self.started.set()
+                raise RuntimeError("forward pass failed")
+            return [np.zeros(4, dtype=np.float32) for _ in items]
+
+        get_batch_text_embeddings = _forward
+
+    batcher = EmbeddingBatcher(FailingOnce(), max_batch_size=4, max_wait_ms=0)
+    try:
+        with pytest.raises(RuntimeError, match="forward pass failed"):
+            batcher.embed_text("a")
+        assert batcher.embed_text("b").shape == (4,)
+    finally:
+        batcher.close()
@@ -0,0 +1,28 @@
+import asyncio
+
+from benchmarks.standins import install_app_standins
+
+EMBED_DELAY = 0.3
+
+
+def test_cancelled_search_does_not_stall_later_ones():
+    install_app_standins(embed_delay=EMBED_DELAY)
+    from app.config import settings
+    from app.processor import ImageProcessor
+
+    settings.EMBED_BATCHING_ENABLED = True
+
+    async def scenario():
+        # One query holds the batcher's forward pass, the next waits in its queue
+        running = asyncio.create_task(ImageProcessor.text_cursor_async("cancel me while embedding"))
+        await asyncio.sleep(EMBED_DELAY / 3)
+        queued = asyncio.create_task(ImageProcessor.text_cursor_async("cancel me while queued"))
+        await asyncio.sleep(EMBED_DELAY / 3)
+        # A client disconnect or timeout cancels the request's task
+        queued.cancel()
+        running.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        return await asyncio.wait_for(ImageProcessor.text_cursor_async("the next search"), 5 * EMBED_DELAY)
+
+    cursor = asyncio.run(scenario())
+    assert cursor.vector is not None
@@ -0,0 +1,27 @@
+import pytest
+from pydantic import ValidationError
+
+from app.config import LEGACY_CLIP_MODELS, Settings
+
+
+@pytest.mark.parametrize("name", sorted(LEGACY_CLIP_MODELS))
+def test_legacy_model_ids_keep_the_weights_the_embedder_loaded(name):
+    # The old embedder ignored CLIP_MODEL_NAME and always loaded these
+    settings = Settings(CLIP_MODEL_NAME=name)
+    assert (settings.CLIP_MODEL_NAME, settings.CLIP_PRETRAINED) == ("ViT-B-32", "laion2b_s34b_b79k")
+
+
+def test_explicit_pretrained_is_kept():
+    settings = Settings(CLIP_MODEL_NAME="openai/clip-vit-base-patch32", CLIP_PRETRAINED="openai")
+    assert (settings.CLIP_MODEL_NAME, settings.CLIP_PRETRAINED) == ("ViT-B-32", "openai")
+
+
+def test_other_hugging_face_ids_are_rejected():
+    with pytest.raises(ValidationError, match="open_clip architecture"):
+        Settings(CLIP_MODEL_NAME="laion/CLIP-ViT-H-14-laion2B-s32B-b79K")
+
+
+def test_open_clip_and_hf_hub_names_pass_through():
+    assert Settings(CLIP_MODEL_NAME="ViT-L-14", CLIP_PRETRAINED="openai").CLIP_MODEL_NAME == "ViT-L-14"
+    name = "hf-hub:laion/CLIP-ViT-B-32-laion2B-s34B-b79K"
+    assert Settings(CLIP_MODEL_NAME=name).CLIP_MODEL_NAME == name
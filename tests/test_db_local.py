@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.db_local import LocalVectorDB
+
+DIM = 8
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _ids(n: int, start: int = 0):
+    return [f"id-{i}" for i in range(start, start + n)]
+
+
+def test_append_search_and_overwrite(tmp_path):
+    db = LocalVectorDB(str(tmp_path), dim=DIM, compact_ratio=10)
+    vectors = _vectors(20)
+    db.insert_vectors(_ids(20), vectors, [{"n": i} for i in range(20)])
+    hit = db.search_similar(vectors[3], limit=1)[0]
+    assert (hit.id, hit.payload) == ("id-3", {"n": 3})
+    assert hit.score == pytest.approx(1.0, abs=1e-5)
+
+    # Inserting an existing id tombstones its old row
+    db.insert_vector("id-3", vectors[5], {"n": "new"})
+    assert db.count() == 20
+    assert db.retrieve(["id-3"])[0].payload == {"n": "new"}
+    assert [h.id for h in db.search_similar(vectors[5], limit=2)] in (["id-3", "id-5"], ["id-5", "id-3"])
+
+
+def test_offset_pages_match_one_big_page(tmp_path):
+    db = LocalVectorDB(str(tmp_path), dim=DIM)
+    db.insert_vectors(_ids(50), _vectors(50), [{} for _ in range(50)])
+    query = _vectors(1, seed=1)[0]
+    full = [h.id for h in db.search_similar(query, limit=30)]
+    pages = [h.id for offset in (0, 10, 20) for h in db.search_similar(query, limit=10, offset=offset)]
+    assert pages == full
+
+
+def test_delete_and_compaction(tmp_path):
+    db = LocalVectorDB(str(tmp_path), dim=DIM, compact_ratio=0.25)
+    vectors = _vectors(10)
+    db.insert_vectors(_ids(10), vectors, [{"n": i} for i in range(10)])
+    db.delete_vector("id-0")
+    db.delete_vector("id-1")
+    assert db._generation == 0
+    db.delete_vector("id-2")   # 3 dead rows > 25% of 10: compacts
+    assert db._generation == 1
+    assert not os.path.exists(os.path.join(tmp_path, "vectors.0.bin"))
+    assert db.count() == 7
+    assert db.search_similar(vectors[4], limit=1)[0].id == "id-4"
+    assert "id-2" not in {h.id for h in db.search_similar(vectors[2], limit=10)}
+
+    reopened = LocalVectorDB(str(tmp_path), dim=DIM, read_only=True)
+    assert reopened.count() == 7
+    assert reopened.retrieve(["id-9"])[0].payload == {"n": 9}
+
+
+def test_reader_picks_up_appends_deletes_and_compactions(tmp_path):
+    writer = LocalVectorDB(str(tmp_path), dim=DIM, compact_ratio=0.5)
+    vectors = _vectors(10)
+    writer.insert_vectors(_ids(4), vectors[:4], [{} for _ in range(4)])
+    reader = LocalVectorDB(str(tmp_path), dim=DIM, read_only=True)
+    assert reader.count() == 4
+
+    writer.insert_vectors(_ids(6, start=4), vectors[4:], [{} for _ in range(6)])
+    writer.delete_vector("id-0")
+    assert reader.count() == 9
+    assert reader.search_similar(vectors[8], limit=1)[0].id == "id-8"
+
+    for image_id in _ids(5, start=1):
+        writer.delete_vector(image_id)
+    assert writer._generation == 1
+    assert reader.count() == 4
+    assert {h.id for h in reader.search_similar(vectors[9], limit=10)} == set(_ids(4, start=6))
+    with pytest.raises(PermissionError):
+        reader.delete_vector("id-9")
+
+
+def test_one_writer_at_a_time(tmp_path):
+    writer = LocalVectorDB(str(tmp_path), dim=DIM)
+    second = LocalVectorDB(str(tmp_path), dim=DIM)
+    assert not writer.read_only and second.read_only
+    with pytest.raises(PermissionError):
+        second.insert_vector("id-0", _vectors(1)[0])
+
+    writer.close()
+    third = LocalVectorDB(str(tmp_path), dim=DIM)
+    assert not third.read_only
+    third.insert_vector("id-0", _vectors(1)[0])
+    assert second.count() == 1
+
+
+def test_forked_child_cannot_write_through_the_parent_instance(tmp_path):
+    writer = LocalVectorDB(str(tmp_path), dim=DIM)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            writer.insert_vector("id-0", _vectors(1)[0])
+            status = 1
+        except PermissionError:
+            status = 0
+        except BaseException:
+            status = 2
+        os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert writer.count() == 0
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from app import dedup
+from app.config import settings
+from app.dedup import DedupPlan
+
+
+@pytest.fixture(autouse=True)
+def dedup_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(settings, "DEDUP_PERCEPTUAL", False)
+    monkeypatch.setattr(settings, "DEDUP_PHASH_DISTANCE", 1)
+    return settings
+
+
+def test_copies_in_one_batch_share_the_first_ones_id():
+    plan = DedupPlan([("a", 1), ("b", 2), ("a", 1)])
+    assert plan.new == [True, True, False]
+    assert plan.image_ids[2] == plan.image_ids[0] != plan.image_ids[1]
+    # One hash row per content hash
+    assert sorted(row[0] for row in plan.hash_rows()) == ["a", "b"]
+
+
+def test_stored_content_hash_resolves_to_the_stored_image():
+    plan = DedupPlan([("a", 1), ("b", 2)], known_rows=[("a", 1, "stored-a")])
+    assert plan.new == [False, True]
+    assert plan.image_ids[0] == "stored-a"
+    assert [row[0] for row in plan.hash_rows()] == ["b"]
+
+
+def test_perceptual_matching_is_opt_in(dedup_settings):
+    known = [("other-bytes", 0b1010, "stored")]
+    assert DedupPlan([("new-bytes", 0b1011)], known_rows=known).new == [True]
+
+    dedup_settings.DEDUP_PERCEPTUAL = True
+    one_bit_off = DedupPlan([("new-bytes", 0b1011)], known_rows=known)
+    assert (one_bit_off.new, one_bit_off.image_ids) == ([False], ["stored"])
+    assert DedupPlan([("new-bytes", 0b1001)], known_rows=known).new == [True]
+    dedup_settings.DEDUP_PHASH_DISTANCE = 0
+    assert DedupPlan([("new-bytes", 0b1011)], known_rows=known).new == [True]
+
+
+def test_drop_takes_the_in_batch_copies_along():
+    plan = DedupPlan([("a", 1), ("b", 2), ("a", 1)])
+    assert plan.drop([0]) == [0, 2]
+    assert plan.new == [False, True, False]
+    assert [row[0] for row in plan.hash_rows()] == ["b"]
+
+
+def test_near_duplicates_point_at_the_stored_image_and_copies_follow():
+    plan = DedupPlan([("a", 1), ("b", 2), ("a", 1)])
+    plan.reject_near_duplicates([0, 1], [[SimpleNamespace(id="stored")], []])
+    assert plan.new == [False, True, False]
+    assert plan.image_ids[0] == plan.image_ids[2] == "stored"
+
+
+class MissingHashesTable:
+    def find_images_by_hash(self, *args):
+        raise RuntimeError('relation "pretty_images_hashes" does not exist')
+
+    insert_image_hashes = find_images_by_hash
+
+
+def test_unmigrated_hashes_table_does_not_fail_ingest():
+    images = [Image.new("RGB", (16, 16), color=(i, 0, 0)) for i in (10, 200)]
+    plan = dedup.plan_batch(MissingHashesTable(), [b"x", b"y"], images)
+    assert plan.new == [True, True] and plan.hashes is None
+    dedup.index_hashes(MissingHashesTable(), DedupPlan([("a", 1)]))
+    assert dedup.stored_embeddings(MissingHashesTable(), None, ["a"]) == {}
+
+
+def test_phash_distance_is_validated():
+    from pydantic import ValidationError
+    from app.config import Settings
+
+    with pytest.raises(ValidationError, match="DEDUP_PHASH_DISTANCE"):
+        Settings(DEDUP_PHASH_DISTANCE=2)
@@ -0,0 +1,39 @@
+import asyncio
+import io
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.standins import install_app_standins, seed
+
+EMBED_DELAY = 1.0
+
+
+def test_slow_embedding_does_not_delay_a_metadata_lookup():
+    standins = install_app_standins(embed_delay=EMBED_DELAY)
+    from app.main import app
+
+    image_id = seed(standins["postgres_db"], standins["vector_db"], 10)[0]
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color=(255, 0, 128)).save(buf, format="JPEG")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            search = asyncio.create_task(client.post(
+                "/api/search/image", files={"file": ("q.jpg", buf.getvalue(), "image/jpeg")}
+            ))
+            await asyncio.sleep(0.1)  # let the search reach the embedder
+            start = time.perf_counter()
+            response = await client.get(f"/api/images/{image_id}")
+            lookup_s = time.perf_counter() - start
+            search_response = await search
+        return response, lookup_s, search_response, time.perf_counter() - start
+
+    response, lookup_s, search_response, search_s = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert search_response.status_code == 200
+    # The search really was still embedding while the lookup ran
+    assert search_s >= EMBED_DELAY / 2
+    assert lookup_s < EMBED_DELAY / 4
@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.pagination import SearchCursor
+from benchmarks.standins import AsyncStandIn, install_app_standins, seed
+
+
+def _hit(image_id, score):
+    return SimpleNamespace(id=image_id, score=score)
+
+
+def _query(seed_: int = 3) -> np.ndarray:
+    vector = np.random.default_rng(seed_).standard_normal(settings.VECTOR_SIZE).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_cursor_round_trip():
+    cursor = SearchCursor(
+        vector=_query(), metadata_source="payload", score_threshold=0.2, hnsw_ef=64,
+        filters=(("style", ("french",)),), offset=36, last_score=0.5, last_id="abc"
+    )
+    decoded = SearchCursor.decode(cursor.encode())
+    assert np.array_equal(decoded.vector, cursor.vector)
+    assert decoded.search_options() == cursor.search_options()
+    assert (decoded.metadata_source, decoded.last_score, decoded.last_id) == ("payload", 0.5, "abc")
+
+    by_id = SearchCursor(positive_ids=["a", "b"], negative_ids=["c"], metadata_source="none")
+    assert SearchCursor.decode(by_id.encode()) == by_id
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "bnVsbA", SearchCursor(positive_ids=["a"]).encode() + ".AAAA"])
+def test_malformed_cursors_are_rejected(token):
+    with pytest.raises(ValueError, match="malformed cursor"):
+        SearchCursor.decode(token)
+
+
+def test_cursor_of_another_model_is_rejected(monkeypatch):
+    token = SearchCursor(vector=_query()).encode()
+    monkeypatch.setattr(settings, "CLIP_PRETRAINED", "openai")
+    with pytest.raises(ValueError, match="another model"):
+        SearchCursor.decode(token)
+
+
+def test_later_pages_drop_what_earlier_ones_showed():
+    cursor = SearchCursor(vector=_query())
+    page = [_hit("a", 0.9), _hit("b", 0.8), _hit("c", 0.7)]
+    assert cursor.unseen(page) == page
+    assert cursor.after(page, limit=4) is None
+
+    next_cursor = cursor.after(page, limit=3)
+    assert (next_cursor.offset, next_cursor.last_score, next_cursor.last_id) == (3, 0.7, "c")
+    # A point inserted above the bound, the last hit again and a tie that was not shown
+    later = [_hit("new", 0.95), _hit("c", 0.7), _hit("tie", 0.7), _hit("d", 0.6)]
+    assert [hit.id for hit in next_cursor.unseen(later)] == ["tie", "d"]
+
+
+@pytest.fixture
+def stores():
+    standins = install_app_standins()
+    ids = seed(standins["postgres_db"], standins["vector_db"], 60)
+    return standins, ids
+
+
+async def _follow(cursor, limit, pages, between=None):
+    from app.processor import ImageProcessor
+
+    ids = []
+    for n in range(pages):
+        results, token = await ImageProcessor.search_page_async(cursor, limit)
+        ids += [str(r["id"]) for r in results]
+        if token is None:
+            break
+        if between and n == 0:
+            between()
+        cursor = SearchCursor.decode(token)
+    return ids
+
+
+def test_pages_join_up_to_one_big_page(stores):
+    cursor = SearchCursor(vector=_query(), metadata_source="none")
+    full = asyncio.run(_follow(cursor, 40, 1))
+    assert asyncio.run(_follow(cursor, 10, 4)) == full
+
+
+def test_insert_between_pages_is_not_shown_twice(stores):
+    standins, _ = stores
+    query = _query(seed_=4)
+    cursor = SearchCursor(vector=query, metadata_source="none")
+
+    def insert():
+        # Scores above everything on the first page
+        standins["vector_db"].insert_vector("00000000-0000-0000-0000-0000000000ff", query, {})
+
+    before = asyncio.run(_follow(cursor, 40, 1))
+    ids = asyncio.run(_follow(cursor, 10, 4, between=insert))
+    # The insert pushed the first page's last hit onto the second, which drops it
+    assert len(ids) == len(set(ids)) == 39
+    assert ids == before[:39]
+
+
+class CountingPostgres(AsyncStandIn):
+    """AsyncStandIn recording how many metadata queries run at once."""
+
+    def __init__(self, target):
+        super().__init__(target, rtt=0.01)
+        self.running = self.peak = 0
+
+    async def get_image_metadata_many(self, image_uuids):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.rtt)
+            return self._target.get_image_metadata_many(image_uuids)
+        finally:
+            self.running -= 1
+
+
+def test_stream_keeps_few_metadata_queries_in_flight(stores, monkeypatch):
+    import app.processor as processor
+
+    standins, ids = stores
+    postgres = CountingPostgres(standins["postgres_db"])
+    processor.async_postgres_db.override(postgres)
+    monkeypatch.setattr(settings, "SEARCH_STREAM_PREFETCH", 2)
+
+    async def stream():
+        batches, _ = await processor.ImageProcessor.stream_page_async(
+            SearchCursor(vector=_query(), metadata_source="postgres"), limit=60, batch_size=5
+        )
+        results = []
+        async for batch in batches:
+            # A slow client
+            await asyncio.sleep(0.02)
+            results += batch
+        return results
+
+    results = asyncio.run(stream())
+    assert sorted(str(r["id"]) for r in results) == sorted(ids)
+    assert all(r["metadata"] for r in results)
+    assert postgres.peak == 2
+
+
+@pytest.mark.parametrize("limit, status", [(0, 422), (18, 200), (1001, 422)])
+def test_page_size_is_capped(stores, limit, status):
+    import httpx
+    from app.main import app
+
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/api/search/text", data={"text": "nails"}, params={"limit": limit})).status_code
+
+    assert asyncio.run(send()) == status
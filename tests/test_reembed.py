@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from app.config import settings
+from app.db_qdrant import QdrantDB
+from app.reembed import ReembedJob
+from benchmarks.reembed import CrashingPostgres, _setup
+from benchmarks.standins import StubEmbedder
+
+IMAGES = 40
+
+
+def _job(client, postgres_db, s3, checkpoint, model=None):
+    model_name, pretrained = model or (settings.CLIP_MODEL_NAME, settings.CLIP_PRETRAINED)
+    return ReembedJob(
+        model_name=model_name,
+        pretrained=pretrained,
+        embedder_factory=StubEmbedder,
+        postgres_db=postgres_db,
+        client=client,
+        fetch=s3.download,
+        workers=0,
+        batch_size=8,
+        latency_budget_ms=0,
+        checkpoint_path=checkpoint
+    )
+
+
+def _checkpointed_collection(checkpoint: str) -> str:
+    with open(checkpoint) as f:
+        return json.load(f)["collection"]
+
+
+def _alias_target(client) -> str:
+    return client.get_aliases().aliases[0].collection_name
+
+
+def test_resume_after_a_crash_embeds_each_image_once(tmp_path):
+    client, _, postgres_db, s3 = _setup(IMAGES, 32)
+    checkpoint = str(tmp_path / "reembed.ckpt")
+    job = _job(client, CrashingPostgres(postgres_db, pages=2), s3, checkpoint)
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        job.run()
+    job.close()
+    crashed = client.count(job.target.collection).count
+    assert 0 < crashed < IMAGES
+    assert _alias_target(client) != job.target.collection
+
+    job = _job(client, postgres_db, s3, checkpoint)
+    try:
+        report = job.run()
+    finally:
+        job.close()
+    assert job.target.collection == _checkpointed_collection(checkpoint)
+    assert report.failed == 0
+    assert report.embedded == IMAGES - crashed
+    assert _alias_target(client) == job.target.collection
+    ids = {str(row["uuid"]) for row in postgres_db._rows.values()}
+    assert {str(p.id) for p in QdrantDB(client).retrieve(list(ids), with_vectors=False)} == ids
+
+
+def test_checkpoint_of_another_model_is_refused(tmp_path):
+    client, _, postgres_db, s3 = _setup(8, 32)
+    checkpoint = str(tmp_path / "reembed.ckpt")
+    job = _job(client, postgres_db, s3, checkpoint)
+    job.run()
+    job.close()
+    with pytest.raises(ValueError, match="is for"):
+        _job(client, postgres_db, s3, checkpoint, model=("ViT-L-14", "openai"))
+
+
+def test_switching_to_another_model_needs_an_override(tmp_path):
+    client, _, postgres_db, s3 = _setup(8, 32)
+    live = _alias_target(client)
+    job = _job(client, postgres_db, s3, None, model=("ViT-L-14", "openai"))
+    try:
+        assert job.model_mismatch
+        with pytest.raises(ValueError, match="CLIP_MODEL_NAME=ViT-L-14"):
+            job.run()
+        assert client.count(live).count == 8 and _alias_target(client) == live
+
+        report = job.run(switch=False)
+        assert report.embedded == 8 and _alias_target(client) == live
+        job.run(switch_model_mismatch=True)
+        assert _alias_target(client) == job.target.collection
+    finally:
+        job.close()